@@ -0,0 +1,69 @@
+"""
+Бенчмарк кодирования: время и размер результата для каждого пресета сжатия.
+
+Запуск:
+    python benchmarks/encode_presets.py path/to/image.jpeg [--config file_config.json] [--repeat 3]
+"""
+
+import argparse
+import time
+
+from PIL import Image
+
+from file_box.configs.model import CompressItemModel
+from file_box.file_utils import (
+    EncodeOptions,
+    ResamplingMapEnum,
+    get_image_encoder,
+    get_image_sizes,
+    get_resampling_mode,
+    read_config_from_json,
+    save_image_to_io_bytes,
+)
+
+
+def benchmark_preset(img: Image.Image, preset: CompressItemModel, repeat: int) -> tuple[float, int]:
+    width, height = get_image_sizes(img=img, width=preset.width)
+    resized = img.resize((width, height), resample=get_resampling_mode(preset.resampling or ResamplingMapEnum.LANCZOS))
+    encode_options = EncodeOptions(
+        quality=preset.quality,
+        method=preset.method,
+        lossless=preset.lossless,
+        progressive=preset.progressive,
+        optimize=preset.optimize,
+    )
+
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(save_image_to_io_bytes(img=resized, image_format=preset.file_format, encode_options=encode_options))
+        timings.append(time.perf_counter() - start)
+    return min(timings), size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("image_path")
+    parser.add_argument("--config", default="file_config.json")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    img = Image.open(args.image_path)
+    img.load()
+    presets = [CompressItemModel(**item) for item in read_config_from_json(args.config, "compress")]
+
+    print(f"source: {args.image_path} {img.size[0]}x{img.size[1]} {img.format}")
+    print("| compress_name | format | width | quality | method | encoder | encode, ms | size, KiB |")
+    print("|---|---|---|---|---|---|---|---|")
+    for preset in presets:
+        encode_time, size = benchmark_preset(img, preset, args.repeat)
+        encoder_name = get_image_encoder(preset.file_format).__name__
+        print(
+            f"| {preset.compress_name} | {preset.file_format} | {preset.width} | {preset.quality} | {preset.method} "
+            f"| {encoder_name} | {encode_time * 1000:.1f} | {size / 1024:.1f} |"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Бенчмарк сериализации ответа API: стандартный путь FastAPI (валидация по response_model + json)
+против orjson по dataclass напрямую, и размер ответа после gzip.
+
+Запуск:
+    python benchmarks/serialization.py [--renditions 10] [--repeat 10000]
+"""
+
+import argparse
+import asyncio
+import gzip
+import random
+import time
+from typing import Awaitable, Callable
+
+import orjson
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from file_box.service import CompressInfoDTO, ResponseDTO
+
+
+def generate_response_dto(renditions: int) -> ResponseDTO:
+    rnd = random.Random(0)
+    file_id = "a7402058-9cb3-4422-865f-1e2dacde9126"
+    base_url = f"https://storage.googleapis.com/epoch8/file-box/files/image/{file_id}"
+    return ResponseDTO(
+        file_id=file_id,
+        source_path=f"{base_url}/raw.bytes?X-Goog-Signature={rnd.randbytes(256).hex()}",
+        compress_info={
+            f"image_{i}_lanczos_webp": CompressInfoDTO(
+                f"{base_url}/image_{i}_lanczos_webp/image.WEBP?X-Goog-Signature={rnd.randbytes(256).hex()}"
+            )
+            for i in range(renditions)
+        },
+        meta_data={"user_id": 327, "tags": ["craft", "wood"], "description": "x" * 200},
+    )
+
+
+RESPONSE_FIELD = create_model_field(name="Response", type_=ResponseDTO, mode="serialization")
+
+
+async def serialize_fastapi_default(dto: ResponseDTO) -> bytes:
+    content = await serialize_response(field=RESPONSE_FIELD, response_content=dto, is_coroutine=False)
+    return JSONResponse(content).body
+
+
+async def serialize_orjson(dto: ResponseDTO) -> bytes:
+    return ORJSONResponse(dto).body
+
+
+async def benchmark(func: Callable[[ResponseDTO], Awaitable[bytes]], dto: ResponseDTO, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await func(dto)
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--renditions", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=10000)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.renditions, args.repeat))
+
+
+async def run(renditions: int, repeat: int) -> None:
+    dto = generate_response_dto(renditions)
+    assert orjson.loads(await serialize_fastapi_default(dto)) == orjson.loads(await serialize_orjson(dto))
+
+    print("| serializer | per request, us | size, B | gzip size, B |")
+    print("|---|---|---|---|")
+    for name, func in [("fastapi default", serialize_fastapi_default), ("orjson", serialize_orjson)]:
+        body = await func(dto)
+        per_request = await benchmark(func, dto, repeat)
+        print(f"| {name} | {per_request * 1e6:.1f} | {len(body)} | {len(gzip.compress(body))} |")
+
+
+if __name__ == "__main__":
+    main()
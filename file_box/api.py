@@ -1,17 +1,94 @@
-from fastapi import Depends, FastAPI, HTTPException, Request, status
+import time
+from typing import Awaitable, Callable
+
+from fastapi import Body, Depends, FastAPI, Header, HTTPException, Request, status
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, Response
 from loguru import logger
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import Receive, Scope, Send
+
+from file_box.metrics import REQUEST_LATENCY
+from file_box.service import (
+    FileBoxServiceProtocol,
+    FilesDeleteDTO,
+    FilesDeleteResultDTO,
+    ItemDTO,
+    ResponseDTO,
+    UploadOffsetMismatchError,
+    UploadSessionCreateDTO,
+    UploadSessionDTO,
+    UploadSessionError,
+    UploadSessionNotFoundError,
+    get_file_box_service,
+)
+from file_box.settings import pipeline_config
+from file_box.tracing import setup_tracing, tracer
+
+DOWNLOAD_PATH_PREFIX = "/api/v1/download/"
+
+app = FastAPI(default_response_class=ORJSONResponse)
+
+setup_tracing(
+    pipeline_config.tracing_exporter,
+    file_path=pipeline_config.tracing_file_path,
+    otlp_endpoint=pipeline_config.tracing_otlp_endpoint,
+)
+
+
+class APIGZipMiddleware(GZipMiddleware):
+    """
+    GZip для ответов API, кроме скачивания файлов: изображения уже сжаты, а FileResponse отдается через sendfile.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"].startswith(DOWNLOAD_PATH_PREFIX):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+def add_compression_middleware(app: FastAPI) -> None:
+    if pipeline_config.api_compression == "brotli":
+        try:
+            from brotli_asgi import BrotliMiddleware
+        except ImportError:
+            logger.warning("brotli-asgi is not installed, falling back to gzip")
+        else:
+            app.add_middleware(
+                BrotliMiddleware,
+                minimum_size=pipeline_config.api_compression_minimum_size,
+                excluded_handlers=[f"^{DOWNLOAD_PATH_PREFIX}"],
+            )
+            return
+    if pipeline_config.api_compression != "none":
+        app.add_middleware(APIGZipMiddleware, minimum_size=pipeline_config.api_compression_minimum_size)
+
 
-from file_box.service import FileBoxServiceProtocol, ItemDTO, ResponseDTO, get_file_box_service
+add_compression_middleware(app)
 
-app = FastAPI()
+
+@app.middleware("http")
+async def track_request_latency(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Метки по шаблону роута, а не по пути, чтобы file_id не раздувал число серий.
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", "unmatched")
+    REQUEST_LATENCY.labels(request.method, route_path, response.status_code).observe(time.perf_counter() - start)
+    return response
 
 
 @app.get("/healthz", response_model=int, status_code=status.HTTP_200_OK, tags=["healthz"])
 def healthz() -> int:
     return status.HTTP_200_OK
 
+
+@app.get("/metrics", response_class=Response, tags=["healthz"])
+def metrics() -> Response:
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.post(
     "/api/v1/upload-file",
     response_model=ResponseDTO,
@@ -21,10 +98,73 @@ def healthz() -> int:
 def upload_file(
     item: ItemDTO,
     service: FileBoxServiceProtocol = Depends(get_file_box_service)
-) -> ResponseDTO:
-    res = service.upload_file(item)
-    return res
+) -> ORJSONResponse:
+    with tracer.start_as_current_span("api.upload_file") as span:
+        span.set_attributes({"file_type": item.file_type, "file_size": len(item.file_bytes)})
+        res = service.upload_file(item)
+    # ResponseDTO - dataclass, orjson сериализует его напрямую, без повторной валидации по response_model.
+    return ORJSONResponse(res)
     
+@app.post("/api/v1/uploads", response_model=UploadSessionDTO, status_code=status.HTTP_201_CREATED, tags=["upload"])
+def create_upload_session(
+    upload: UploadSessionCreateDTO,
+    service: FileBoxServiceProtocol = Depends(get_file_box_service)
+) -> ORJSONResponse:
+    try:
+        res = service.create_upload_session(upload)
+    except UploadSessionError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return ORJSONResponse(res, status_code=status.HTTP_201_CREATED)
+
+
+def upload_session_error_to_http(e: UploadSessionError) -> HTTPException:
+    if isinstance(e, UploadSessionNotFoundError):
+        return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    if isinstance(e, UploadOffsetMismatchError):
+        # Клиент продолжает загрузку с offset из заголовка.
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail=str(e), headers={"Upload-Offset": str(e.offset)}
+        )
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@app.get("/api/v1/uploads/{upload_id}", response_model=UploadSessionDTO, tags=["upload"])
+def get_upload_session(
+    upload_id: str,
+    service: FileBoxServiceProtocol = Depends(get_file_box_service)
+) -> ORJSONResponse:
+    res = service.get_upload_session(upload_id)
+    if res is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    return ORJSONResponse(res, headers={"Upload-Offset": str(res.offset)})
+
+
+@app.put("/api/v1/uploads/{upload_id}", response_model=UploadSessionDTO, tags=["upload"])
+def upload_chunk(
+    upload_id: str,
+    data: bytes = Body(media_type="application/octet-stream"),
+    upload_offset: int = Header(),
+    service: FileBoxServiceProtocol = Depends(get_file_box_service)
+) -> ORJSONResponse:
+    try:
+        res = service.upload_chunk(upload_id, upload_offset, data)
+    except UploadSessionError as e:
+        raise upload_session_error_to_http(e)
+    return ORJSONResponse(res, headers={"Upload-Offset": str(res.offset)})
+
+
+@app.post("/api/v1/uploads/{upload_id}/finalize", response_model=ResponseDTO, tags=["upload"])
+def finalize_upload(
+    upload_id: str,
+    service: FileBoxServiceProtocol = Depends(get_file_box_service)
+) -> ORJSONResponse:
+    try:
+        res = service.finalize_upload(upload_id)
+    except UploadSessionError as e:
+        raise upload_session_error_to_http(e)
+    return ORJSONResponse(res)
+
+
 @app.get(
     "/api/v1/file-response/{file_id}",
     response_model=ResponseDTO,
@@ -34,11 +174,75 @@ def upload_file(
 def get_file_response(
     file_id: str,
     service: FileBoxServiceProtocol = Depends(get_file_box_service)
-) -> ResponseDTO:
+) -> ORJSONResponse:
     res = service.get_file_response(file_id)
     if res is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
-    return res
+    return ORJSONResponse(res)
+
+
+@app.delete("/api/v1/files/{file_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["file"])
+def delete_file(
+    file_id: str,
+    service: FileBoxServiceProtocol = Depends(get_file_box_service)
+) -> Response:
+    if not service.delete_files([file_id]):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@app.post("/api/v1/files/delete", response_model=FilesDeleteResultDTO, tags=["file"])
+def delete_files(
+    request: FilesDeleteDTO,
+    service: FileBoxServiceProtocol = Depends(get_file_box_service)
+) -> ORJSONResponse:
+    # Файлы только помечаются удаленными, объекты и строки пайплайна удаляет purger (python -m file_box.purge).
+    return ORJSONResponse(FilesDeleteResultDTO(deleted=service.delete_files(request.file_ids)))
+
+
+def is_etag_matched(if_none_match: str | None, etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def download_file_response(
+    file_id: str, compress_name: str | None, service: FileBoxServiceProtocol, if_none_match: str | None = None
+) -> Response:
+    location = service.get_file_location(file_id, compress_name)
+    if location is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    headers = {}
+    if location.content_hash is not None:
+        # ETag - хэш содержимого, посчитанный при записи файла.
+        headers["ETag"] = f'"{location.content_hash}"'
+        if is_etag_matched(if_none_match, headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    # Локальные файлы отдаются через sendfile без чтения в память процесса.
+    if location.local_path is not None:
+        return FileResponse(location.local_path, media_type=location.media_type, headers=headers)
+    content = service.get_file_bytes(location.path, location.content_hash)
+    return Response(content=content, media_type=location.media_type, headers=headers)
+
+
+@app.get("/api/v1/download/{file_id}", response_class=Response, tags=["file"])
+def download_file(
+    file_id: str,
+    if_none_match: str | None = Header(default=None),
+    service: FileBoxServiceProtocol = Depends(get_file_box_service),
+) -> Response:
+    return download_file_response(file_id, None, service, if_none_match)
+
+
+@app.get("/api/v1/download/{file_id}/{compress_name}", response_class=Response, tags=["file"])
+def download_compressed_file(
+    file_id: str,
+    compress_name: str,
+    if_none_match: str | None = Header(default=None),
+    service: FileBoxServiceProtocol = Depends(get_file_box_service)
+) -> Response:
+    return download_file_response(file_id, compress_name, service, if_none_match)
 
 
 @app.exception_handler(RequestValidationError)
@@ -1,12 +1,22 @@
 from datapipe.compute import Catalog, Table
 from datapipe.store.database import TableStoreDB
-from datapipe.store.filedir import BytesFile, TableStoreFiledir
+from datapipe.store.filedir import BytesFile
 
+from file_box.local_cache import configure_local_cache
 from file_box.settings import db_config, pipeline_config
+from file_box.stores import ConcurrentTableStoreFiledir
 from file_box.tables import FileData
 
+# Локальный кэш объектов удаленного хранилища (включается LOCAL_CACHE_DIR), общий для API и шагов пайплайна.
+local_cache = configure_local_cache(pipeline_config.local_cache_dir, pipeline_config.local_cache_max_mb * 1024 * 1024)
+
 FILENAME_PATTERN_RAW = f"{pipeline_config.document_blob_base_url}/files/{{file_type}}/{{file_id}}/raw.bytes"
 
+VIDEO_POSTER_PATTERN = f"{pipeline_config.document_blob_base_url}/files/{{file_type}}/{{file_id}}/poster.png"
+
+# Каталог возобновляемой загрузки: части (или один дописываемый файл на локальном диске) до финализации.
+UPLOAD_SESSION_PATTERN = f"{pipeline_config.document_blob_base_url}/uploads/{{upload_id}}"
+
 IMAGE_PATTERN_COMPRESSED = (
     f"{pipeline_config.document_blob_base_url}/files/{{file_type}}/{{file_id}}/{{compress_name}}/image.{{file_format}}"
 )
@@ -21,21 +31,39 @@ def get_file_catalog_dict() -> dict[str, Table]:
             )    
         ),
         "file_box_file_raw": Table(
-            store=TableStoreFiledir(
+            store=ConcurrentTableStoreFiledir(
                 FILENAME_PATTERN_RAW,
+                table_name="file_box_file_raw",
+                adapter=BytesFile(bytes_columns="file_bytes"),
+                add_filepath_column=True,
+                enable_rm=True,
+                read_data=False,
+                local_cache=local_cache,
+            )
+        ),
+        "file_box_video_poster": Table(
+            store=ConcurrentTableStoreFiledir(
+                VIDEO_POSTER_PATTERN,
+                table_name="file_box_video_poster",
                 adapter=BytesFile(bytes_columns="file_bytes"),
                 add_filepath_column=True,
                 enable_rm=True,
                 read_data=False,
+                local_cache=local_cache,
             )
         ),
         "file_box_image_compressed": Table(
-            store=TableStoreFiledir(
+            store=ConcurrentTableStoreFiledir(
                 IMAGE_PATTERN_COMPRESSED,
+                table_name="file_box_image_compressed",
+                max_workers=pipeline_config.storage_write_concurrency,
+                max_in_flight_bytes=pipeline_config.storage_write_max_in_flight_mb * 1024 * 1024,
+                retries=pipeline_config.storage_write_retries,
                 adapter=BytesFile(bytes_columns="file_bytes"),
                 add_filepath_column=True,
                 enable_rm=True,
                 read_data=False,
+                local_cache=local_cache,
             )
         )
     }
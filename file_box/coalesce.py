@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from typing import List, Optional, cast
+
+import pandas as pd
+import sqlalchemy as sa
+from datapipe.compute import Catalog, ComputeStep
+from datapipe.datatable import DataStore
+from datapipe.meta.sql_meta import build_changed_idx_sql
+from datapipe.run_config import RunConfig
+from datapipe.step.batch_transform import BatchTransform, BatchTransformStep
+from datapipe.types import ChangeList, IndexDF
+from loguru import logger
+from sqlalchemy import Connection
+
+from file_box.locks import advisory_lock_key, release_advisory_locks, try_advisory_locks, wait_advisory_locks
+
+
+class CoalescedBatchTransformStep(BatchTransformStep):
+    """
+    BatchTransformStep, в котором ключи батча разбираются между воркерами через advisory locks Postgres.
+
+    Ключ, который сейчас обрабатывает другой воркер (другая реплика или параллельный run_steps),
+    повторно не рендерится: шаг дожидается освобождения лока и обрабатывает только те ключи,
+    которые владелец не смог обработать успешно или которые изменились, пока он работал.
+    """
+
+    def _get_unprocessed_idx(
+        self, ds: DataStore, conn: Connection, idx: IndexDF, run_config: Optional[RunConfig] = None
+    ) -> IndexDF:
+        """
+        Ключи из idx, которые после ожидания лока все еще нужно обработать.
+
+        Считается тем же запросом изменений, что и в datapipe (update_ts входов против process_ts и is_success
+        meta шага), а не по сдвигу process_ts: process_ts - время начала батча владельца, и вход, обновленный
+        во время его работы, остается измененным.
+        """
+        _, sql = build_changed_idx_sql(
+            ds=ds,
+            meta_table=self.meta_table,
+            input_dts=self.input_dts,
+            transform_keys=self.transform_keys,
+            filters_idx=idx,
+            run_config=self._apply_filters_to_run_config(run_config),
+        )
+        changed_df = pd.read_sql_query(sql, con=conn)
+        return cast(IndexDF, changed_df[self.transform_keys].drop_duplicates())
+
+    def process_batch(
+        self,
+        ds: DataStore,
+        idx: IndexDF,
+        run_config: Optional[RunConfig] = None,
+    ) -> ChangeList:
+        idx = cast(IndexDF, idx.reset_index(drop=True))
+        lock_keys = [
+            advisory_lock_key(self.name, *values)
+            for values in idx[self.transform_keys].itertuples(index=False, name=None)
+        ]
+
+        with ds.meta_dbconn.con.connect() as conn:
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            acquired = pd.Series(try_advisory_locks(conn, lock_keys), index=idx.index, dtype=bool)
+            own_keys = [key for key, is_acquired in zip(lock_keys, acquired) if is_acquired]
+            busy_keys = [key for key, is_acquired in zip(lock_keys, acquired) if not is_acquired]
+            busy_idx = cast(IndexDF, idx[~acquired])
+
+            changes = ChangeList()
+            try:
+                if own_keys:
+                    changes = super().process_batch(ds, cast(IndexDF, idx[acquired]), run_config)
+            finally:
+                release_advisory_locks(conn, own_keys)
+
+            if not busy_keys:
+                return changes
+
+            logger.info(f"{self.name}: {len(busy_keys)} keys are processed by another worker, waiting")
+            wait_advisory_locks(conn, busy_keys)
+            leftover_idx = self._get_unprocessed_idx(ds, conn, busy_idx, run_config)
+
+        if not leftover_idx.empty:
+            # Владелец завершился с ошибкой или вход обновился во время его работы - обрабатываем сами.
+            changes.extend(self.process_batch(ds, leftover_idx, run_config))
+        return changes
+
+
+@dataclass
+class CoalescedBatchTransform(BatchTransform):
+    def build_compute(self, ds: DataStore, catalog: Catalog) -> List[ComputeStep]:
+        input_dts = [self.pipeline_input_to_compute_input(ds, catalog, input) for input in self.inputs]
+        output_dts = [catalog.get_datatable(ds, name) for name in self.outputs]
+
+        return [
+            CoalescedBatchTransformStep(
+                ds=ds,
+                name=f"{self.func.__name__}",
+                input_dts=input_dts,
+                output_dts=output_dts,
+                func=self.func,
+                kwargs=self.kwargs,
+                transform_keys=self.transform_keys,
+                chunk_size=self.chunk_size,
+                labels=self.labels,
+                executor_config=self.executor_config,
+                filters=self.filters,
+                order_by=self.order_by,
+                order=self.order,
+            )
+        ]
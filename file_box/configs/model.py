@@ -1,6 +1,8 @@
-from pydantic import BaseModel
+from enum import StrEnum
 
-from file_box.file_utils import ResamplingMapEnum
+from pydantic import BaseModel, PositiveInt, model_validator
+
+from file_box.file_utils import GCS_V4_MAX_EXPIRATION_SECONDS, FitModeEnum, ResamplingMapEnum
 
 
 class CompressItemModel(BaseModel):
@@ -9,6 +11,49 @@ class CompressItemModel(BaseModel):
     compress_name: str
     width: int
     resampling: ResamplingMapEnum | None = None
+    quality: int | None = None
+    method: int | None = None
+    lossless: bool | None = None
+    progressive: bool | None = None
+    optimize: bool | None = None
+    max_pixels: int | None = None
+    # Вариант рендерится при первом запросе на скачивание, а не при загрузке.
+    on_demand: bool = False
+    max_height: int | None = None
+    fit: FitModeEnum = FitModeEnum.CONTAIN
+    # Изображения меньше целевого размера не увеличиваются.
+    no_upscale: bool = False
+    # Если вариант совпадает с исходником (формат, размер, без параметров кодирования), исходник копируется
+    # вместе с метаданными (EXIF, GPS), поэтому по умолчанию выключено.
+    passthrough_if_same_format_and_size: bool = False
+    # Ограничения анимации (GIF, WEBP, PNG): число кадров и общая длительность в мс.
+    max_frames: PositiveInt | None = None
+    max_duration_ms: PositiveInt | None = None
+
+
+class PreviewItemModel(BaseModel):
+    file_type: str
+    file_format: str
+    compress_name: str
+    # Ширина растеризации первой страницы, 0 - размер страницы при 72 dpi.
+    width: int
+    quality: int | None = None
+    method: int | None = None
+    lossless: bool | None = None
+    progressive: bool | None = None
+    optimize: bool | None = None
+
+
+class VideoItemModel(BaseModel):
+    file_type: str
+    # Момент кадра-постера в секундах (для коротких видео - не дальше середины).
+    poster_seek_seconds: float = 1.0
+
+
+class RetentionItemModel(BaseModel):
+    file_type: str
+    # Срок хранения файла, если при загрузке не передан expires_at.
+    ttl_seconds: PositiveInt
 
 
 class LsDataItemModel(BaseModel):
@@ -20,8 +65,70 @@ class LsDataItemModel(BaseModel):
 class ModerationItemModel(BaseModel):
     file_type: str
     ls_data: LsDataItemModel
+    # Пресет compress того же file_type, который отправляется в классификатор и в LabelStudio.
+    # Если не задан, модерируются полноразмерные варианты (width == 0).
+    source_compress_name: str | None = None
+
+
+class UrlPolicyEnum(StrEnum):
+    # Новая подписанная ссылка на каждый запрос.
+    SIGNED = "signed"
+    # Подписанная ссылка с окончанием срока, выровненным по окну: внутри окна ссылка не меняется.
+    BUCKETED = "bucketed"
+    # Публичная ссылка (CDN) по шаблону, без подписи.
+    PUBLIC = "public"
+
+
+class UrlPolicyItemModel(BaseModel):
+    file_type: str
+    # Если не задан, политика действует на исходный файл и на все варианты сжатия типа файла.
+    compress_name: str | None = None
+    policy: UrlPolicyEnum = UrlPolicyEnum.SIGNED
+    # Шаблон публичной ссылки, например "https://cdn.example.com/{path}",
+    # где path - путь файла относительно document_blob_base_url.
+    public_url_template: str | None = None
+    # Срок действия подписанной ссылки; для bucketed - после конца окна.
+    expiration_days: PositiveInt = 7
+    bucket_hours: PositiveInt = 24
+
+    @model_validator(mode="after")
+    def check_public_url_template(self) -> "UrlPolicyItemModel":
+        if self.policy == UrlPolicyEnum.PUBLIC and not self.public_url_template:
+            raise ValueError("public_url_template is required for public url policy")
+        return self
+
+    @model_validator(mode="after")
+    def check_expiration(self) -> "UrlPolicyItemModel":
+        # V4 подпись (GCS, S3) действует не больше 7 дней от момента подписи, более длинный срок молча обрезался бы.
+        max_hours = GCS_V4_MAX_EXPIRATION_SECONDS // 3600
+        if self.policy == UrlPolicyEnum.SIGNED and self.expiration_days * 24 > max_hours:
+            raise ValueError(f"expiration_days must not exceed {max_hours // 24} for signed url policy")
+        # Ссылка bucketed подписывается на начало окна и действует окно плюс expiration_days.
+        if self.policy == UrlPolicyEnum.BUCKETED and self.bucket_hours + self.expiration_days * 24 > max_hours:
+            raise ValueError(
+                f"bucket_hours + expiration_days must not exceed {max_hours} hours for bucketed url policy"
+            )
+        return self
 
 
 class FileConfigModel(BaseModel):
     compress: list[CompressItemModel]
-    moderation: list[ModerationItemModel]
\ No newline at end of file
+    moderation: list[ModerationItemModel]
+    preview: list[PreviewItemModel] = []
+    video: list[VideoItemModel] = []
+    url_policy: list[UrlPolicyItemModel] = []
+    retention: list[RetentionItemModel] = []
+
+    @model_validator(mode="after")
+    def check_moderation_source(self) -> "FileConfigModel":
+        presets = {(item.file_type, item.compress_name): item for item in self.compress}
+        for item in self.moderation:
+            if item.source_compress_name is None:
+                continue
+            preset = presets.get((item.file_type, item.source_compress_name))
+            if preset is None:
+                raise ValueError(f"Unknown moderation source preset {item.source_compress_name} for {item.file_type}")
+            # Вариант по запросу может так и не появиться, тогда изображение не попадет на модерацию.
+            if preset.on_demand:
+                raise ValueError(f"Moderation source preset {item.source_compress_name} must not be on_demand")
+        return self
\ No newline at end of file
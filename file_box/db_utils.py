@@ -1,15 +1,31 @@
+import datetime
+from functools import cache
+
 from sqlalchemy import Engine, create_engine
 from sqlalchemy.orm import Session, sessionmaker
 
 from file_box.settings import db_config
 
 
+@cache
 def get_engine() -> Engine:
     engine = create_engine(db_config.dsn, pool_size=20)
     return engine
     
     
+@cache
 def get_sessionmaker() -> sessionmaker[Session]:
     engine = get_engine()
     return sessionmaker(bind=engine, autoflush=True, expire_on_commit=False)
 
+
+def utcnow() -> datetime.datetime:
+    # Колонки sa.DateTime без таймзоны хранят время в UTC.
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+
+
+def to_utc_naive(value: datetime.datetime) -> datetime.datetime:
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.UTC).replace(tzinfo=None)
+
@@ -1,15 +1,27 @@
 import datetime
+import hashlib
 import io
 import json
+import math
+import mmap
 import os
+import resource
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
 from enum import StrEnum
-from typing import Optional
-from urllib.parse import urlparse
+from typing import Any, Callable, Iterator, Optional, cast, get_args
+from urllib.parse import quote, urlparse
 
 import fsspec
 import pandas as pd
 from loguru import logger
-from PIL import Image
+from PIL import Image, ImageOps, ImageSequence
+
+from file_box.local_cache import get_local_cache
+from file_box.metrics import SIGNED_URLS
 
 
 def read_config_from_json(config_path: str, config_name: str) -> list:
@@ -43,17 +55,247 @@ class CraftReviewStatus(StrEnum):
     SELF_DELETED = "self_deleted"
 
 
-def get_image_bytes(image_url: str, file_system_name: str, file_system_creds_path: Optional[str] = None) -> Image.Image:
+def get_file_system(file_system_name: str, file_system_creds_path: Optional[str] = None) -> fsspec.AbstractFileSystem:
     if file_system_creds_path is not None:
-        file_system = fsspec.filesystem(file_system_name, token=file_system_creds_path)
-    else:
-        file_system = fsspec.filesystem(file_system_name)
+        return fsspec.filesystem(file_system_name, token=file_system_creds_path)
+    return fsspec.filesystem(file_system_name)
+
+
+LOCAL_FILE_SYSTEM_NAMES = ("file", "local")
+
+
+def get_local_path(url: str, file_system_name: str) -> str | None:
+    """
+    Возвращает путь на локальном диске, если файл хранится в локальной файловой системе, иначе None.
+    """
+
+    protocol, path = fsspec.core.split_protocol(url)
+    if (protocol or file_system_name) in LOCAL_FILE_SYSTEM_NAMES:
+        return path
+    return None
 
+
+def get_cached_local_path(
+    url: str,
+    file_system_name: str,
+    file_system_creds_path: Optional[str] = None,
+    content_hash: Optional[str] = None,
+) -> str | None:
+    """
+    Путь на локальном диске: для локальной файловой системы - сам файл, для удаленной - копия в локальном
+    кэше (при промахе объект скачивается в кэш). None, если кэш не настроен или недоступен.
+
+    content_hash - ожидаемая версия объекта (хэш из file_box_file_data или file_box_compress_data): копия
+    другой версии в кэше (объект перезаписал другой экземпляр) скачивается заново.
+    """
+
+    local_path = get_local_path(url, file_system_name)
+    local_cache = get_local_cache()
+    if local_path is not None or local_cache is None:
+        return local_path
+    try:
+        return local_cache.fetch(url, get_file_system(file_system_name, file_system_creds_path), content_hash)
+    except OSError as e:
+        logger.warning(f"Failed to read {url} through local cache: {e}")
+        return None
+
+
+@contextmanager
+def open_image(
+    image_url: str,
+    file_system_name: str,
+    file_system_creds_path: Optional[str] = None,
+    content_hash: Optional[str] = None,
+) -> Iterator[Image.Image]:
+    """
+    Открывает изображение поверх файлового потока без чтения всего файла в bytes.
+
+    Локальные файлы (и копии в локальном кэше) отображаются в память (mmap), удаленные читаются потоком через fsspec.
+    Декодирование ленивое (при первом обращении к пикселям), файл и изображение закрываются при выходе.
+    """
+
+    local_path = get_cached_local_path(image_url, file_system_name, file_system_creds_path, content_hash)
+    # Пустой файл mmap не отображает (ValueError): читаем его обычным потоком, Pillow поднимет UnidentifiedImageError.
+    if local_path is not None and os.path.getsize(local_path) > 0:
+        with open(local_path, "rb") as image_file, mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with Image.open(mm) as image:  # type: ignore[arg-type]
+                yield image
+        return
+
+    if local_path is not None:
+        with open(local_path, "rb") as image_file, Image.open(image_file) as image:
+            yield image
+        return
+
+    file_system = get_file_system(file_system_name, file_system_creds_path)
     with file_system.open(image_url, "rb") as image_file:
-        image_bytes = image_file.read()
-    image = Image.open(io.BytesIO(image_bytes))
+        with Image.open(image_file) as image:
+            yield image
+
+
+def read_file_bytes(
+    url: str,
+    file_system_name: str,
+    file_system_creds_path: Optional[str] = None,
+    content_hash: Optional[str] = None,
+) -> bytes:
+    local_path = get_cached_local_path(url, file_system_name, file_system_creds_path, content_hash)
+    if local_path is not None:
+        with open(local_path, "rb") as local_file:
+            return local_file.read()
+
+    file_system = get_file_system(file_system_name, file_system_creds_path)
+    return file_system.cat_file(url)
+
+
+def read_file_header(
+    url: str,
+    file_system_name: str,
+    file_system_creds_path: Optional[str] = None,
+    length: int = 16,
+    content_hash: Optional[str] = None,
+) -> bytes:
+    # Ради заголовка файл в кэш не скачивается, но уже закэшированная копия используется.
+    local_cache = get_local_cache()
+    local_path = get_local_path(url, file_system_name) or (local_cache.get(url, content_hash) if local_cache else None)
+    if local_path is not None:
+        with open(local_path, "rb") as local_file:
+            return local_file.read(length)
+
+    file_system = get_file_system(file_system_name, file_system_creds_path)
+    return file_system.cat_file(url, start=0, end=length)
+
+
+def reset_peak_rss() -> None:
+    """
+    Сбрасывает пиковый RSS процесса (только Linux), чтобы мерить пик в пределах батча.
+    """
+
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
 
-    return image
+
+def get_peak_rss_bytes() -> int:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss - пик за все время жизни процесса (в KiB на Linux).
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@dataclass
+class ContentInfo:
+    content_hash: str
+    size: int
+    width: int | None = None
+    height: int | None = None
+    image_format: str | None = None
+
+
+def get_content_info(data: bytes) -> ContentInfo:
+    """
+    Хэш (sha256), размер и, для изображений, размеры и формат (по заголовку, без декодирования).
+
+    :param data: содержимое файла
+    """
+    info = ContentInfo(content_hash=hashlib.sha256(data).hexdigest(), size=len(data))
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            info.width, info.height = img.size
+            info.image_format = img.format
+    except Exception:
+        pass
+    return info
+
+
+def get_file_content_info(
+    url: str,
+    file_system_name: str,
+    file_system_creds_path: Optional[str] = None,
+    chunk_size: int = 8 * 1024 * 1024,
+) -> ContentInfo:
+    """
+    То же, что get_content_info, но для файла в хранилище: содержимое читается потоком, без загрузки в память.
+
+    :param url: путь к файлу
+    :param file_system_name: имя файловой системы fsspec
+    :param file_system_creds_path: путь к credentials файловой системы
+    :param chunk_size: размер блока чтения
+    """
+    file_system = get_file_system(file_system_name, file_system_creds_path)
+    sha256 = hashlib.sha256()
+    size = 0
+    with file_system.open(url, "rb") as source:
+        while chunk := source.read(chunk_size):
+            sha256.update(chunk)
+            size += len(chunk)
+    info = ContentInfo(content_hash=sha256.hexdigest(), size=size)
+    try:
+        with file_system.open(url, "rb") as source, Image.open(source) as img:
+            info.width, info.height = img.size
+            info.image_format = img.format
+    except Exception:
+        pass
+    return info
+
+
+# Ограничение GCS compose: не больше 32 исходных объектов за один вызов.
+MAX_COMPOSE_SOURCES = 32
+
+
+def compose_files(
+    file_system: fsspec.AbstractFileSystem, target: str, sources: list[str], chunk_size: int = 8 * 1024 * 1024
+) -> None:
+    """
+    Склеивает объекты sources (в порядке списка) в объект target.
+
+    gcsfs и s3fs склеивают на стороне сервера (merge: compose в GCS, multipart copy в S3), без скачивания частей.
+    GCS склеивает не больше MAX_COMPOSE_SOURCES объектов за раз, поэтому длинный список склеивается
+    в несколько раундов через промежуточные объекты. Остальные файловые системы склеивают потоком.
+
+    :param file_system: файловая система fsspec
+    :param target: путь итогового объекта
+    :param sources: пути частей
+    :param chunk_size: размер блока при склейке потоком
+    """
+    assert sources, "Nothing to compose"
+    # merge есть только у файловых систем с серверной склейкой (gcsfs, s3fs), в AbstractFileSystem его нет.
+    if not hasattr(file_system, "merge"):
+        with file_system.open(target, "wb") as target_file:
+            for source in sources:
+                with file_system.open(source, "rb") as source_file:
+                    while chunk := source_file.read(chunk_size):
+                        target_file.write(chunk)
+        return
+
+    round_index = 0
+    while len(sources) > MAX_COMPOSE_SOURCES:
+        sources = [
+            _merge_group(file_system, f"{target}.compose-{round_index}-{group_index}", group)
+            for group_index, group in enumerate(
+                sources[i : i + MAX_COMPOSE_SOURCES] for i in range(0, len(sources), MAX_COMPOSE_SOURCES)
+            )
+        ]
+        round_index += 1
+    file_system.merge(target, sources)
+    if round_index > 0:
+        file_system.rm([source for source in sources if ".compose-" in source])
+
+
+def _merge_group(file_system: fsspec.AbstractFileSystem, target: str, sources: list[str]) -> str:
+    file_system.merge(target, sources)
+    # Промежуточные объекты прошлого раунда больше не нужны.
+    intermediate = [source for source in sources if ".compose-" in source]
+    if intermediate:
+        file_system.rm(intermediate)
+    return target
 
 
 def get_gs_path_from_image_url(image_url: str) -> str:
@@ -65,28 +307,128 @@ def get_gs_path_from_image_url(image_url: str) -> str:
     return image_url
 
 
-def get_signed_url(
-    url: str, file_system_name: str, file_system_creds_path: str | None = None, days_expiration: int = 365
-) -> str:
-    if file_system_creds_path is not None:
-        file_system = fsspec.filesystem(file_system_name, token=file_system_creds_path)
-    else:
-        file_system = fsspec.filesystem(file_system_name)
+# Максимальный срок жизни V4 подписи GCS.
+GCS_V4_MAX_EXPIRATION_SECONDS = 7 * 24 * 60 * 60
 
-    image_fs_path = get_gs_path_from_image_url(image_url=url)
 
+def _get_gcs_signing_credentials(file_system: fsspec.AbstractFileSystem) -> Any | None:
+    """
+    Креденшелы gcsfs, которыми можно подписать ссылку локально (ключ сервисного аккаунта), иначе None.
+    """
+    credentials = getattr(getattr(file_system, "credentials", None), "credentials", None)
+    if getattr(credentials, "signer_email", None) and hasattr(credentials, "sign_bytes"):
+        return credentials
+    return None
+
+
+def sign_gcs_url_v4(credentials: Any, gs_path: str, signed_at: datetime.datetime, expiration_seconds: int) -> str:
+    """
+    V4 подпись GET ссылки на объект GCS ключом сервисного аккаунта, без запросов к GCS.
+
+    Подпись зависит только от пути, ключа, времени подписи и срока, поэтому при одинаковом signed_at
+    все реплики и перезапуски получают одну и ту же ссылку.
+
+    :param credentials: креденшелы google-auth с sign_bytes и signer_email
+    :param gs_path: путь объекта gs://bucket/key
+    :param signed_at: время подписи (начало действия ссылки)
+    :param expiration_seconds: срок действия от signed_at, не больше 7 дней
+    """
+    bucket, _, key = gs_path.removeprefix("gs://").partition("/")
+    request_timestamp = signed_at.astimezone(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    credential_scope = f"{request_timestamp[:8]}/auto/storage/goog4_request"
+    canonical_uri = f"/{bucket}/{quote(key, safe='/~')}"
+    query = {
+        "X-Goog-Algorithm": "GOOG4-RSA-SHA256",
+        "X-Goog-Credential": f"{credentials.signer_email}/{credential_scope}",
+        "X-Goog-Date": request_timestamp,
+        "X-Goog-Expires": str(min(expiration_seconds, GCS_V4_MAX_EXPIRATION_SECONDS)),
+        "X-Goog-SignedHeaders": "host",
+    }
+    canonical_query = "&".join(
+        f"{quote(name, safe='')}={quote(value, safe='')}" for name, value in sorted(query.items())
+    )
+    canonical_request = "\n".join(
+        ["GET", canonical_uri, canonical_query, "host:storage.googleapis.com\n", "host", "UNSIGNED-PAYLOAD"]
+    )
+    string_to_sign = "\n".join(
+        [
+            "GOOG4-RSA-SHA256",
+            request_timestamp,
+            credential_scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ]
+    )
+    signature = credentials.sign_bytes(string_to_sign.encode()).hex()
+    return f"https://storage.googleapis.com{canonical_uri}?{canonical_query}&X-Goog-Signature={signature}"
+
+
+def _sign_file_system_url(
+    file_system: fsspec.AbstractFileSystem,
+    url: str,
+    expiration_seconds: int,
+    signed_at: datetime.datetime | None = None,
+) -> str:
+    image_fs_path = get_gs_path_from_image_url(image_url=url)
     try:
-        expiration = datetime.datetime.now() + datetime.timedelta(days=30)
-        signed_url = file_system.sign(
-            image_fs_path,
-            expiration=expiration,
-        )
+        credentials = _get_gcs_signing_credentials(file_system) if signed_at is not None else None
+        if credentials is not None and signed_at is not None:
+            signed_url = sign_gcs_url_v4(credentials, image_fs_path, signed_at, expiration_seconds)
+        else:
+            # fsspec принимает срок жизни ссылки в секундах.
+            signed_url = file_system.sign(
+                image_fs_path,
+                expiration=expiration_seconds,
+            )
+        SIGNED_URLS.labels("signed").inc()
         return signed_url
     except Exception as e:
+        SIGNED_URLS.labels("error").inc()
         logger.error(f"Failed to get signed url for {image_fs_path}: {e}")
         return ""
 
 
+def get_signed_url(
+    url: str, file_system_name: str, file_system_creds_path: str | None = None, days_expiration: int = 365
+) -> str:
+    file_system = get_file_system(file_system_name, file_system_creds_path)
+    return _sign_file_system_url(file_system, url, days_expiration * 24 * 60 * 60)
+
+
+def sign_urls(
+    urls: list[str],
+    file_system_name: str,
+    file_system_creds_path: str | None = None,
+    days_expiration: int = 365,
+    max_workers: int = 8,
+    expiration_seconds: int | None = None,
+    signed_at: datetime.datetime | None = None,
+) -> list[str]:
+    """
+    Подписывает список путей одной файловой системой (и одними креденшелами) в пуле потоков.
+
+    :param urls: пути файлов
+    :param file_system_name: имя файловой системы
+    :param file_system_creds_path: путь к креденшелам файловой системы
+    :param days_expiration: срок жизни ссылки в днях
+    :param max_workers: количество потоков для подписи
+    :param expiration_seconds: срок жизни ссылки в секундах, если задан, days_expiration не используется
+    :param signed_at: фиксированное время подписи (срок считается от него): для GCS с ключом сервисного
+        аккаунта ссылка подписывается локально и не зависит от момента вызова
+    :return: подписанные ссылки в порядке путей, пустая строка для путей, которые не удалось подписать
+    """
+    if not urls:
+        return []
+    file_system = get_file_system(file_system_name, file_system_creds_path)
+    if expiration_seconds is None:
+        expiration_seconds = days_expiration * 24 * 60 * 60
+    if len(urls) == 1:
+        return [_sign_file_system_url(file_system, urls[0], expiration_seconds, signed_at)]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+        return list(
+            executor.map(lambda url: _sign_file_system_url(file_system, url, expiration_seconds, signed_at), urls)
+        )
+
+
 def merge_metadata(row: pd.Series) -> dict:
     """
     Метод для подстановки default значений в metadata изображения пользователя (нужно, чтоб не сломать LabelStudio).
@@ -121,6 +463,42 @@ def google_details_to_status(details: dict) -> str:
     return CraftReviewStatus.APPROVED
 
 
+def parse_label_studio_annotations(annotations: list[dict]) -> tuple[bool, list[dict], Optional[datetime.datetime]]:
+    """
+    Метод для разбора аннотаций задачи LabelStudio.
+
+    :param annotations: аннотации задачи LabelStudio.
+    :return: флаг удаления (выбран DELETE), данные модерации и время последней аннотации
+        (naive UTC, None - в аннотациях нет времени).
+    """
+
+    delete_flag = False
+    moderation_entries = []
+    reviewed_at = None
+
+    for annotation in annotations:
+        for result in annotation["result"]:
+            from_name = result["from_name"]
+            choices = result.get("value", {"choices": []}).get("choices", [])
+
+            # Если модерация содержит удаление, то изображение удаляется.
+            if from_name == "moderation" and "DELETE" in choices:
+                delete_flag = True
+
+            # Собираем данные по модерации.
+            moderation_entries.append({"choice_name": from_name, "choices": choices})
+
+        # Время ревью - время самой поздней аннотации, а не время обработки.
+        annotated_at = annotation.get("updated_at") or annotation.get("created_at")
+        if annotated_at:
+            value = pd.Timestamp(annotated_at)
+            value = value.tz_convert("UTC").tz_localize(None) if value.tzinfo is not None else value
+            if reviewed_at is None or value > reviewed_at:
+                reviewed_at = value.to_pydatetime()
+
+    return delete_flag, moderation_entries, reviewed_at
+
+
 def remove_data_by_keys(initial_df: pd.DataFrame, remove_df: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
     """
     Метод для удаления данных из DataFrame, которые есть в другом DataFrame по заданным ключам.
@@ -137,18 +515,197 @@ def remove_data_by_keys(initial_df: pd.DataFrame, remove_df: pd.DataFrame, keys:
     return result_df
 
 
-def save_image_to_io_bytes(img: Image.Image, image_format: str) -> bytes:
+@dataclass
+class EncodeOptions:
+    """
+    Параметры кодирования изображения из конфигурации сжатия.
+
+    None означает значение по умолчанию для выбранного энкодера.
+    method - "усилие" кодирования 0..6 (как у WEBP): больше - медленнее и меньше размер.
+    """
+
+    quality: int | None = None
+    method: int | None = None
+    lossless: bool | None = None
+    progressive: bool | None = None
+    optimize: bool | None = None
+
+    @classmethod
+    def from_row(cls, row: pd.Series) -> "EncodeOptions":
+        values = {}
+        for option in fields(cls):
+            value = row.get(option.name)
+            # pandas превращает отсутствующие значения в NaN.
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            values[option.name] = bool(value) if bool in get_args(option.type) else int(value)
+        return cls(**values)
+
+
+class FitModeEnum(StrEnum):
+    # Вписать в width x max_height с сохранением пропорций.
+    CONTAIN = "contain"
+    # Заполнить width x max_height, обрезав лишнее по центру.
+    COVER = "cover"
+
+
+@dataclass
+class ResizeOptions:
+    """
+    Параметры ресайза из конфигурации сжатия.
+
+    max_height - ограничение по высоте, fit - как вписывать в width x max_height,
+    no_upscale - не увеличивать изображения меньше целевого размера.
+    """
+
+    max_height: int | None = None
+    fit: FitModeEnum = FitModeEnum.CONTAIN
+    no_upscale: bool = False
+
+    @classmethod
+    def from_row(cls, row: pd.Series) -> "ResizeOptions":
+        max_height = row.get("max_height")
+        fit = row.get("fit")
+        return cls(
+            max_height=int(max_height) if pd.notna(max_height) else None,
+            fit=FitModeEnum(fit) if isinstance(fit, str) else FitModeEnum.CONTAIN,
+            no_upscale=bool(row.get("no_upscale")) if pd.notna(row.get("no_upscale")) else False,
+        )
+
+
+@dataclass
+class AnimationOptions:
+    """
+    Ограничения анимированного варианта. None - без ограничения, max_frames = 1 - только первый кадр.
+    """
+
+    max_frames: int | None = None
+    max_duration_ms: int | None = None
+
+    @classmethod
+    def from_row(cls, row: pd.Series) -> "AnimationOptions":
+        max_frames = row.get("max_frames")
+        max_duration_ms = row.get("max_duration_ms")
+        return cls(
+            max_frames=int(max_frames) if pd.notna(max_frames) else None,
+            max_duration_ms=int(max_duration_ms) if pd.notna(max_duration_ms) else None,
+        )
+
+
+ImageEncoder = Callable[[Image.Image, str, EncodeOptions], bytes]
+
+
+# Параметры save Pillow по форматам: имя параметра -> (опция EncodeOptions, преобразование значения).
+PILLOW_SAVE_PARAMS: dict[str, dict[str, tuple[str, Callable[[Any], Any]]]] = {
+    "WEBP": {
+        "quality": ("quality", int),
+        "method": ("method", int),
+        "lossless": ("lossless", bool),
+    },
+    "AVIF": {
+        "quality": ("quality", int),
+        # speed у AVIF 0..10 и обратен усилию.
+        "speed": ("method", lambda method: round(10 - method * 10 / 6)),
+    },
+    "JPEG": {
+        "quality": ("quality", int),
+        "optimize": ("optimize", bool),
+        "progressive": ("progressive", bool),
+    },
+    "PNG": {
+        "optimize": ("optimize", bool),
+    },
+}
+
+
+def _get_pillow_save_params(image_format: str, options: EncodeOptions) -> dict[str, Any]:
+    params: dict[str, Any] = {}
+    for param, (option, convert) in PILLOW_SAVE_PARAMS.get(image_format, {}).items():
+        value = getattr(options, option)
+        if value is not None:
+            params[param] = convert(value)
+    return params
+
+
+def pillow_image_encoder(img: Image.Image, image_format: str, options: EncodeOptions) -> bytes:
+    """
+    Энкодер по умолчанию через PIL (при установленном pillow-simd используется он же).
+    """
+
+    if image_format == "JPEG" and img.mode not in ("RGB", "L", "CMYK"):
+        img = img.convert("RGB")
+    with io.BytesIO() as output:
+        img.save(output, format=image_format, **_get_pillow_save_params(image_format, options))
+        return output.getvalue()
+
+
+def vips_image_encoder(img: Image.Image, image_format: str, options: EncodeOptions) -> bytes:
+    """
+    Энкодер через libvips (pyvips), заметно быстрее PIL на WEBP и AVIF.
+    """
+
+    import pyvips
+
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    vips_img = pyvips.Image.new_from_memory(img.tobytes(), img.width, img.height, len(img.getbands()), "uchar")
+
+    params: dict[str, Any] = {}
+    if options.quality is not None:
+        params["Q"] = options.quality
+    if options.method is not None:
+        # effort у AVIF 0..9, у WEBP 0..6.
+        params["effort"] = options.method if image_format == "WEBP" else round(options.method * 9 / 6)
+    if options.lossless is not None:
+        params["lossless"] = options.lossless
+    if image_format == "AVIF":
+        params["compression"] = "av1"
+        return vips_img.heifsave_buffer(**params)
+    return vips_img.webpsave_buffer(**params)
+
+
+IMAGE_ENCODERS: dict[str, ImageEncoder] = {}
+
+
+def register_image_encoder(image_format: str, encoder: ImageEncoder) -> None:
+    IMAGE_ENCODERS[image_format.upper()] = encoder
+
+
+def get_image_encoder(image_format: str) -> ImageEncoder:
+    return IMAGE_ENCODERS.get(image_format.upper(), pillow_image_encoder)
+
+
+def _register_default_encoders() -> None:
+    try:
+        import pyvips  # noqa: F401
+    except (ImportError, OSError):
+        pass
+    else:
+        for image_format in ("WEBP", "AVIF"):
+            register_image_encoder(image_format, vips_image_encoder)
+
+    try:
+        # Плагин нужен для Pillow без встроенной поддержки AVIF.
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        pass
+
+
+_register_default_encoders()
+
+
+def save_image_to_io_bytes(img: Image.Image, image_format: str, encode_options: EncodeOptions | None = None) -> bytes:
     """
     Метод сохранения PIL.Image в bytes в указанном image_format.
 
     :param img: PIL Image.
     :param image_format: формат изображения.
+    :param encode_options: параметры кодирования (качество, усилие и т.д.).
     """
 
     image_format = image_format.upper()
-    with io.BytesIO() as output:
-        img.save(output, format=image_format)
-        return output.getvalue()
+    encoder = get_image_encoder(image_format)
+    return encoder(img, image_format, encode_options or EncodeOptions())
 
 
 class ResamplingMapEnum(StrEnum):
@@ -171,26 +728,469 @@ def get_resampling_mode(name: ResamplingMapEnum) -> Image.Resampling:
 
 
 def get_image_sizes(img: Image.Image, width: int) -> tuple[int, int]:
-    original_width, original_height = img.size
+    return get_target_size(img.size, width)
 
-    if width == 0:
+
+def get_target_size(
+    size: tuple[int, int], width: int, resize_options: ResizeOptions | None = None
+) -> tuple[int, int]:
+    """
+    Итоговый размер варианта.
+
+    :param size: размер исходника
+    :param width: ширина из конфигурации, 0 - без ограничения по ширине
+    :param resize_options: ограничение по высоте, режим вписывания и запрет увеличения (опционально)
+    """
+    original_width, original_height = size
+    resize_options = resize_options or ResizeOptions()
+    max_height = resize_options.max_height
+
+    if width == 0 and max_height is None:
         # width = 0 в конфигурации означает нет изменений размера.
-        width, height = original_width, original_height
-    else:
+        return size
+
+    if max_height is None:
         ratio = width / original_width
-        height = int(original_height * ratio)
+        if resize_options.no_upscale and ratio > 1:
+            return size
+        return width, int(original_height * ratio)
+
+    if width == 0:
+        ratio = max_height / original_height
+    elif resize_options.fit == FitModeEnum.COVER:
+        ratio = max(width / original_width, max_height / original_height)
+    else:
+        ratio = min(width / original_width, max_height / original_height)
 
-    return width, height
+    if resize_options.fit == FitModeEnum.COVER and width != 0:
+        # Вариант заполняет width x max_height, лишнее обрезается по центру.
+        if resize_options.no_upscale and ratio > 1:
+            return min(width, original_width), min(max_height, original_height)
+        return width, max_height
 
+    if resize_options.no_upscale and ratio > 1:
+        return size
+    return max(1, round(original_width * ratio)), max(1, round(original_height * ratio))
 
-def get_modified_image(img: Image.Image, resampling: ResamplingMapEnum, image_format: str, width: int) -> bytes:
+
+EXIF_ORIENTATION_TAG = 0x0112
+# Значения EXIF Orientation, при которых изображение повернуто на 90 градусов.
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+@dataclass
+class ImageMetaInfo:
+    # Размеры с учетом EXIF Orientation.
+    width: int
+    height: int
+    image_format: str | None
+    orientation: int
+    mode: str
+    frame_count: int
+
+
+def get_image_orientation(img: Image.Image) -> int:
+    orientation = img.getexif().get(EXIF_ORIENTATION_TAG, 1)
+    return orientation if orientation in range(1, 9) else 1
+
+
+def get_image_meta(img: Image.Image) -> ImageMetaInfo:
+    """
+    Метаданные изображения по заголовку, без декодирования пикселей.
+    """
+    orientation = get_image_orientation(img)
+    width, height = img.size
+    if orientation in TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+    return ImageMetaInfo(
+        width=width,
+        height=height,
+        image_format=img.format,
+        orientation=orientation,
+        mode=img.mode,
+        frame_count=getattr(img, "n_frames", 1),
+    )
+
+
+def is_animated(img: Image.Image) -> bool:
+    return bool(getattr(img, "is_animated", False))
+
+
+def get_oriented_image(img: Image.Image) -> Image.Image:
+    """
+    Поворачивает изображение согласно EXIF Orientation. Без поворота возвращает исходное изображение без копии.
+    Анимированные изображения возвращаются как есть: поворот применяется к каждому кадру при кодировании.
+    """
+    if get_image_orientation(img) == 1 or is_animated(img):
+        return img
+    return cast(Image.Image, ImageOps.exif_transpose(img))
+
+
+def get_resized_image(
+    img: Image.Image, resampling: ResamplingMapEnum, width: int, resize_options: ResizeOptions | None = None
+) -> Image.Image:
     resampling_mode = get_resampling_mode(name=resampling)
 
-    new_width, new_height = get_image_sizes(img=img, width=width)
+    new_width, new_height = get_target_size(img.size, width, resize_options)
+
+    # resize возвращает новое изображение, поэтому отдельная копия исходника не нужна.
+    if (new_width, new_height) == img.size:
+        return img
+    if resize_options is not None and resize_options.fit == FitModeEnum.COVER and resize_options.max_height:
+        return ImageOps.fit(img, (new_width, new_height), method=resampling_mode)
+    return img.resize((new_width, new_height), resample=resampling_mode)
+
+
+# Форматы, в которые сохраняется анимация. В остальные форматы пишется только первый кадр.
+ANIMATED_IMAGE_FORMATS = ("GIF", "WEBP", "PNG")
+
+EXIF_TRANSPOSE_METHODS = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+def get_crop_box(
+    size: tuple[int, int], target_size: tuple[int, int], resize_options: ResizeOptions | None = None
+) -> tuple[float, float, float, float] | None:
+    """
+    Область исходника для режима cover (обрезка по центру, как в ImageOps.fit). None - без обрезки.
+    """
+    if resize_options is None or resize_options.fit != FitModeEnum.COVER or not resize_options.max_height:
+        return None
+    width, height = size
+    target_width, target_height = target_size
+    scale = max(target_width / width, target_height / height)
+    crop_width, crop_height = target_width / scale, target_height / scale
+    left, top = (width - crop_width) / 2, (height - crop_height) / 2
+    return left, top, left + crop_width, top + crop_height
+
+
+def iter_resized_frames(
+    img: Image.Image,
+    resampling: ResamplingMapEnum,
+    width: int,
+    resize_options: ResizeOptions | None = None,
+    animation_options: AnimationOptions | None = None,
+) -> Iterator[tuple[Image.Image, int]]:
+    """
+    Лениво перебирает кадры анимации (ImageSequence) и возвращает их уменьшенные копии с длительностью в мс.
+
+    Размер, область обрезки, поворот и фильтр считаются один раз для всех кадров. В памяти одновременно
+    находится только один декодированный кадр исходника.
+    """
+    animation_options = animation_options or AnimationOptions()
+    orientation = get_image_orientation(img)
+    transpose_method = EXIF_TRANSPOSE_METHODS.get(orientation)
+    size = img.size[::-1] if orientation in TRANSPOSED_ORIENTATIONS else img.size
+    target_size = get_target_size(size, width, resize_options)
+    box = get_crop_box(size, target_size, resize_options)
+    resampling_mode = get_resampling_mode(name=resampling)
+
+    total_duration = 0
+    for index, frame in enumerate(ImageSequence.Iterator(img)):
+        if animation_options.max_frames is not None and index >= animation_options.max_frames:
+            break
+        duration = int(frame.info.get("duration", 0))
+        if animation_options.max_duration_ms is not None and index > 0:
+            if total_duration + duration > animation_options.max_duration_ms:
+                break
+        total_duration += duration
+
+        # Палитровые кадры GIF ресайзятся только NEAREST, поэтому переводятся в RGBA.
+        if frame.mode not in ("RGB", "RGBA"):
+            frame = frame.convert("RGBA")
+        if transpose_method is not None:
+            frame = frame.transpose(transpose_method)
+        if target_size == size and box is None:
+            yield frame.copy(), duration
+        else:
+            yield frame.resize(target_size, resample=resampling_mode, box=box), duration
+
+
+def get_animated_image_bytes(
+    img: Image.Image,
+    resampling: ResamplingMapEnum,
+    image_format: str,
+    width: int,
+    encode_options: EncodeOptions | None = None,
+    resize_options: ResizeOptions | None = None,
+    animation_options: AnimationOptions | None = None,
+) -> bytes:
+    """
+    Кодирует анимированное изображение в GIF, WEBP или PNG (APNG) с ресайзом всех кадров.
+
+    Анимированные энкодеры PIL получают всю последовательность кадров, поэтому хранятся только
+    уменьшенные кадры, декодированные кадры исходника освобождаются сразу после ресайза.
+    """
+    image_format = image_format.upper()
+    try:
+        frames, durations = zip(
+            *iter_resized_frames(img, resampling, width, resize_options, animation_options)
+        )
+    finally:
+        img.seek(0)
+
+    params = _get_pillow_save_params(image_format, encode_options or EncodeOptions())
+    if image_format == "GIF":
+        # Кадры уже наложены друг на друга, поэтому перед каждым кадром холст очищается.
+        params["disposal"] = 2
+    with io.BytesIO() as output:
+        frames[0].save(
+            output,
+            format=image_format,
+            save_all=True,
+            append_images=frames[1:],
+            duration=list(durations),
+            loop=img.info.get("loop", 0),
+            **params,
+        )
+        return output.getvalue()
+
+
+def get_modified_image(
+    img: Image.Image,
+    resampling: ResamplingMapEnum,
+    image_format: str,
+    width: int,
+    encode_options: EncodeOptions | None = None,
+    resize_options: ResizeOptions | None = None,
+    animation_options: AnimationOptions | None = None,
+) -> bytes:
+    if is_animated(img):
+        animation_options = animation_options or AnimationOptions()
+        if image_format.upper() in ANIMATED_IMAGE_FORMATS and animation_options.max_frames != 1:
+            return get_animated_image_bytes(
+                img=img,
+                resampling=resampling,
+                image_format=image_format,
+                width=width,
+                encode_options=encode_options,
+                resize_options=resize_options,
+                animation_options=animation_options,
+            )
+        # Формат без анимации (или один кадр): берется первый кадр с поворотом по EXIF Orientation.
+        img.seek(0)
+        if get_image_orientation(img) != 1:
+            img = cast(Image.Image, ImageOps.exif_transpose(img))
 
     # Обрабатываем (ресайзим с указанным resample и сохраняем в bytes).
-    modified_img = img.copy()
-    modified_img = modified_img.resize((new_width, new_height), resample=resampling_mode)
-    modified_img_bytes = save_image_to_io_bytes(img=modified_img, image_format=image_format)
+    modified_img = get_resized_image(img=img, resampling=resampling, width=width, resize_options=resize_options)
+    modified_img_bytes = save_image_to_io_bytes(
+        img=modified_img, image_format=image_format, encode_options=encode_options
+    )
 
     return modified_img_bytes
+
+
+# Растеризация страницы документа в PIL Image заданной ширины (0 - исходный размер страницы при 72 dpi).
+DocumentPreviewRenderer = Callable[[str | bytes, int], Image.Image]
+
+# Сигнатуры форматов документов, для которых есть рендерер превью.
+DOCUMENT_SIGNATURES = {b"%PDF-": "PDF"}
+
+
+def get_document_format(header: bytes) -> str | None:
+    for signature, document_format in DOCUMENT_SIGNATURES.items():
+        if header.startswith(signature):
+            return document_format
+    return None
+
+
+def pdf_preview_renderer(source: str | bytes, width: int) -> Image.Image:
+    """
+    Рендерит первую страницу PDF через pdfium сразу в целевой ширине, без последующего ресайза.
+
+    :param source: локальный путь к файлу (pdfium читает только нужные объекты) или байты документа.
+    :param width: ширина превью.
+    """
+
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(source)
+    try:
+        page = pdf[0]
+        page_width, _ = page.get_size()
+        bitmap = page.render(scale=width / page_width if width else 1)
+        # to_pil разделяет память с bitmap, convert делает независимую копию.
+        return bitmap.to_pil().convert("RGB")
+    finally:
+        pdf.close()
+
+
+DOCUMENT_PREVIEW_RENDERERS: dict[str, DocumentPreviewRenderer] = {"PDF": pdf_preview_renderer}
+
+
+def register_document_preview_renderer(document_format: str, renderer: DocumentPreviewRenderer) -> None:
+    DOCUMENT_PREVIEW_RENDERERS[document_format.upper()] = renderer
+
+
+def get_document_preview_renderer(document_format: str) -> DocumentPreviewRenderer | None:
+    return DOCUMENT_PREVIEW_RENDERERS.get(document_format.upper())
+
+
+# Срок жизни подписанной ссылки, по которой ffmpeg читает видео из удаленного хранилища.
+VIDEO_INPUT_URL_EXPIRATION_SECONDS = 60 * 60
+
+
+STILL_IMAGE_FORMAT_NAMES = ("image2", "gif", "apng", "webp", "mjpeg")
+
+
+@dataclass
+class VideoMetaInfo:
+    # Размеры с учетом поворота из метаданных (как видео показывается).
+    width: int
+    height: int
+    duration: float | None
+    video_codec: str | None
+    frame_rate: float | None
+    rotation: int
+
+
+def _parse_frame_rate(value: str | None) -> float | None:
+    if not value or "/" not in value:
+        return None
+    numerator, denominator = value.split("/", 1)
+    if float(denominator) == 0:
+        return None
+    return float(numerator) / float(denominator)
+
+
+def _get_stream_rotation(stream: dict) -> int:
+    rotation = stream.get("tags", {}).get("rotate")
+    for side_data in stream.get("side_data_list", []):
+        if "rotation" in side_data:
+            rotation = side_data["rotation"]
+    return int(float(rotation)) % 360 if rotation is not None else 0
+
+
+def parse_video_probe(probe: dict) -> VideoMetaInfo | None:
+    """
+    Метаданные видео из JSON-вывода ffprobe (-show_format -show_streams). None, если видеопотока нет.
+    """
+    format_name = probe.get("format", {}).get("format_name", "")
+    if format_name in STILL_IMAGE_FORMAT_NAMES or format_name.endswith("_pipe"):
+        # ffprobe открывает и изображения (демультиплексоры image2, *_pipe, gif), их обрабатывает compress.
+        return None
+    video_streams = [
+        stream
+        for stream in probe.get("streams", [])
+        # Обложки (attached_pic) в mp3/m4a тоже видеопотоки, но не видео.
+        if stream.get("codec_type") == "video" and not stream.get("disposition", {}).get("attached_pic")
+    ]
+    if not video_streams:
+        return None
+    stream = video_streams[0]
+
+    width, height = int(stream["width"]), int(stream["height"])
+    rotation = _get_stream_rotation(stream)
+    if rotation % 180 == 90:
+        width, height = height, width
+    duration = probe.get("format", {}).get("duration") or stream.get("duration")
+    return VideoMetaInfo(
+        width=width,
+        height=height,
+        duration=float(duration) if duration is not None else None,
+        video_codec=stream.get("codec_name"),
+        frame_rate=_parse_frame_rate(stream.get("avg_frame_rate")),
+        rotation=rotation,
+    )
+
+
+@contextmanager
+def open_video_input(
+    url: str,
+    file_system_name: str,
+    file_system_creds_path: Optional[str] = None,
+    content_hash: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Путь или URL, по которому ffmpeg читает видео.
+
+    Локальный файл (или уже закэшированная копия) отдается по пути, удаленный - по подписанной ссылке:
+    ffmpeg читает по HTTP только нужные диапазоны байт. Если хранилище не умеет подписывать ссылки,
+    файл скачивается во временный файл.
+    """
+    local_cache = get_local_cache()
+    local_path = get_local_path(url, file_system_name) or (local_cache.get(url, content_hash) if local_cache else None)
+    if local_path is not None:
+        yield local_path
+        return
+
+    file_system = get_file_system(file_system_name, file_system_creds_path)
+    signed_url = _sign_file_system_url(file_system, url, VIDEO_INPUT_URL_EXPIRATION_SECONDS)
+    if signed_url:
+        yield signed_url
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=".video") as tmp_file:
+        file_system.get_file(url, tmp_file.name)
+        yield tmp_file.name
+
+
+def probe_video(input_url: str, ffprobe_path: str = "ffprobe", timeout: float = 60) -> VideoMetaInfo | None:
+    """
+    Метаданные видео через ffprobe. Читаются только заголовки контейнера, кадры не декодируются.
+
+    None - файл не удалось разобрать (не видео). Таймаут и отсутствие ffprobe поднимают исключение.
+    """
+    result = subprocess.run(
+        [ffprobe_path, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", input_url],
+        capture_output=True,
+        timeout=timeout,
+        check=False,
+    )
+    if result.returncode != 0:
+        # input_url удаленного файла - подписанная ссылка, в лог она не попадает.
+        stderr = result.stderr.decode(errors="replace").strip().replace(input_url, "<input>")
+        logger.debug(f"ffprobe failed: {stderr}")
+        return None
+    return parse_video_probe(json.loads(result.stdout))
+
+
+def get_poster_position(duration: float | None, seek_seconds: float) -> float:
+    """
+    Момент кадра-постера: seek_seconds, но не дальше середины ролика (короткие видео).
+    """
+    if duration is None:
+        return 0.0
+    return max(0.0, min(seek_seconds, duration / 2))
+
+
+def extract_video_frame(
+    input_url: str, position_seconds: float, ffmpeg_path: str = "ffmpeg", timeout: float = 60
+) -> bytes:
+    """
+    Один кадр видео в PNG.
+
+    -ss перед -i перематывает по индексу к ближайшему ключевому кадру, поэтому декодируется только
+    небольшой участок потока, а не все видео до нужного момента. Поворот из метаданных ffmpeg применяет сам.
+    """
+    result = subprocess.run(
+        [
+            ffmpeg_path,
+            "-v",
+            "error",
+            "-ss",
+            f"{position_seconds:.3f}",
+            "-i",
+            input_url,
+            "-frames:v",
+            "1",
+            "-f",
+            "image2pipe",
+            "-c:v",
+            "png",
+            "-",
+        ],
+        capture_output=True,
+        timeout=timeout,
+        check=True,
+    )
+    return result.stdout
+
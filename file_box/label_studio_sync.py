@@ -0,0 +1,255 @@
+import datetime
+import json
+import time
+from typing import Iterator, Optional
+
+import requests
+import sqlalchemy as sa
+from loguru import logger
+from sqlalchemy.dialects.postgresql import insert
+
+from file_box import tables
+from file_box.db_utils import get_engine, get_sessionmaker, to_utc_naive, utcnow
+from file_box.file_utils import parse_label_studio_annotations
+from file_box.locks import advisory_lock, advisory_lock_key
+from file_box.metrics import LABEL_STUDIO_SYNCED_TASKS
+from file_box.purge import mark_files_deleted
+
+# Позиция синхронизации: updated_at и id последней обработанной задачи (задачи упорядочены по этой паре).
+Watermark = tuple[datetime.datetime, int]
+
+
+def parse_label_studio_datetime(value: str) -> datetime.datetime:
+    return to_utc_naive(datetime.datetime.fromisoformat(value.replace("Z", "+00:00")))
+
+
+def get_task_position(task: dict) -> Watermark:
+    return parse_label_studio_datetime(task["updated_at"]), int(task["id"])
+
+
+class LabelStudioClient:
+    """
+    Клиент API задач LabelStudio (GET /api/tasks) для инкрементальной выгрузки результатов модерации.
+    """
+
+    def __init__(self, url: str, api_key: Optional[str] = None, timeout: float = 60) -> None:
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._session = requests.Session()
+        if api_key is not None:
+            self._session.headers["Authorization"] = f"Token {api_key}"
+
+    def get_updated_tasks(
+        self, project_id: int, updated_since: Optional[datetime.datetime], page: int, page_size: int
+    ) -> list[dict]:
+        """
+        Страница задач проекта с updated_at >= updated_since, упорядоченных по (updated_at, id).
+
+        :param project_id: id проекта LabelStudio
+        :param updated_since: нижняя граница updated_at (naive UTC), None - все задачи
+        :param page: номер страницы, с 1
+        :param page_size: размер страницы
+        """
+        filters = []
+        if updated_since is not None:
+            filters.append(
+                {
+                    "filter": "filter:tasks:updated_at",
+                    "operator": "greater_or_equal",
+                    "type": "Datetime",
+                    "value": updated_since.isoformat() + "Z",
+                }
+            )
+        query = {
+            "filters": {"conjunction": "and", "items": filters},
+            "ordering": ["tasks:updated_at", "tasks:id"],
+        }
+        response = self._session.get(
+            f"{self.url}/api/tasks",
+            params={
+                "project": project_id,
+                "page": page,
+                "page_size": page_size,
+                "fields": "all",
+                "query": json.dumps(query),
+            },
+            timeout=self.timeout,
+        )
+        # LabelStudio отвечает 404 на страницу за последней.
+        if response.status_code == 404:
+            return []
+        response.raise_for_status()
+        data = response.json()
+        return data["tasks"] if isinstance(data, dict) else data
+
+
+def iter_task_batches(
+    client: LabelStudioClient, project_id: int, watermark: Optional[Watermark], batch_size: int
+) -> Iterator[tuple[list[dict], Watermark]]:
+    """
+    Задачи, обновленные после watermark, батчами не больше batch_size, с позицией последней задачи батча.
+
+    Каждый батч запрашивается заново от текущей позиции (keyset), поэтому задачи, обновленные во время
+    синхронизации, не теряются: они переезжают в конец выборки и попадают в следующие батчи.
+
+    :param client: клиент LabelStudio
+    :param project_id: id проекта LabelStudio
+    :param watermark: позиция предыдущей синхронизации, None - с начала
+    :param batch_size: размер батча
+    """
+    page = 1
+    while True:
+        tasks = client.get_updated_tasks(project_id, watermark[0] if watermark else None, page, batch_size)
+        new_tasks = sorted(
+            (task for task in tasks if watermark is None or get_task_position(task) > watermark),
+            key=get_task_position,
+        )
+        if new_tasks:
+            watermark = get_task_position(new_tasks[-1])
+            yield new_tasks, watermark
+            page = 1
+        elif len(tasks) == batch_size:
+            # Вся страница - уже обработанные задачи с updated_at, равным watermark: листаем дальше.
+            page += 1
+            continue
+        if len(tasks) < batch_size:
+            return
+
+
+def get_watermark(name: str) -> Optional[Watermark]:
+    stmt = sa.select(tables.SyncWatermark.watermark_at, tables.SyncWatermark.watermark_id).where(
+        tables.SyncWatermark.name == name
+    )
+    with get_sessionmaker()() as session:
+        row = session.execute(stmt).first()
+    return (row.watermark_at, row.watermark_id) if row is not None else None
+
+
+def apply_label_studio_tasks(tasks: list[dict], name: str, watermark: Watermark) -> None:
+    """
+    Сохраняет результаты модерации батча задач и сдвигает watermark в одной транзакции.
+
+    Время ревью - время аннотации в LabelStudio (если его нет - updated_at задачи), а не время синхронизации.
+
+    :param tasks: задачи LabelStudio
+    :param name: имя синхронизации (ключ watermark)
+    :param watermark: позиция последней задачи батча
+    """
+    deleted_data = []
+    moderation_data = []
+    for task in tasks:
+        data = task.get("data", {})
+        annotations = task.get("annotations") or []
+        if not annotations or "file_id" not in data:
+            LABEL_STUDIO_SYNCED_TASKS.labels("skipped").inc()
+            continue
+        delete_flag, moderation_entries, reviewed_at = parse_label_studio_annotations(annotations)
+        row = {
+            "file_id": data["file_id"],
+            "file_type": data["file_type"],
+            "last_reviewed": reviewed_at or parse_label_studio_datetime(task["updated_at"]),
+        }
+        if delete_flag:
+            deleted_data.append(row)
+        else:
+            moderation_data.append({**row, "moderation_data": moderation_entries})
+
+    # Пометка идемпотентна: если транзакция ниже не пройдет, батч обработается повторно.
+    mark_files_deleted([row["file_id"] for row in deleted_data])
+
+    with get_sessionmaker().begin() as session:
+        if deleted_data:
+            stmt = insert(tables.FileDeletedData).values(deleted_data)
+            session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["file_id", "file_type"], set_={"last_reviewed": stmt.excluded.last_reviewed}
+                )
+            )
+            session.execute(
+                sa.delete(tables.ImageModerationManual).where(
+                    sa.tuple_(tables.ImageModerationManual.file_id, tables.ImageModerationManual.file_type).in_(
+                        [(row["file_id"], row["file_type"]) for row in deleted_data]
+                    )
+                )
+            )
+        if moderation_data:
+            stmt = insert(tables.ImageModerationManual).values(moderation_data)
+            session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["file_id", "file_type"],
+                    set_={
+                        "moderation_data": stmt.excluded.moderation_data,
+                        "last_reviewed": stmt.excluded.last_reviewed,
+                    },
+                )
+            )
+        stmt = insert(tables.SyncWatermark).values(
+            name=name, watermark_at=watermark[0], watermark_id=watermark[1], updated_at=utcnow()
+        )
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["name"],
+                set_={
+                    "watermark_at": stmt.excluded.watermark_at,
+                    "watermark_id": stmt.excluded.watermark_id,
+                    "updated_at": stmt.excluded.updated_at,
+                },
+            )
+        )
+
+    LABEL_STUDIO_SYNCED_TASKS.labels("deleted").inc(len(deleted_data))
+    LABEL_STUDIO_SYNCED_TASKS.labels("moderated").inc(len(moderation_data))
+
+
+def sync_label_studio(client: LabelStudioClient, project_id: int, batch_size: int = 100) -> int:
+    """
+    Инкрементальная синхронизация результатов модерации: только задачи, обновленные после сохраненного watermark.
+
+    Параллельные запуски (в нескольких репликах или пересекающиеся запуски по расписанию) работают
+    по очереди через advisory lock.
+
+    :param client: клиент LabelStudio
+    :param project_id: id проекта LabelStudio
+    :param batch_size: сколько задач обрабатывается за один батч
+    :return: число обработанных задач
+    """
+    name = f"label_studio:{project_id}"
+    synced = 0
+    with advisory_lock(get_engine(), advisory_lock_key("label_studio_sync", project_id)):
+        for tasks, watermark in iter_task_batches(client, project_id, get_watermark(name), batch_size):
+            start = time.perf_counter()
+            apply_label_studio_tasks(tasks, name, watermark)
+            synced += len(tasks)
+            logger.info(
+                f"Synced {len(tasks)} Label Studio tasks up to {watermark[0].isoformat()} "
+                f"in {time.perf_counter() - start:.1f}s"
+            )
+    return synced
+
+
+def main() -> None:
+    from file_box.settings import pipeline_config
+
+    if pipeline_config.label_studio_url is None or pipeline_config.label_studio_project_id is None:
+        raise ValueError("LABEL_STUDIO_URL and LABEL_STUDIO_PROJECT_ID must be set")
+    client = LabelStudioClient(pipeline_config.label_studio_url, pipeline_config.label_studio_api_key)
+
+    while True:
+        try:
+            sync_label_studio(
+                client,
+                pipeline_config.label_studio_project_id,
+                batch_size=pipeline_config.label_studio_sync_batch_size,
+            )
+        except Exception as e:
+            if pipeline_config.label_studio_sync_interval_seconds <= 0:
+                raise
+            logger.exception(f"Label Studio sync failed: {e}")
+        # Интервал <= 0 - один проход (запуск по расписанию, например CronJob).
+        if pipeline_config.label_studio_sync_interval_seconds <= 0:
+            return
+        time.sleep(pipeline_config.label_studio_sync_interval_seconds)
+
+
+if __name__ == "__main__":
+    main()
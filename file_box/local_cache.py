@@ -0,0 +1,159 @@
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+import fsspec
+from loguru import logger
+
+from file_box.metrics import LOCAL_CACHE_EVICTED_BYTES, LOCAL_CACHE_REQUESTS
+
+
+class LocalFileCache:
+    """
+    LRU-кэш объектов удаленного хранилища на локальном диске с ограничением по объему.
+
+    Объект лежит в {cache_dir}/{sha256(путь)[:2]}/{sha256(путь)}/{sha256(содержимое)}: по пути хранится
+    только последняя версия, а хэш содержимого позволяет проверить, что в кэше актуальная версия
+    (content_hash из file_box_file_data и file_box_compress_data). Вытесняются объекты, к которым дольше
+    всего не обращались; время обращения хранится в mtime файла и переживает перезапуск процесса.
+
+    Объем учитывается в памяти процесса: если каталог делят несколько процессов (воркеры uvicorn, шаги
+    пайплайна на одном узле), каждый ограничивает только свои записи и вместе они могут занять до
+    max_bytes на процесс. Для общего бюджета каждому процессу нужен свой каталог или доля max_bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Каталог объекта -> (путь к версии, размер), от давно не использованных к недавним.
+        self._entries: OrderedDict[str, tuple[str, int]] = OrderedDict()
+        self._total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_entries()
+
+    def _load_entries(self) -> None:
+        entries = []
+        for prefix in os.scandir(self.cache_dir):
+            if not prefix.is_dir():
+                continue
+            for entry_dir in os.scandir(prefix.path):
+                for version in os.scandir(entry_dir.path):
+                    if version.name.endswith(".tmp"):
+                        os.remove(version.path)
+                        continue
+                    stat = version.stat()
+                    entries.append((stat.st_mtime, entry_dir.path, version.path, stat.st_size))
+        for _, entry_dir_path, version_path, size in sorted(entries):
+            self._entries[entry_dir_path] = (version_path, size)
+            self._total_bytes += size
+
+    def _get_entry_dir(self, url: str) -> str:
+        url_hash = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.cache_dir, url_hash[:2], url_hash)
+
+    def get(self, url: str, content_hash: str | None = None) -> str | None:
+        """
+        Путь к объекту в кэше или None. Если передан content_hash, подходит только эта версия.
+        """
+        entry_dir = self._get_entry_dir(url)
+        with self._lock:
+            entry = self._entries.get(entry_dir)
+            if entry is not None and (content_hash is None or os.path.basename(entry[0]) == content_hash):
+                self._entries.move_to_end(entry_dir)
+            else:
+                entry = None
+        if entry is None or not os.path.exists(entry[0]):
+            LOCAL_CACHE_REQUESTS.labels("miss").inc()
+            return None
+        LOCAL_CACHE_REQUESTS.labels("hit").inc()
+        os.utime(entry[0])
+        return entry[0]
+
+    def put(self, url: str, data: bytes) -> str:
+        """
+        Сохраняет объект в кэш (write-through при записи в хранилище) и возвращает путь к нему.
+        """
+        entry_dir = self._get_entry_dir(url)
+        os.makedirs(entry_dir, exist_ok=True)
+        tmp_path = os.path.join(entry_dir, f"{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as tmp_file:
+            tmp_file.write(data)
+        return self._commit(entry_dir, tmp_path, hashlib.sha256(data).hexdigest(), len(data))
+
+    def fetch(self, url: str, file_system: fsspec.AbstractFileSystem, content_hash: str | None = None) -> str:
+        """
+        Путь к объекту в кэше; при промахе объект скачивается из хранилища потоком, без чтения в память.
+        Если передан content_hash, копия другой версии считается промахом и скачивается заново.
+        """
+        cached_path = self.get(url, content_hash)
+        if cached_path is not None:
+            return cached_path
+
+        entry_dir = self._get_entry_dir(url)
+        os.makedirs(entry_dir, exist_ok=True)
+        tmp_path = os.path.join(entry_dir, f"{uuid.uuid4().hex}.tmp")
+        hasher = hashlib.sha256()
+        with file_system.open(url, "rb") as remote_file, open(tmp_path, "wb") as tmp_file:
+            while chunk := remote_file.read(1024 * 1024):
+                hasher.update(chunk)
+                tmp_file.write(chunk)
+        version_path = self._commit(entry_dir, tmp_path, hasher.hexdigest(), os.path.getsize(tmp_path))
+        if content_hash is not None and os.path.basename(version_path) != content_hash:
+            # Объект перезаписали после чтения хэша из БД: отдаем то, что сейчас лежит в хранилище.
+            logger.warning(f"Content hash of {url} does not match expected {content_hash}")
+        return version_path
+
+    def discard(self, url: str) -> None:
+        entry_dir = self._get_entry_dir(url)
+        with self._lock:
+            entry = self._entries.pop(entry_dir, None)
+            if entry is not None:
+                self._total_bytes -= entry[1]
+        shutil.rmtree(entry_dir, ignore_errors=True)
+
+    def _commit(self, entry_dir: str, tmp_path: str, content_hash: str, size: int) -> str:
+        version_path = os.path.join(entry_dir, content_hash)
+        os.replace(tmp_path, version_path)
+        with self._lock:
+            previous = self._entries.pop(entry_dir, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+                if previous[0] != version_path:
+                    self._remove_file(previous[0])
+            self._entries[entry_dir] = (version_path, size)
+            self._total_bytes += size
+            self._evict()
+        return version_path
+
+    def _evict(self) -> None:
+        # Последний добавленный объект не вытесняется, даже если он один больше бюджета.
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            entry_dir, (version_path, size) = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self._remove_file(version_path)
+            LOCAL_CACHE_EVICTED_BYTES.inc(size)
+            logger.debug(f"Evicted {entry_dir} ({size} bytes) from local cache")
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+_local_cache: LocalFileCache | None = None
+
+
+def configure_local_cache(cache_dir: str | None, max_bytes: int) -> LocalFileCache | None:
+    global _local_cache
+    _local_cache = LocalFileCache(cache_dir, max_bytes) if cache_dir is not None else None
+    return _local_cache
+
+
+def get_local_cache() -> LocalFileCache | None:
+    return _local_cache
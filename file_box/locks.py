@@ -0,0 +1,88 @@
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Any, Hashable, Iterator
+
+import sqlalchemy as sa
+from sqlalchemy import Connection, Engine
+
+
+class SingleFlight:
+    """
+    Локи по ключу внутри процесса.
+
+    Конкурентные вызовы с одним ключом выполняются по очереди: первый делает работу,
+    остальные после ожидания перепроверяют результат и переиспользуют его.
+    """
+
+    def __init__(self) -> None:
+        self._guard = threading.Lock()
+        self._locks: dict[Hashable, tuple[threading.Lock, int]] = {}
+
+    @contextmanager
+    def lock(self, key: Hashable) -> Iterator[None]:
+        with self._guard:
+            key_lock, waiters = self._locks.get(key, (threading.Lock(), 0))
+            self._locks[key] = (key_lock, waiters + 1)
+        try:
+            with key_lock:
+                yield
+        finally:
+            with self._guard:
+                key_lock, waiters = self._locks[key]
+                if waiters == 1:
+                    del self._locks[key]
+                else:
+                    self._locks[key] = (key_lock, waiters - 1)
+
+
+def advisory_lock_key(*parts: Any) -> int:
+    """
+    Ключ для pg_advisory_lock (signed bigint) из произвольных частей.
+    """
+
+    digest = hashlib.blake2b(":".join(str(part) for part in parts).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def try_advisory_locks(conn: Connection, keys: list[int]) -> list[bool]:
+    if not keys:
+        return []
+    rows = conn.execute(
+        sa.text(
+            "SELECT pg_try_advisory_lock(key) "
+            "FROM unnest(CAST(:keys AS bigint[])) WITH ORDINALITY AS t(key, n) ORDER BY n"
+        ),
+        {"keys": keys},
+    )
+    return [bool(acquired) for (acquired,) in rows]
+
+
+def wait_advisory_locks(conn: Connection, keys: list[int]) -> None:
+    """
+    Дожидается освобождения локов другими сессиями (берет и сразу отпускает каждый лок).
+    """
+
+    for key in sorted(keys):
+        conn.execute(sa.text("SELECT pg_advisory_lock(:key)"), {"key": key})
+        conn.execute(sa.text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+
+
+def release_advisory_locks(conn: Connection, keys: list[int]) -> None:
+    for key in keys:
+        conn.execute(sa.text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+
+
+@contextmanager
+def advisory_lock(engine: Engine, key: int) -> Iterator[None]:
+    """
+    Сессионный pg_advisory_lock: лок между репликами сервиса на время блока.
+    """
+
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.execute(sa.text("SELECT pg_advisory_lock(:key)"), {"key": key})
+        try:
+            yield
+        finally:
+            conn.execute(sa.text("SELECT pg_advisory_unlock(:key)"), {"key": key})
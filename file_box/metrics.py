@@ -0,0 +1,121 @@
+import time
+from functools import wraps
+from typing import Any, Callable, Iterator, TypeVar
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import REGISTRY, Collector
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+REQUEST_LATENCY = Histogram(
+    "file_box_http_request_duration_seconds",
+    "Latency of HTTP requests per route",
+    ["method", "route", "status"],
+)
+UPLOAD_BYTES = Counter(
+    "file_box_upload_bytes_total",
+    "Bytes received in uploaded files",
+    ["file_type"],
+)
+STEP_DURATION = Histogram(
+    "file_box_step_duration_seconds",
+    "Duration of a pipeline step batch",
+    ["step"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+STEP_STAGE_DURATION = Histogram(
+    "file_box_step_stage_duration_seconds",
+    "Duration of a stage (decode, resize, encode, ...) inside a pipeline step",
+    ["step", "stage"],
+)
+STORAGE_WRITE_DURATION = Histogram(
+    "file_box_storage_write_duration_seconds",
+    "Duration of a single object write to the file storage",
+    ["table"],
+)
+STORAGE_WRITE_BYTES = Counter(
+    "file_box_storage_write_bytes_total",
+    "Bytes written to the file storage",
+    ["table"],
+)
+SIGNED_URLS = Counter(
+    "file_box_signed_urls_total",
+    "Signed URL requests by result (signed, error, cache_hit)",
+    ["result"],
+)
+LOCAL_CACHE_REQUESTS = Counter(
+    "file_box_local_cache_requests_total",
+    "Local file cache lookups by result (hit, miss)",
+    ["result"],
+)
+LOCAL_CACHE_EVICTED_BYTES = Counter(
+    "file_box_local_cache_evicted_bytes_total",
+    "Bytes evicted from the local file cache",
+)
+
+MODERATION_REQUESTS = Counter(
+    "file_box_moderation_requests_total",
+    "Vision API moderation requests by result (ok, retry, error)",
+    ["result"],
+)
+MODERATION_CACHE_REQUESTS = Counter(
+    "file_box_moderation_cache_requests_total",
+    "Moderation result cache lookups by result (hit, miss)",
+    ["result"],
+)
+LABEL_STUDIO_SYNCED_TASKS = Counter(
+    "file_box_label_studio_synced_tasks_total",
+    "Label Studio tasks applied by the incremental sync by result (moderated, deleted, skipped)",
+    ["result"],
+)
+PURGED_FILES = Counter(
+    "file_box_purged_files_total",
+    "Soft-deleted files purged from storage and pipeline tables",
+)
+PURGED_OBJECTS = Counter(
+    "file_box_purged_objects_total",
+    "Objects removed from file tables by the purger",
+    ["table"],
+)
+
+
+def track_step_duration(func: F) -> F:
+    """
+    Оборачивает функцию шага пайплайна и пишет длительность батча в STEP_DURATION.
+
+    Имя и сигнатура функции сохраняются (datapipe строит по ним имя шага и аргументы).
+    """
+
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            STEP_DURATION.labels(func.__name__).observe(time.perf_counter() - start)
+
+    return wrapper  # type: ignore
+
+
+class DBPoolCollector(Collector):
+    def describe(self) -> list:
+        # Пустое описание, чтобы регистрация не создавала engine при импорте.
+        return []
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        from file_box.db_utils import get_engine
+
+        pool = get_engine().pool
+        for name, description, getter in (
+            ("file_box_db_pool_size", "Configured DB pool size", "size"),
+            ("file_box_db_pool_checked_out", "DB connections in use", "checkedout"),
+            ("file_box_db_pool_checked_in", "Idle DB connections in the pool", "checkedin"),
+            ("file_box_db_pool_overflow", "DB connections over the pool size", "overflow"),
+        ):
+            value = getattr(pool, getter, None)
+            if value is not None:
+                yield GaugeMetricFamily(name, description, value=value())
+
+
+REGISTRY.register(DBPoolCollector())
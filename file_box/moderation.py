@@ -0,0 +1,203 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+from typing import Any, Optional, Protocol
+
+import requests
+import sqlalchemy as sa
+from loguru import logger
+from sqlalchemy.dialects.postgresql import insert
+
+from file_box import tables
+from file_box.db_utils import get_sessionmaker, utcnow
+from file_box.metrics import MODERATION_CACHE_REQUESTS, MODERATION_REQUESTS
+
+VISION_ANNOTATE_URL = "https://vision.googleapis.com/v1/images:annotate"
+# Ограничение Vision API: не больше 16 изображений в одном images:annotate.
+MAX_VISION_BATCH_SIZE = 16
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Token bucket: в среднем не больше rate токенов в секунду, всплеск до capacity.
+
+    Общий для всех потоков процесса, acquire блокируется до появления нужного числа токенов.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class ModerationClient(Protocol):
+    def classify(self, image_uris: list[str]) -> list[dict | None]:
+        """
+        Классификация изображений: safe search details для каждого uri в том же порядке,
+        None - изображение не удалось классифицировать (ошибка Vision API для этого изображения).
+        """
+        raise NotImplementedError()
+
+
+class VisionModerationClient(ModerationClient):
+    """
+    Клиент SAFE_SEARCH_DETECTION Vision API.
+
+    Изображения отправляются пачками (images:annotate, до 16 за запрос) из пула потоков, скорость
+    ограничивается token bucket по числу изображений. Ошибки сети и ответы 429/5xx повторяются
+    с экспоненциальной задержкой. Изображения Vision читает сам по подписанной ссылке, без скачивания в сервис.
+    """
+
+    def __init__(
+        self,
+        endpoint: str = VISION_ANNOTATE_URL,
+        api_key: Optional[str] = None,
+        batch_size: int = MAX_VISION_BATCH_SIZE,
+        concurrency: int = 4,
+        images_per_second: float = 10.0,
+        retries: int = 3,
+        retry_backoff_seconds: float = 1.0,
+        timeout: float = 60,
+    ) -> None:
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.batch_size = min(batch_size, MAX_VISION_BATCH_SIZE)
+        self.concurrency = concurrency
+        self.rate_limiter = TokenBucket(images_per_second, capacity=max(images_per_second, self.batch_size))
+        self.retries = retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._credentials: Any = None
+        self._credentials_lock = threading.Lock()
+
+    def _get_auth(self) -> tuple[dict[str, str], dict[str, str]]:
+        if self.api_key is not None:
+            return {"key": self.api_key}, {}
+        # Без API key - сервисный аккаунт окружения (как у gcsfs).
+        import google.auth
+        from google.auth.transport.requests import Request
+
+        with self._credentials_lock:
+            if self._credentials is None:
+                self._credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-vision"])
+            if not self._credentials.valid:
+                self._credentials.refresh(Request())
+            return {}, {"Authorization": f"Bearer {self._credentials.token}"}
+
+    def _annotate(self, image_uris: list[str]) -> list[dict | None]:
+        payload = {
+            "requests": [
+                {"image": {"source": {"imageUri": uri}}, "features": [{"type": "SAFE_SEARCH_DETECTION"}]}
+                for uri in image_uris
+            ]
+        }
+        for attempt in range(self.retries + 1):
+            self.rate_limiter.acquire(len(image_uris))
+            try:
+                params, headers = self._get_auth()
+                response = self._session.post(
+                    self.endpoint, params=params, headers=headers, json=payload, timeout=self.timeout
+                )
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()
+                    MODERATION_REQUESTS.labels("ok").inc()
+                    break
+                error: Exception = requests.HTTPError(f"{response.status_code} {response.reason}", response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if attempt == self.retries:
+                MODERATION_REQUESTS.labels("error").inc()
+                raise error
+            MODERATION_REQUESTS.labels("retry").inc()
+            backoff = self.retry_backoff_seconds * 2**attempt
+            logger.warning(f"Vision request failed (attempt {attempt + 1}): {error}, retry in {backoff:.1f}s")
+            time.sleep(backoff)
+
+        results: list[dict | None] = []
+        for uri, result in zip(image_uris, response.json().get("responses", [])):
+            if "error" in result:
+                # Подпись ссылки в лог не пишется.
+                logger.warning(f"Vision failed to classify {uri.split('?')[0]}: {result['error'].get('message')}")
+                results.append(None)
+            else:
+                results.append(result.get("safeSearchAnnotation", {}))
+        return results
+
+    def classify(self, image_uris: list[str]) -> list[dict | None]:
+        batches = [image_uris[i : i + self.batch_size] for i in range(0, len(image_uris), self.batch_size)]
+        if len(batches) <= 1:
+            return [result for batch in batches for result in self._annotate(batch)]
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as executor:
+            return [result for batch_results in executor.map(self._annotate, batches) for result in batch_results]
+
+
+@cache
+def get_vision_moderation_client(
+    endpoint: str,
+    api_key: Optional[str],
+    batch_size: int,
+    concurrency: int,
+    images_per_second: float,
+    retries: int,
+) -> VisionModerationClient:
+    # Один клиент на процесс: token bucket общий для всех батчей шага.
+    return VisionModerationClient(
+        endpoint=endpoint,
+        api_key=api_key,
+        batch_size=batch_size,
+        concurrency=concurrency,
+        images_per_second=images_per_second,
+        retries=retries,
+    )
+
+
+def get_cached_moderation_details(content_hashes: list[str]) -> dict[str, dict]:
+    """
+    Результаты классификации, уже полученные для этого содержимого (по content_hash).
+    """
+    if not content_hashes:
+        return {}
+    stmt = sa.select(tables.ModerationCache.content_hash, tables.ModerationCache.google_details).where(
+        tables.ModerationCache.content_hash.in_(content_hashes)
+    )
+    with get_sessionmaker()() as session:
+        cached = dict(session.execute(stmt).tuples().all())
+    MODERATION_CACHE_REQUESTS.labels("hit").inc(len(cached))
+    MODERATION_CACHE_REQUESTS.labels("miss").inc(len(set(content_hashes)) - len(cached))
+    return cached
+
+
+def save_moderation_details(details: dict[str, dict]) -> None:
+    if not details:
+        return
+    now = utcnow()
+    stmt = (
+        insert(tables.ModerationCache)
+        .values(
+            [
+                {"content_hash": content_hash, "google_details": value, "created_at": now}
+                for content_hash, value in details.items()
+            ]
+        )
+        .on_conflict_do_nothing(index_elements=["content_hash"])
+    )
+    with get_sessionmaker().begin() as session:
+        session.execute(stmt)
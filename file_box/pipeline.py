@@ -4,9 +4,10 @@ from datapipe.executor import ExecutorConfig
 from datapipe.step.batch_generate import BatchGenerate
 from datapipe.step.batch_transform import BatchTransform
 from datapipe.store.database import DBConn
-from datapipe_image_moderation.pipeline import GoogleImageClassificationStep
 
 from file_box import catalog, steps, tables
+from file_box.coalesce import CoalescedBatchTransform
+from file_box.metrics import track_step_duration
 from file_box.settings import db_config, pipeline_config
 
 
@@ -20,6 +21,22 @@ def get_pipeline_steps() -> list:
             },
             delete_stale=True,
         ),
+        BatchGenerate(
+            steps.file_box_generate_document_preview_config,
+            outputs=[tables.DocumentPreviewConfig],
+            kwargs={
+                "config_path": pipeline_config.file_config_json_path,
+            },
+            delete_stale=True,
+        ),
+        BatchGenerate(
+            steps.file_box_generate_video_config,
+            outputs=[tables.VideoConfig],
+            kwargs={
+                "config_path": pipeline_config.file_config_json_path,
+            },
+            delete_stale=True,
+        ),
         BatchGenerate(
             steps.file_box_generate_image_moderation_config,
             outputs=[tables.ImageModerationConfig],
@@ -29,12 +46,43 @@ def get_pipeline_steps() -> list:
             delete_stale=True,
         ),
         BatchTransform(
-            steps.file_box_image_compress,
-            inputs=[tables.ImageCompressConfig, "file_box_file_raw"],
+            track_step_duration(steps.file_box_image_extract_meta),
+            inputs=["file_box_file_raw", tables.FileData],
+            outputs=[tables.ImageMeta],
+            chunk_size=100,
+            kwargs={
+                "file_system_name": pipeline_config.file_system_name,
+            },
+            labels=[("stage", "image-compress")],
+            transform_keys=["file_id", "file_type"],
+        ),
+        CoalescedBatchTransform(
+            track_step_duration(steps.file_box_video_extract_poster),
+            inputs=[tables.VideoConfig, "file_box_file_raw", tables.FileData],
+            outputs=["file_box_video_poster", tables.VideoMeta],
+            chunk_size=10,
+            kwargs={
+                "file_system_name": pipeline_config.file_system_name,
+                "ffmpeg_path": pipeline_config.ffmpeg_path,
+                "ffprobe_path": pipeline_config.ffprobe_path,
+                "timeout": pipeline_config.video_process_timeout_seconds,
+            },
+            labels=[("stage", "video-poster")],
+            transform_keys=["file_id", "file_type"],
+            executor_config=ExecutorConfig(
+                cpu=1,
+                parallelism=100,
+            ),
+        ),
+        CoalescedBatchTransform(
+            track_step_duration(steps.file_box_image_compress),
+            inputs=[tables.ImageCompressConfig, "file_box_file_raw", tables.ImageMeta, "file_box_video_poster"],
             outputs=["file_box_image_compressed", tables.CompressData],
             chunk_size=10,
             kwargs={
                 "file_system_name": pipeline_config.file_system_name,
+                "max_image_pixels": pipeline_config.image_max_pixels,
+                "memory_budget_mb": pipeline_config.image_compress_memory_budget_mb,
             },
             labels=[("stage", "image-compress")],
             transform_keys=["file_id", "file_type", "file_format", "compress_name"],
@@ -43,36 +91,58 @@ def get_pipeline_steps() -> list:
                 parallelism=100,
             ),
         ),
+        CoalescedBatchTransform(
+            track_step_duration(steps.file_box_document_preview),
+            inputs=[tables.DocumentPreviewConfig, "file_box_file_raw", tables.FileData],
+            outputs=["file_box_image_compressed", tables.CompressData],
+            chunk_size=10,
+            kwargs={
+                "file_system_name": pipeline_config.file_system_name,
+            },
+            labels=[("stage", "document-preview")],
+            transform_keys=["file_id", "file_type", "file_format", "compress_name"],
+            executor_config=ExecutorConfig(
+                cpu=1,
+                parallelism=100,
+            ),
+        ),
         BatchTransform(
-            steps.file_box_image_filter_for_moderation,
+            track_step_duration(steps.file_box_image_filter_for_moderation),
             inputs=[
                 tables.ImageModerationConfig,
-                "file_box_image_compressed",
+                tables.CompressData,
                 tables.ImageExcludeModeration,
             ],
             outputs=[tables.ImageFilteredForModeration],
             kwargs={
                 "config_path": pipeline_config.file_config_json_path,
                 "file_system_name": pipeline_config.file_system_name,
+                "days_expiration": pipeline_config.moderation_url_days_expiration,
             },
             transform_keys=["file_id", "file_type"],
             labels=[("stage", "image-upload-to-ls")],
         ),
-        GoogleImageClassificationStep(
-            input="file_box_image_filtered_for_moderation",
-            output="file_box_image_google_moderation_data",
-            dbconn=db_config.dsn,
-            file_system_name=pipeline_config.file_system_name,
-            image_field="file_gs_url",
-            details_field="google_details",
-            step_name="file_box_image_google_moderation",
+        BatchTransform(
+            track_step_duration(steps.file_box_image_google_moderation),
+            inputs=[tables.ImageFilteredForModeration],
+            outputs=[tables.ImageGoogleModerationData],
+            # Батч шага - несколько запросов Vision API, которые клиент отправляет параллельно.
+            chunk_size=pipeline_config.moderation_batch_size * pipeline_config.moderation_concurrency,
+            kwargs={
+                "endpoint": pipeline_config.moderation_vision_endpoint,
+                "api_key": pipeline_config.moderation_api_key,
+                "batch_size": pipeline_config.moderation_batch_size,
+                "concurrency": pipeline_config.moderation_concurrency,
+                "images_per_second": pipeline_config.moderation_images_per_second,
+                "retries": pipeline_config.moderation_retries,
+            },
+            transform_keys=["file_id", "file_type"],
             executor_config=ExecutorConfig(
                 cpu=0.1,
                 memory=256 * 1024 * 1024,
                 parallelism=1,
             ),
             labels=[("stage", "image-upload-to-ls")],
-            create_table=False,
         ),
     ]
     return pipeline
@@ -0,0 +1,297 @@
+import datetime
+import time
+from typing import cast
+
+import fsspec
+import pandas as pd
+import sqlalchemy as sa
+from datapipe.compute import DatapipeApp
+from datapipe.datatable import DataTable
+from datapipe.store.database import TableStoreDB
+from datapipe.store.filedir import TableStoreFiledir
+from datapipe.types import IndexDF
+from loguru import logger
+
+from file_box import tables
+from file_box.db_utils import get_engine, get_sessionmaker, utcnow
+from file_box.locks import advisory_lock, advisory_lock_key, release_advisory_locks, try_advisory_locks
+from file_box.metrics import PURGED_FILES, PURGED_OBJECTS
+from file_box.tracing import tracer
+
+FILE_KEYS = ["file_id", "file_type"]
+
+
+def file_lock_key(file_id: str) -> int:
+    """
+    Ключ advisory lock файла: его держат запись файла при загрузке и purger на время удаления.
+    """
+    return advisory_lock_key("file", file_id)
+
+
+def mark_files_deleted(file_ids: list[str]) -> list[str]:
+    """
+    Мягкое удаление: файлы сразу скрываются из выдачи (deleted_at), объекты и строки пайплайна удаляет purger.
+
+    :param file_ids: идентификаторы файлов
+    :return: идентификаторы файлов, которые были помечены (несуществующие и уже удаленные пропускаются)
+    """
+    if not file_ids:
+        return []
+    stmt = (
+        sa.update(tables.FileData)
+        .where(tables.FileData.file_id.in_(file_ids), tables.FileData.deleted_at.is_(None))
+        .values(deleted_at=utcnow())
+        .returning(tables.FileData.file_id)
+    )
+    with get_sessionmaker().begin() as session:
+        return list(session.execute(stmt).scalars().all())
+
+
+def mark_expired_files_deleted(batch_size: int = 1000) -> int:
+    """
+    Помечает удаленными файлы с истекшим expires_at (батчами по индексу expires_at), дальше их удаляет purger.
+
+    :param batch_size: сколько файлов помечается за один запрос
+    :return: число помеченных файлов
+    """
+    marked = 0
+    while True:
+        now = utcnow()
+        expired = (
+            sa.select(tables.FileData.file_id, tables.FileData.file_type)
+            .where(tables.FileData.expires_at <= now, tables.FileData.deleted_at.is_(None))
+            .order_by(tables.FileData.expires_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            sa.update(tables.FileData)
+            .where(sa.tuple_(tables.FileData.file_id, tables.FileData.file_type).in_(expired))
+            .values(deleted_at=now)
+        )
+        with get_sessionmaker().begin() as session:
+            count = session.execute(stmt).rowcount
+        marked += count
+        if count < batch_size:
+            break
+    if marked:
+        logger.info(f"Marked {marked} expired files as deleted")
+    return marked
+
+
+def get_files_to_purge(
+    batch_size: int, grace_seconds: float = 0, file_ids: list[str] | None = None
+) -> pd.DataFrame:
+    deleted_before = utcnow() - datetime.timedelta(
+        seconds=grace_seconds
+    )
+    stmt = (
+        sa.select(tables.FileData.file_id, tables.FileData.file_type)
+        .where(tables.FileData.deleted_at.is_not(None), tables.FileData.deleted_at <= deleted_before)
+        .order_by(tables.FileData.deleted_at)
+        .limit(batch_size)
+    )
+    if file_ids is not None:
+        stmt = stmt.where(tables.FileData.file_id.in_(file_ids))
+    with get_sessionmaker()() as session:
+        rows = session.execute(stmt).all()
+    return pd.DataFrame(rows, columns=FILE_KEYS)
+
+
+def claim_files_to_purge(
+    conn: sa.Connection, batch_size: int, grace_seconds: float = 0
+) -> tuple[pd.DataFrame, list[int]]:
+    """
+    Берет батч файлов на удаление: на каждый файл берется advisory lock (файлы, которые сейчас загружаются
+    повторно, пропускаются), после чего пометка перепроверяется - файл могли восстановить до взятия лока.
+
+    Локи держатся, пока батч не удален, и отпускаются через release_advisory_locks.
+
+    :param conn: соединение (AUTOCOMMIT), в сессии которого держатся локи
+    :param batch_size: сколько файлов берется за один батч
+    :param grace_seconds: сколько секунд после пометки файл еще не удаляется
+    :return: файлы батча и ключи взятых локов
+    """
+    candidates = get_files_to_purge(batch_size, grace_seconds)
+    keys = [file_lock_key(file_id) for file_id in candidates["file_id"]]
+    acquired = try_advisory_locks(conn, keys)
+    own_keys = [key for key, is_acquired in zip(keys, acquired) if is_acquired]
+    locked_ids = [file_id for file_id, is_acquired in zip(candidates["file_id"], acquired) if is_acquired]
+    if len(own_keys) < len(keys):
+        logger.info(f"Skip {len(keys) - len(own_keys)} files that are being uploaded")
+    files = get_files_to_purge(batch_size, grace_seconds, file_ids=locked_ids) if locked_ids else candidates[:0]
+    return files, own_keys
+
+
+def _files_filter(sql_table: sa.Table, files: pd.DataFrame) -> sa.ColumnElement[bool]:
+    keys = [key for key in FILE_KEYS if key in sql_table.c]
+    if keys == FILE_KEYS:
+        return sa.tuple_(*(sql_table.c[key] for key in keys)).in_(list(files[keys].itertuples(index=False, name=None)))
+    return sql_table.c.file_id.in_(files["file_id"].tolist())
+
+
+def _purge_table(table: DataTable, files: pd.DataFrame, only_deleted: bool = False) -> None:
+    meta_sql_table = table.meta_table.sql_table
+    if isinstance(table.table_store, TableStoreFiledir):
+        # Ключи объектов (например, все варианты файла) берем из метатаблицы, объекты удаляются параллельно.
+        with table.meta_table.dbconn.con.begin() as con:
+            rows = con.execute(
+                sa.select(*(meta_sql_table.c[key] for key in table.primary_keys)).where(
+                    _files_filter(meta_sql_table, files)
+                )
+            ).all()
+        if rows:
+            table.table_store.delete_rows(cast(IndexDF, pd.DataFrame(rows, columns=table.primary_keys)))
+            PURGED_OBJECTS.labels(table.name).inc(len(rows))
+    elif isinstance(table.table_store, TableStoreDB):
+        data_table = table.table_store.data_table
+        stmt = sa.delete(data_table).where(_files_filter(data_table, files))
+        if only_deleted and "deleted_at" in data_table.c:
+            # Строки файлов, с которых сняли пометку, остаются вместе с метаданными.
+            stmt = stmt.where(data_table.c.deleted_at.is_not(None)).returning(*(data_table.c[key] for key in FILE_KEYS))
+            with table.table_store.dbconn.con.begin() as con:
+                files = pd.DataFrame(con.execute(stmt).all(), columns=FILE_KEYS)
+            if files.empty:
+                return
+        else:
+            with table.table_store.dbconn.con.begin() as con:
+                con.execute(stmt)
+    with table.meta_table.dbconn.con.begin() as con:
+        con.execute(sa.delete(meta_sql_table).where(_files_filter(meta_sql_table, files)))
+
+
+def purge_files(app: DatapipeApp, files: pd.DataFrame) -> None:
+    """
+    Удаляет объекты файлов (исходники и все варианты) и их строки из таблиц и метатаблиц пайплайна.
+
+    Строки и метаданные удаляются пачкой по всем file_id батча, без запуска шагов пайплайна.
+    Таблица file_box_file_data чистится последней: если purge прервется, файлы останутся в очереди на удаление.
+
+    :param app: приложение datapipe
+    :param files: DataFrame с колонками file_id, file_type
+    """
+    file_tables = [
+        table
+        for name, table in app.ds.tables.items()
+        if "file_id" in table.primary_keys and name != tables.FileData.__tablename__
+    ]
+    for table in file_tables:
+        with tracer.start_as_current_span(f"{table.name} purge"):
+            _purge_table(table, files)
+
+    # Метатаблицы трансформаций: иначе шаги считали бы удаленные строки обработанными.
+    for step in app.steps:
+        meta_table = getattr(step, "meta_table", None)
+        if meta_table is None or "file_id" not in meta_table.primary_keys:
+            continue
+        with meta_table.dbconn.con.begin() as con:
+            con.execute(sa.delete(meta_table.sql_table).where(_files_filter(meta_table.sql_table, files)))
+
+    _purge_table(app.ds.get_table(tables.FileData.__tablename__), files, only_deleted=True)
+    PURGED_FILES.inc(len(files))
+
+
+def purge_deleted_files(app: DatapipeApp, batch_size: int = 1000, grace_seconds: float = 0) -> int:
+    """
+    Удаляет помеченные файлы батчами, пока очередь не опустеет.
+
+    Параллельные purger'ы (в нескольких репликах) работают по очереди через advisory lock. Файлы батча
+    дополнительно блокируются по одному (file_lock_key): повторная загрузка удаляемого файла ждет конца
+    батча, а файл, который сейчас загружается, пропускается до следующего прохода.
+
+    :param app: приложение datapipe
+    :param batch_size: сколько файлов удаляется за один батч
+    :param grace_seconds: сколько секунд после пометки файл еще не удаляется
+    :return: число удаленных файлов
+    """
+    purged = 0
+    engine = get_engine()
+    with advisory_lock(engine, advisory_lock_key("purge_deleted_files")), engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        while True:
+            files, own_keys = claim_files_to_purge(conn, batch_size, grace_seconds)
+            try:
+                if files.empty:
+                    break
+                start = time.perf_counter()
+                purge_files(app, files)
+                purged += len(files)
+                logger.info(f"Purged {len(files)} files in {time.perf_counter() - start:.1f}s")
+            finally:
+                release_advisory_locks(conn, own_keys)
+    return purged
+
+
+def purge_expired_upload_sessions(
+    file_system: fsspec.AbstractFileSystem, upload_dir_pattern: str, expire_seconds: float, batch_size: int = 1000
+) -> int:
+    """
+    Удаляет сессии загрузки без изменений дольше expire_seconds (брошенные клиентом и давно финализированные)
+    вместе с частями в хранилище.
+
+    Строки берутся с FOR UPDATE SKIP LOCKED и удаляются в той же транзакции после удаления частей, поэтому
+    сессия, в которую сейчас пишется часть, пропускается, а параллельные purger'ы не делят одни и те же строки.
+
+    :param file_system: файловая система хранения частей
+    :param upload_dir_pattern: шаблон каталога загрузки с полем upload_id
+    :param expire_seconds: через сколько секунд без изменений сессия удаляется
+    :param batch_size: сколько сессий удаляется за одну транзакцию
+    :return: число удаленных сессий
+    """
+    purged = 0
+    while True:
+        expire_before = utcnow() - datetime.timedelta(seconds=expire_seconds)
+        stmt = (
+            sa.select(tables.UploadSession.upload_id, tables.UploadSession.status)
+            .where(tables.UploadSession.updated_at <= expire_before)
+            .order_by(tables.UploadSession.updated_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        with get_sessionmaker().begin() as session:
+            rows = session.execute(stmt).all()
+            for upload_id, status in rows:
+                try:
+                    file_system.rm(upload_dir_pattern.format(upload_id=upload_id), recursive=True)
+                except FileNotFoundError:
+                    # У финализированных сессий части уже удалены.
+                    pass
+                if status != tables.UploadSessionStatusEnum.FINALIZED:
+                    logger.info(f"Removed abandoned upload {upload_id}")
+            session.execute(
+                sa.delete(tables.UploadSession).where(
+                    tables.UploadSession.upload_id.in_([upload_id for upload_id, _ in rows])
+                )
+            )
+        purged += len(rows)
+        if len(rows) < batch_size:
+            return purged
+
+
+def main() -> None:
+    from file_box.catalog import UPLOAD_SESSION_PATTERN
+    from file_box.file_utils import get_file_system
+    from file_box.pipeline import datapipe_app
+    from file_box.settings import pipeline_config
+
+    while True:
+        try:
+            mark_expired_files_deleted(pipeline_config.purge_batch_size)
+            purge_deleted_files(
+                datapipe_app,
+                batch_size=pipeline_config.purge_batch_size,
+                grace_seconds=pipeline_config.purge_grace_seconds,
+            )
+            purge_expired_upload_sessions(
+                get_file_system(pipeline_config.file_system_name),
+                UPLOAD_SESSION_PATTERN,
+                expire_seconds=pipeline_config.upload_session_expire_hours * 3600,
+                batch_size=pipeline_config.purge_batch_size,
+            )
+        except Exception as e:
+            logger.exception(f"Purge failed: {e}")
+        time.sleep(pipeline_config.purge_interval_seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
+import datetime
 import json
+import os
 import uuid
 from dataclasses import asdict, dataclass, field
-from functools import partial
+from functools import lru_cache
 from typing import Any, Protocol
 
-import fsspec
 import pandas as pd
 import sqlalchemy as sa
 from datapipe.compute import DatapipeApp, run_steps, run_steps_changelist
@@ -12,16 +13,46 @@ from datapipe.store.database import TableStoreDB
 from datapipe.store.filedir import TableStoreFiledir
 from datapipe.types import ChangeList
 from loguru import logger
+from PIL import Image
 
 from file_box import tables
-from file_box.catalog import FILENAME_PATTERN_RAW, IMAGE_PATTERN_COMPRESSED
-from file_box.configs.model import FileConfigModel
-from file_box.db_utils import get_sessionmaker
-from file_box.file_utils import get_signed_url, is_config_exists, read_full_config_from_json
+from file_box.catalog import FILENAME_PATTERN_RAW, IMAGE_PATTERN_COMPRESSED, UPLOAD_SESSION_PATTERN, local_cache
+from file_box.configs.model import CompressItemModel, FileConfigModel, RetentionItemModel, UrlPolicyItemModel
+from file_box.db_utils import get_engine, get_sessionmaker, to_utc_naive, utcnow
+from file_box.file_utils import (
+    AnimationOptions,
+    ContentInfo,
+    EncodeOptions,
+    ResamplingMapEnum,
+    ResizeOptions,
+    compose_files,
+    get_content_info,
+    get_file_content_info,
+    get_file_system,
+    get_local_path,
+    get_modified_image,
+    get_oriented_image,
+    is_config_exists,
+    open_image,
+    read_config_from_json,
+    read_file_bytes,
+    read_full_config_from_json,
+)
+from file_box.locks import SingleFlight, advisory_lock, advisory_lock_key
+from file_box.metrics import UPLOAD_BYTES
 from file_box.pipeline import datapipe_app
+from file_box.purge import file_lock_key, mark_files_deleted
 from file_box.settings import PipelineConfig, pipeline_config
+from file_box.stores import store_record
+from file_box.tracing import tracer
+from file_box.urls import get_file_urls
 
-get_signed_url_30_days = partial(get_signed_url, file_system_name=pipeline_config.file_system_name, days_expiration=30)
+on_demand_render_flight = SingleFlight()
+
+
+def check_expires_at(expires_at: datetime.datetime | None) -> None:
+    if expires_at is not None and to_utc_naive(expires_at) <= utcnow():
+        raise ValueError("expires_at is in the past")
 
 
 @dataclass(kw_only=True)
@@ -30,6 +61,12 @@ class ItemDTO:
     file_type: str
     file_bytes: bytes
     meta_data: dict[str, Any] = field(default_factory=dict)
+    # Если не задан, берется срок хранения типа файла из секции retention конфига (без него файл бессрочный).
+    expires_at: datetime.datetime | None = None
+
+    def __post_init__(self) -> None:
+        # ValueError при валидации тела запроса FastAPI отдает как 422.
+        check_expires_at(self.expires_at)
 
     def to_dict(self, exclude: set | None = None, generate_path: bool = True) -> dict[str, Any]:
         if exclude is None:
@@ -44,13 +81,6 @@ class ItemDTO:
 class CompressInfoDTO:
     path: str
 
-    @classmethod
-    def from_table(cls, compress_data: tables.CompressData) -> "CompressInfoDTO":
-        path = get_signed_url_30_days(compress_data.path)
-        if not path:
-            path = compress_data.path
-        return cls(compress_data.compress_name)
-
 
 @dataclass
 class ResponseDTO:
@@ -58,39 +88,223 @@ class ResponseDTO:
     source_path: str
     compress_info: dict[str, CompressInfoDTO] | None = None
     meta_data: dict[str, Any] = field(default_factory=dict)
+    expires_at: datetime.datetime | None = None
+
+
+@dataclass
+class FilesDeleteDTO:
+    file_ids: list[str]
+
+
+@dataclass
+class FilesDeleteResultDTO:
+    deleted: list[str]
+
+
+@dataclass(kw_only=True)
+class UploadSessionCreateDTO:
+    file_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    file_type: str
+    total_size: int
+    meta_data: dict[str, Any] = field(default_factory=dict)
+    # Срок хранения файла, применяется при финализации (как expires_at в ItemDTO).
+    expires_at: datetime.datetime | None = None
+
+    def __post_init__(self) -> None:
+        check_expires_at(self.expires_at)
+
+
+@dataclass
+class UploadSessionDTO:
+    upload_id: str
+    file_id: str
+    file_type: str
+    offset: int
+    total_size: int
+    status: str
+    expires_at: datetime.datetime | None = None
+
+
+class UploadSessionError(ValueError):
+    pass
+
+
+class UploadSessionNotFoundError(UploadSessionError):
+    pass
 
 
-def generate_response(data: list[tuple[tables.FileData, tables.CompressData]]) -> ResponseDTO:
-    compress_data = {}
-    for _, compress_item in data:
-        if compress_item is None:
-            continue
-        compress_data[compress_item.compress_name] = CompressInfoDTO.from_table(compress_item)
+class UploadOffsetMismatchError(UploadSessionError):
+    def __init__(self, offset: int) -> None:
+        super().__init__(f"Upload offset mismatch, expected {offset}")
+        self.offset = offset
+
+
+@dataclass
+class FileLocationDTO:
+    path: str
+    media_type: str
+    local_path: str | None = None
+    content_hash: str | None = None
+
+
+def generate_response(
+    data: list[tuple[tables.FileData, tables.CompressData]], url_policies: list[UrlPolicyItemModel] | None = None
+) -> ResponseDTO:
     file_data = data[0][0]
     assert file_data.path is not None
-    path = get_signed_url_30_days(file_data.path)
-    if not path:
-        path = file_data.path
+    compress_items = [compress_item for _, compress_item in data if compress_item is not None]
+    # Ссылки на исходный файл и все варианты получаем одним вызовом.
+    path, *compress_paths = get_file_urls(
+        [
+            (file_data.path, file_data.file_type, None),
+            *((item.path, item.file_type, item.compress_name) for item in compress_items),
+        ],
+        url_policies or [],
+        file_system_name=pipeline_config.file_system_name,
+        base_url=pipeline_config.document_blob_base_url,
+    )
+    compress_data = {
+        compress_item.compress_name: CompressInfoDTO(compress_path)
+        for compress_item, compress_path in zip(compress_items, compress_paths)
+    }
     return ResponseDTO(
         file_id=file_data.file_id,
         source_path=path,
         compress_info=compress_data,
         meta_data=file_data.meta_data,
+        expires_at=file_data.expires_at,
     )
 
 
+def visible_file_filter() -> sa.ColumnElement[bool]:
+    """
+    Файл не удален и не истек: истекшие файлы скрываются сразу, не дожидаясь sweeper'а.
+    """
+    return sa.and_(
+        tables.FileData.deleted_at.is_(None),
+        sa.or_(tables.FileData.expires_at.is_(None), tables.FileData.expires_at > utcnow()),
+    )
+
+
+@lru_cache(maxsize=8)
+def _load_file_config(config_path: str, mtime_ns: int, size: int) -> FileConfigModel:
+    return FileConfigModel(**read_full_config_from_json(config_path=config_path))
+
+
+def read_file_config(config_path: str) -> FileConfigModel:
+    """
+    Конфиг из JSON-файла, разобранный один раз на версию файла: после set_config (или правки файла)
+    меняются mtime и размер, и конфиг перечитывается.
+    """
+    stat = os.stat(config_path)
+    return _load_file_config(config_path, stat.st_mtime_ns, stat.st_size)
+
+
+def read_url_policies(config_path: str | None) -> list[UrlPolicyItemModel]:
+    if config_path is None:
+        return []
+    return read_file_config(config_path).url_policy
+
+
+def read_retention_policies(config_path: str | None) -> list[RetentionItemModel]:
+    if config_path is None:
+        return []
+    return read_file_config(config_path).retention
+
+
+def get_default_expires_at(file_type: str, policies: list[RetentionItemModel]) -> datetime.datetime | None:
+    for policy in policies:
+        if policy.file_type == file_type:
+            return utcnow() + datetime.timedelta(seconds=policy.ttl_seconds)
+    return None
+
+
 def get_file_by_id(file_id: str) -> ResponseDTO | None:
     stmt = (
         sa.select(tables.FileData, tables.CompressData)
         .join(tables.CompressData, tables.FileData.file_id == tables.CompressData.file_id, isouter=True)
-        .where(tables.FileData.file_id == file_id)
+        .where(tables.FileData.file_id == file_id, visible_file_filter())
+    )
+    with tracer.start_as_current_span("get_file_by_id") as span:
+        span.set_attribute("file_id", file_id)
+        with get_sessionmaker()() as session:
+            stmt_res = session.execute(stmt).tuples().all()
+        if not stmt_res:
+            return None
+        res = generate_response(list(stmt_res), read_url_policies(pipeline_config.file_config_json_path))
+    return res
+
+
+def get_file_data(file_id: str) -> tables.FileData | None:
+    stmt = sa.select(tables.FileData).where(tables.FileData.file_id == file_id, visible_file_filter())
+    with get_sessionmaker()() as session:
+        return session.execute(stmt).scalar_one_or_none()
+
+
+def get_file_by_content_hash(
+    file_type: str, content_hash: str, expires_at: datetime.datetime | None = None
+) -> tables.FileData | None:
+    """
+    Файл с тем же содержимым, который хранится не меньше expires_at (None - бессрочно).
+    """
+    if expires_at is None:
+        lives_long_enough = tables.FileData.expires_at.is_(None)
+    else:
+        lives_long_enough = sa.or_(tables.FileData.expires_at.is_(None), tables.FileData.expires_at >= expires_at)
+    stmt = (
+        sa.select(tables.FileData)
+        .where(
+            tables.FileData.file_type == file_type,
+            tables.FileData.content_hash == content_hash,
+            visible_file_filter(),
+            lives_long_enough,
+        )
+        .limit(1)
     )
     with get_sessionmaker()() as session:
-        stmt_res = session.execute(stmt).tuples().all()
-    if not stmt_res:
+        return session.execute(stmt).scalar_one_or_none()
+
+
+def get_file_location(file_id: str, compress_name: str | None = None) -> FileLocationDTO | None:
+    if compress_name is None:
+        stmt = sa.select(tables.FileData.path, tables.FileData.content_hash).where(
+            tables.FileData.file_id == file_id, visible_file_filter()
+        )
+        with get_sessionmaker()() as session:
+            row = session.execute(stmt).one_or_none()
+        if row is None:
+            return None
+        path, content_hash = row
+        media_type = "application/octet-stream"
+    else:
+        compress_stmt = (
+            sa.select(tables.CompressData)
+            .join(tables.FileData, tables.FileData.file_id == tables.CompressData.file_id)
+            .where(
+                tables.CompressData.file_id == file_id,
+                tables.CompressData.compress_name == compress_name,
+                visible_file_filter(),
+            )
+        )
+        with get_sessionmaker()() as session:
+            compress_data = session.execute(compress_stmt).scalar_one_or_none()
+        if compress_data is None:
+            return None
+        path = compress_data.path
+        content_hash = compress_data.content_hash
+        media_type = Image.MIME.get(compress_data.file_format.upper(), "application/octet-stream")
+    if path is None:
         return None
-    res = generate_response(list(stmt_res))
-    return res
+    local_path = get_local_path(path, pipeline_config.file_system_name)
+    if local_path is None and local_cache is not None:
+        # Копия в кэше отдается, только если совпадает с версией из БД (ее мог перезаписать другой экземпляр).
+        local_path = local_cache.get(path, content_hash)
+    return FileLocationDTO(
+        path=path,
+        media_type=media_type,
+        local_path=local_path,
+        content_hash=content_hash,
+    )
 
 
 def save_file_meta_data(item: ItemDTO) -> None:
@@ -102,15 +316,61 @@ def save_file_meta_data(item: ItemDTO) -> None:
     with get_sessionmaker().begin() as session:
         session.execute(stmt)
 
+def get_upload_session_dto(upload: tables.UploadSession) -> UploadSessionDTO:
+    return UploadSessionDTO(
+        upload_id=upload.upload_id,
+        file_id=upload.file_id,
+        file_type=upload.file_type,
+        offset=upload.received_size,
+        total_size=upload.total_size,
+        status=upload.status,
+        expires_at=upload.expires_at,
+    )
+
+
+def get_upload_session(upload_id: str) -> UploadSessionDTO | None:
+    with get_sessionmaker()() as session:
+        upload = session.get(tables.UploadSession, upload_id)
+        return None if upload is None else get_upload_session_dto(upload)
+
+
+def restore_file(file_id: str) -> None:
+    stmt = (
+        sa.update(tables.FileData)
+        .where(tables.FileData.file_id == file_id, tables.FileData.deleted_at.is_not(None))
+        .values(deleted_at=None)
+    )
+    with get_sessionmaker().begin() as session:
+        session.execute(stmt)
+
+
 class FileBoxServiceProtocol(Protocol):
 
     def upload_file(self, item: ItemDTO) -> ResponseDTO:
         raise NotImplementedError()
 
+    def create_upload_session(self, upload: UploadSessionCreateDTO) -> UploadSessionDTO:
+        raise NotImplementedError()
+
+    def get_upload_session(self, upload_id: str) -> UploadSessionDTO | None:
+        raise NotImplementedError()
+
+    def upload_chunk(self, upload_id: str, offset: int, data: bytes) -> UploadSessionDTO:
+        raise NotImplementedError()
+
+    def finalize_upload(self, upload_id: str) -> ResponseDTO:
+        raise NotImplementedError()
+
     def get_file_response(self, file_id: str) -> ResponseDTO | None:
         raise NotImplementedError()
 
-    def get_file_bytes(self, path: str) -> bytes:
+    def delete_files(self, file_ids: list[str]) -> list[str]:
+        raise NotImplementedError()
+
+    def get_file_bytes(self, path: str, content_hash: str | None = None) -> bytes:
+        raise NotImplementedError()
+
+    def get_file_location(self, file_id: str, compress_name: str | None = None) -> FileLocationDTO | None:
         raise NotImplementedError()
 
     def get_config(self) -> FileConfigModel:
@@ -125,42 +385,267 @@ class FileBoxService(FileBoxServiceProtocol):
         self.app = app
         self.pipeline_config = pipeline_config
 
-    def _save_data_to_filedir(self, item: ItemDTO, table_name: str) -> dict[str, Any]:
+    def _save_data_to_filedir(
+        self, item: ItemDTO, table_name: str, content_info: ContentInfo, source_path: str | None = None
+    ) -> dict[str, Any]:
         table = self.app.ds.get_table(table_name)
         if not isinstance(table.table_store, TableStoreFiledir):
             raise ValueError("Table store is not Filedir")
-        data_dict = item.to_dict(generate_path=False)
-        changes = table.store_chunk(pd.DataFrame([data_dict]))
+        # meta_data в файл не пишется, поэтому в строку файла не попадает.
+        data_dict = {"file_id": item.file_id, "file_type": item.file_type, "file_bytes": item.file_bytes}
+        changes = store_record(table, data_dict, content_hash=content_info.content_hash, source_path=source_path)
         return {table_name: changes}
     
-    def _save_file_to_store_table(self, item: ItemDTO, table_name: str) -> dict[str, Any]:
+    def _save_file_to_store_table(self, item: ItemDTO, table_name: str, content_info: ContentInfo) -> dict[str, Any]:
         table = self.app.ds.get_table(table_name)
         if not isinstance(table.table_store, TableStoreDB):
             raise ValueError("Table store is not DB")
-        data_dict = item.to_dict(exclude={"file_bytes"})
-        changes = table.store_chunk(pd.DataFrame([data_dict]))
+        data_dict = {**item.to_dict(exclude={"file_bytes"}), **asdict(content_info)}
+        changes = store_record(table, data_dict)
+        # Строка с тем же хэшем не перезаписывается, поэтому повторная загрузка мягко удаленного файла снимает пометку.
+        restore_file(item.file_id)
         return {table_name: changes}
 
-    def upload_file(self, item: ItemDTO) -> ResponseDTO:
-        logger.info(f"Uploading file {item.file_id}")
+    def _check_config(self) -> None:
         if self.pipeline_config.file_config_json_path is None:
             logger.warning("Config file not found, Please set config via set_config method")
             raise ValueError("Config file not found, Please set config via set_config method")
-        
+
         if not is_config_exists(self.pipeline_config.file_config_json_path):
             logger.warning("Config file not found, Please set config via set_config method")
             raise ValueError("Config file not found, Please set config via set_config method")
-        
-        changes_from_raw = self._save_data_to_filedir(item, "file_box_file_raw")
-        changes_from_db = self._save_file_to_store_table(item, "file_box_file_data")
+
+    def _store_file(
+        self, item: ItemDTO, content_info: ContentInfo, span: Any, source_path: str | None = None
+    ) -> ResponseDTO:
+        """
+        Дедупликация, запись исходного файла и строки FileData, запуск шагов пайплайна по изменениям.
+
+        :param item: файл (при source_path байты не используются)
+        :param content_info: хэш, размер и размеры изображения
+        :param span: span загрузки
+        :param source_path: путь к уже собранному в хранилище файлу, который копируется вместо записи байтов
+        """
+        if item.expires_at is None:
+            item.expires_at = get_default_expires_at(
+                item.file_type, read_retention_policies(self.pipeline_config.file_config_json_path)
+            )
+        else:
+            check_expires_at(item.expires_at)
+            item.expires_at = to_utc_naive(item.expires_at)
+        if self.pipeline_config.dedup_uploads:
+            # Временный файл не может заменить собой постоянный, поэтому дубликат должен жить не меньше нового.
+            duplicate = get_file_by_content_hash(item.file_type, content_info.content_hash, item.expires_at)
+            if duplicate is not None and duplicate.file_id != item.file_id:
+                logger.info(f"File {item.file_id} is a duplicate of {duplicate.file_id}")
+                span.set_attribute("duplicate_of", duplicate.file_id)
+                res = get_file_by_id(duplicate.file_id)
+                assert res is not None, f"File not found by id {duplicate.file_id}"
+                return res
+        # Пока файл пишется, purger не удаляет его объекты, а повторная загрузка удаляемого файла ждет purger.
+        with advisory_lock(get_engine(), file_lock_key(item.file_id)):
+            changes_from_raw = self._save_data_to_filedir(item, "file_box_file_raw", content_info, source_path)
+            changes_from_db = self._save_file_to_store_table(item, "file_box_file_data", content_info)
         changes = {**changes_from_raw, **changes_from_db}
         change_list = ChangeList(changes)
-        run_steps_changelist(self.app.ds, self.app.steps, change_list)
+        with tracer.start_as_current_span("run_steps_changelist"):
+            run_steps_changelist(self.app.ds, self.app.steps, change_list)
         res = get_file_by_id(item.file_id)
         assert res is not None, f"File not found by id {item.file_id}"
+        span.set_attribute("variant_count", len(res.compress_info or {}))
+        return res
+
+    def upload_file(self, item: ItemDTO) -> ResponseDTO:
+        logger.info(f"Uploading file {item.file_id}")
+        self._check_config()
+
+        with tracer.start_as_current_span("FileBoxService.upload_file") as span:
+            span.set_attributes(
+                {"file_id": item.file_id, "file_type": item.file_type, "file_size": len(item.file_bytes)}
+            )
+            UPLOAD_BYTES.labels(item.file_type).inc(len(item.file_bytes))
+            # Хэш содержимого считается один раз и дальше используется для дедупликации, ETag и метатаблиц.
+            content_info = get_content_info(item.file_bytes)
+            res = self._store_file(item, content_info, span)
         logger.info(f"File {item.file_id} uploaded")
         return res
 
+    def create_upload_session(self, upload: UploadSessionCreateDTO) -> UploadSessionDTO:
+        self._check_config()
+        if upload.total_size <= 0:
+            raise UploadSessionError("total_size must be positive")
+        now = utcnow()
+        upload_session = tables.UploadSession(
+            upload_id=str(uuid.uuid4()),
+            file_id=upload.file_id,
+            file_type=upload.file_type,
+            meta_data=upload.meta_data,
+            total_size=upload.total_size,
+            expires_at=to_utc_naive(upload.expires_at) if upload.expires_at is not None else None,
+            received_size=0,
+            part_count=0,
+            status=tables.UploadSessionStatusEnum.ACTIVE,
+            created_at=now,
+            updated_at=now,
+        )
+        with get_sessionmaker().begin() as session:
+            session.add(upload_session)
+        logger.info(f"Upload {upload_session.upload_id} for file {upload.file_id} created")
+        return get_upload_session_dto(upload_session)
+
+    def get_upload_session(self, upload_id: str) -> UploadSessionDTO | None:
+        return get_upload_session(upload_id)
+
+    def _get_upload_local_dir(self, upload_id: str) -> str | None:
+        return get_local_path(UPLOAD_SESSION_PATTERN.format(upload_id=upload_id), self.pipeline_config.file_system_name)
+
+    def _check_chunk_size(self, upload: tables.UploadSession, size: int) -> None:
+        if size == 0:
+            raise UploadSessionError("Empty chunk")
+        if size > self.pipeline_config.upload_chunk_max_mb * 1024 * 1024:
+            raise UploadSessionError(f"Chunk is larger than {self.pipeline_config.upload_chunk_max_mb} MiB")
+        if upload.received_size + size > upload.total_size:
+            raise UploadSessionError("Chunk exceeds total_size")
+        is_last = upload.received_size + size == upload.total_size
+        # Локально части дописываются в один файл, ограничение на размер части нужно только для сборки в хранилище.
+        if (
+            not is_last
+            and self._get_upload_local_dir(upload.upload_id) is None
+            and size < self.pipeline_config.upload_chunk_min_mb * 1024 * 1024
+        ):
+            min_mb = self.pipeline_config.upload_chunk_min_mb
+            raise UploadSessionError(f"Only the last chunk may be smaller than {min_mb} MiB")
+
+    def upload_chunk(self, upload_id: str, offset: int, data: bytes) -> UploadSessionDTO:
+        with tracer.start_as_current_span("FileBoxService.upload_chunk") as span:
+            span.set_attributes({"upload_id": upload_id, "offset": offset, "chunk_size": len(data)})
+            with get_sessionmaker().begin() as session:
+                # Строка сессии блокируется до конца записи части: параллельные PUT одной загрузки идут по очереди.
+                upload = session.get(tables.UploadSession, upload_id, with_for_update=True)
+                if upload is None:
+                    raise UploadSessionNotFoundError(f"Upload {upload_id} not found")
+                if upload.status != tables.UploadSessionStatusEnum.ACTIVE:
+                    raise UploadSessionError(f"Upload {upload_id} is already {upload.status}")
+                if offset != upload.received_size:
+                    raise UploadOffsetMismatchError(upload.received_size)
+                self._check_chunk_size(upload, len(data))
+
+                upload_dir = UPLOAD_SESSION_PATTERN.format(upload_id=upload_id)
+                local_dir = self._get_upload_local_dir(upload_id)
+                if local_dir is not None:
+                    # Пишем с offset, а не в конец: повтор части после неудачного коммита не дублирует данные.
+                    os.makedirs(local_dir, exist_ok=True)
+                    data_path = os.path.join(local_dir, "data")
+                    with open(data_path, "r+b" if os.path.exists(data_path) else "wb") as data_file:
+                        data_file.truncate(offset)
+                        data_file.seek(offset)
+                        data_file.write(data)
+                else:
+                    file_system = get_file_system(self.pipeline_config.file_system_name)
+                    file_system.pipe_file(f"{upload_dir}/part-{upload.part_count:06d}", data)
+
+                UPLOAD_BYTES.labels(upload.file_type).inc(len(data))
+                upload.received_size += len(data)
+                upload.part_count += 1
+                upload.updated_at = utcnow()
+                return get_upload_session_dto(upload)
+
+    def _claim_upload_for_finalize(self, upload_id: str) -> tuple[tables.UploadSession, ResponseDTO | None]:
+        """
+        Переводит сессию в finalizing под блокировкой строки и сразу отпускает блокировку.
+
+        :return: сессия и, если она уже финализирована, загруженный файл
+        """
+        with get_sessionmaker().begin() as session:
+            upload = session.get(tables.UploadSession, upload_id, with_for_update=True)
+            if upload is None:
+                raise UploadSessionNotFoundError(f"Upload {upload_id} not found")
+            if upload.status == tables.UploadSessionStatusEnum.FINALIZED:
+                # Повторная финализация (например, после обрыва ответа) возвращает уже загруженный файл.
+                res = get_file_by_id(upload.file_id)
+                if res is None:
+                    raise UploadSessionNotFoundError(f"File {upload.file_id} not found")
+                return upload, res
+            finalize_timeout = datetime.timedelta(seconds=self.pipeline_config.upload_finalize_timeout_seconds)
+            if (
+                upload.status == tables.UploadSessionStatusEnum.FINALIZING
+                and upload.updated_at > utcnow() - finalize_timeout
+            ):
+                raise UploadSessionError(f"Upload {upload_id} is already being finalized")
+            if upload.received_size != upload.total_size:
+                raise UploadSessionError(
+                    f"Upload {upload_id} is incomplete: {upload.received_size}/{upload.total_size}"
+                )
+            if upload.expires_at is not None and upload.expires_at <= utcnow():
+                raise UploadSessionError(f"Upload {upload_id} expires_at is in the past")
+            upload.status = tables.UploadSessionStatusEnum.FINALIZING
+            upload.updated_at = utcnow()
+            return upload, None
+
+    def _set_upload_status(
+        self, upload_id: str, status: tables.UploadSessionStatusEnum, expected: tables.UploadSessionStatusEnum
+    ) -> None:
+        stmt = (
+            sa.update(tables.UploadSession)
+            .where(tables.UploadSession.upload_id == upload_id, tables.UploadSession.status == expected)
+            .values(status=status, updated_at=utcnow())
+        )
+        with get_sessionmaker().begin() as session:
+            session.execute(stmt)
+
+    def finalize_upload(self, upload_id: str) -> ResponseDTO:
+        logger.info(f"Finalizing upload {upload_id}")
+        self._check_config()
+        upload_dir = UPLOAD_SESSION_PATTERN.format(upload_id=upload_id)
+        file_system = get_file_system(self.pipeline_config.file_system_name)
+        with tracer.start_as_current_span("FileBoxService.finalize_upload") as span:
+            span.set_attribute("upload_id", upload_id)
+            # Строка сессии блокируется только на смену статуса: сборка файла и шаги пайплайна идут без блокировки,
+            # а параллельные PUT и повторная финализация видят статус finalizing.
+            upload, res = self._claim_upload_for_finalize(upload_id)
+            if res is not None:
+                return res
+            span.set_attributes({"file_id": upload.file_id, "file_size": upload.total_size})
+
+            try:
+                data_path = f"{upload_dir}/data"
+                if self._get_upload_local_dir(upload_id) is None:
+                    compose_files(
+                        file_system, data_path, [f"{upload_dir}/part-{i:06d}" for i in range(upload.part_count)]
+                    )
+                # Хэш считается потоком по собранному файлу, вне блокировки строки сессии.
+                content_info = get_file_content_info(data_path, self.pipeline_config.file_system_name)
+                if content_info.size != upload.total_size:
+                    raise UploadSessionError(
+                        f"Upload {upload_id} size mismatch: {content_info.size}/{upload.total_size}"
+                    )
+
+                item = ItemDTO(
+                    file_id=upload.file_id,
+                    file_type=upload.file_type,
+                    file_bytes=b"",
+                    meta_data=upload.meta_data,
+                    expires_at=upload.expires_at,
+                )
+                res = self._store_file(item, content_info, span, source_path=data_path)
+            except Exception:
+                # Финализацию можно повторить: сессия снова принимает запросы.
+                self._set_upload_status(
+                    upload_id, tables.UploadSessionStatusEnum.ACTIVE, tables.UploadSessionStatusEnum.FINALIZING
+                )
+                raise
+            self._set_upload_status(
+                upload_id, tables.UploadSessionStatusEnum.FINALIZED, tables.UploadSessionStatusEnum.FINALIZING
+            )
+
+        # Исходный файл уже скопирован (локально - жесткая ссылка), части загрузки больше не нужны.
+        try:
+            file_system.rm(upload_dir, recursive=True)
+        except OSError as e:
+            logger.warning(f"Failed to remove upload {upload_id} parts: {e}")
+        logger.info(f"Upload {upload_id} finalized as file {upload.file_id}")
+        return res
+
     def get_file_response(self, file_id: str) -> ResponseDTO | None:
         logger.info(f"Getting file {file_id}")
         res = get_file_by_id(file_id)
@@ -168,10 +653,98 @@ class FileBoxService(FileBoxServiceProtocol):
             logger.warning(f"File {file_id} not found")
         return res
 
-    def get_file_bytes(self, path: str) -> bytes:
-        with fsspec.open(path, "rb") as file:
-            file_content = file.read()  # type: ignore
-        return file_content
+    def delete_files(self, file_ids: list[str]) -> list[str]:
+        with tracer.start_as_current_span("FileBoxService.delete_files") as span:
+            span.set_attribute("file_count", len(file_ids))
+            deleted = mark_files_deleted(file_ids)
+        logger.info(f"Marked {len(deleted)} files as deleted")
+        return deleted
+
+    def get_file_bytes(self, path: str, content_hash: str | None = None) -> bytes:
+        return read_file_bytes(path, self.pipeline_config.file_system_name, content_hash=content_hash)
+
+    def get_file_location(self, file_id: str, compress_name: str | None = None) -> FileLocationDTO | None:
+        logger.info(f"Getting file location {file_id} {compress_name}")
+        res = get_file_location(file_id, compress_name)
+        if res is None and compress_name is not None:
+            res = self._render_on_demand(file_id, compress_name)
+        if res is None:
+            logger.warning(f"File {file_id} {compress_name} not found")
+        return res
+
+    def _get_on_demand_preset(self, file_type: str, compress_name: str) -> CompressItemModel | None:
+        if self.pipeline_config.file_config_json_path is None:
+            return None
+        for preset in read_file_config(self.pipeline_config.file_config_json_path).compress:
+            if preset.on_demand and preset.file_type == file_type and preset.compress_name == compress_name:
+                return preset
+        return None
+
+    def _render_on_demand(self, file_id: str, compress_name: str) -> FileLocationDTO | None:
+        file_data = get_file_data(file_id)
+        if file_data is None or file_data.path is None:
+            return None
+        preset = self._get_on_demand_preset(file_data.file_type, compress_name)
+        if preset is None:
+            return None
+
+        with (
+            on_demand_render_flight.lock((file_id, compress_name)),
+            advisory_lock(get_engine(), advisory_lock_key("on_demand", file_id, compress_name)),
+        ):
+            # Пока ждали лок, вариант мог отрендерить параллельный запрос (в этой или другой реплике).
+            res = get_file_location(file_id, compress_name)
+            if res is not None:
+                return res
+
+            logger.info(f"Rendering {compress_name} for {file_id} on demand")
+            with open_image(
+                file_data.path, self.pipeline_config.file_system_name, content_hash=file_data.content_hash
+            ) as img:
+                # Те же лимиты, что у шага сжатия: размер известен из заголовка, до декодирования.
+                source_pixels = img.width * img.height
+                max_pixels = [
+                    limit for limit in (self.pipeline_config.image_max_pixels, preset.max_pixels) if limit is not None
+                ]
+                if max_pixels and source_pixels > min(max_pixels):
+                    logger.warning(
+                        f"Skip on demand {compress_name} for {file_id}: "
+                        f"{source_pixels} pixels exceeds limit {min(max_pixels)}"
+                    )
+                    return None
+                compressed_bytes = get_modified_image(
+                    img=get_oriented_image(img),
+                    resampling=preset.resampling or ResamplingMapEnum.LANCZOS,
+                    image_format=preset.file_format,
+                    width=preset.width,
+                    encode_options=EncodeOptions.from_row(pd.Series(preset.model_dump())),
+                    resize_options=ResizeOptions.from_row(pd.Series(preset.model_dump())),
+                    animation_options=AnimationOptions.from_row(pd.Series(preset.model_dump())),
+                )
+            record = {
+                "file_id": file_id,
+                "file_type": file_data.file_type,
+                "file_format": preset.file_format,
+                "compress_name": compress_name,
+            }
+            content_info = get_content_info(compressed_bytes)
+            store_record(
+                self.app.ds.get_table("file_box_image_compressed"),
+                {**record, "file_bytes": compressed_bytes},
+                content_hash=content_info.content_hash,
+            )
+            store_record(
+                self.app.ds.get_table("file_box_compress_data"),
+                {
+                    **record,
+                    "path": IMAGE_PATTERN_COMPRESSED.format(**record),
+                    "content_hash": content_info.content_hash,
+                    "size": content_info.size,
+                    "width": content_info.width,
+                    "height": content_info.height,
+                },
+            )
+        return get_file_location(file_id, compress_name)
 
     def get_config(self) -> FileConfigModel:
         logger.info("Getting config")
@@ -179,9 +752,10 @@ class FileBoxService(FileBoxServiceProtocol):
             logger.warning("Config file not found, Please set config via set_config method")
             raise ValueError("Config file not found, Please set config via set_config method")
         
-        config = read_full_config_from_json(config_path=self.pipeline_config.file_config_json_path)
+        config = read_file_config(self.pipeline_config.file_config_json_path)
         logger.info("Config loaded")
-        return FileConfigModel(**config)
+        # Копия: кэшированный конфиг общий для всех запросов.
+        return config.model_copy(deep=True)
 
     def set_config(self, config: FileConfigModel) -> None:
         logger.info("Setting config")
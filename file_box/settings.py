@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -25,6 +27,45 @@ class PipelineConfig(BaseSettings):
     document_chunk_size: int = 10
     file_config_json_path: str | None = None
     file_system_name: str
+    image_max_pixels: int | None = None
+    image_compress_memory_budget_mb: int | None = None
+    ffmpeg_path: str = "ffmpeg"
+    ffprobe_path: str = "ffprobe"
+    video_process_timeout_seconds: float = 60
+    dedup_uploads: bool = False
+    # Части возобновляемой загрузки (кроме последней) не меньше 5 MiB: минимум для сборки частей в S3.
+    upload_chunk_min_mb: int = 5
+    upload_chunk_max_mb: int = 64
+    # Незавершенные сессии загрузки без новых частей дольше этого срока удаляются purger'ом вместе с частями.
+    upload_session_expire_hours: float = 24
+    # Финализация, не завершившаяся за это время (процесс упал), может быть запущена повторно.
+    upload_finalize_timeout_seconds: float = 600
+    moderation_vision_endpoint: str = "https://vision.googleapis.com/v1/images:annotate"
+    moderation_api_key: str | None = None
+    moderation_batch_size: int = 16
+    moderation_concurrency: int = 4
+    moderation_images_per_second: float = 10.0
+    moderation_retries: int = 3
+    # Срок жизни подписанных ссылок на модерируемые изображения (ссылки уходят в Vision и LabelStudio).
+    moderation_url_days_expiration: int = 7
+    label_studio_url: str | None = None
+    label_studio_api_key: str | None = None
+    label_studio_project_id: int | None = None
+    label_studio_sync_batch_size: int = 100
+    label_studio_sync_interval_seconds: float = 60
+    purge_batch_size: int = 1000
+    purge_interval_seconds: float = 60
+    purge_grace_seconds: float = 0
+    storage_write_concurrency: int = 8
+    storage_write_max_in_flight_mb: int = 64
+    storage_write_retries: int = 3
+    local_cache_dir: str | None = None
+    local_cache_max_mb: int = 10240
+    api_compression: Literal["none", "gzip", "brotli"] = "gzip"
+    api_compression_minimum_size: int = 1000
+    tracing_exporter: Literal["none", "console", "file", "otlp"] = "none"
+    tracing_file_path: str | None = None
+    tracing_otlp_endpoint: str | None = None
 
 
 pipeline_config = PipelineConfig()  # type: ignore
@@ -1,4 +1,6 @@
-import datetime
+import hashlib
+import subprocess
+from dataclasses import asdict, fields
 from typing import Any, Generator, cast
 
 import pandas as pd
@@ -6,78 +8,502 @@ from datapipe.compute import Catalog
 from datapipe.datatable import DataStore
 from datapipe.types import IndexDF
 from loguru import logger
+from PIL import Image, UnidentifiedImageError
 
 from file_box.catalog import IMAGE_PATTERN_COMPRESSED
+from file_box.db_utils import utcnow
 from file_box.file_utils import (
+    TRANSPOSED_ORIENTATIONS,
+    AnimationOptions,
+    ContentInfo,
+    EncodeOptions,
+    ImageMetaInfo,
     ResamplingMapEnum,
-    get_image_bytes,
+    ResizeOptions,
+    VideoMetaInfo,
+    extract_video_frame,
+    get_cached_local_path,
+    get_document_format,
+    get_document_preview_renderer,
+    get_image_meta,
     get_modified_image,
-    get_signed_url,
+    get_oriented_image,
+    get_peak_rss_bytes,
+    get_poster_position,
+    get_resized_image,
+    get_target_size,
     google_details_to_status,
+    is_animated,
     merge_metadata,
+    open_image,
+    open_video_input,
+    parse_label_studio_annotations,
+    probe_video,
     read_config_from_json,
+    read_file_bytes,
+    read_file_header,
     remove_data_by_keys,
+    reset_peak_rss,
+    save_image_to_io_bytes,
+    sign_urls,
 )
+from file_box.metrics import STEP_STAGE_DURATION
+from file_box.moderation import get_cached_moderation_details, get_vision_moderation_client, save_moderation_details
+from file_box.purge import mark_files_deleted
+from file_box.tracing import tracer
 
 
 def file_box_generate_image_compress_config(config_path: str) -> Generator[pd.DataFrame, Any, None]:
     compress_data = read_config_from_json(config_path=config_path, config_name="compress")
 
-    yield pd.DataFrame(
+    compress_config_df = pd.DataFrame(
         compress_data,
-        columns=["file_type", "file_format", "resampling", "compress_name", "width"],
+        columns=[
+            "file_type",
+            "file_format",
+            "resampling",
+            "compress_name",
+            "width",
+            "quality",
+            "method",
+            "lossless",
+            "progressive",
+            "optimize",
+            "max_pixels",
+            "on_demand",
+            "max_height",
+            "fit",
+            "no_upscale",
+            "passthrough_if_same_format_and_size",
+            "max_frames",
+            "max_duration_ms",
+        ],
     )
+    # Необязательные параметры кодирования пишем в БД как NULL, а не NaN.
+    yield compress_config_df.astype(object).where(compress_config_df.notna(), None)
+
+
+def file_box_generate_document_preview_config(config_path: str) -> Generator[pd.DataFrame, Any, None]:
+    preview_data = read_config_from_json(config_path=config_path, config_name="preview")
+
+    preview_config_df = pd.DataFrame(
+        preview_data,
+        columns=[
+            "file_type",
+            "file_format",
+            "compress_name",
+            "width",
+            "quality",
+            "method",
+            "lossless",
+            "progressive",
+            "optimize",
+        ],
+    )
+    yield preview_config_df.astype(object).where(preview_config_df.notna(), None)
+
+
+def file_box_generate_video_config(config_path: str) -> Generator[pd.DataFrame, Any, None]:
+    video_data = read_config_from_json(config_path=config_path, config_name="video")
+
+    video_config_df = pd.DataFrame(video_data, columns=["file_type", "poster_seek_seconds"])
+    yield video_config_df.fillna({"poster_seek_seconds": 1.0})
 
 
 def file_box_generate_image_moderation_config(config_path: str) -> Generator[pd.DataFrame, Any, None]:
     compress_data = read_config_from_json(config_path=config_path, config_name="moderation")
 
-    yield pd.DataFrame(compress_data, columns=["file_type", "ls_data"])
+    yield pd.DataFrame(compress_data, columns=["file_type", "ls_data", "source_compress_name"])
+
+
+IMAGE_META_COLUMNS = [
+    "file_id",
+    "file_type",
+    *(field.name for field in fields(ImageMetaInfo)),
+    "content_hash",
+    "size",
+]
+
+
+def file_box_image_extract_meta(
+    image_raw_df: pd.DataFrame,
+    file_data_df: pd.DataFrame,
+    file_system_name: str,
+    file_system_creds_path: str | None = None,
+) -> pd.DataFrame:
+    """
+    Метод для извлечения метаданных исходных изображений (размеры, формат, EXIF Orientation, цветовой режим,
+    количество кадров). Читается только заголовок файла, пиксели не декодируются.
+
+    :param image_raw_df: DataFrame с исходными файлами.
+    :param file_data_df: DataFrame с данными файлов (хэш и размер исходника).
+    :param file_system_name: название файловой системы хранения изображений.
+    :param file_system_creds_path: путь к JSON-файлу для авторизации в файловой системе (опционально).
+    """
+    content_infos = {
+        (row.file_id, row.file_type): {"content_hash": row.content_hash, "size": row.size}
+        for row in file_data_df.itertuples()
+    }
+    records = []
+    for row in image_raw_df.itertuples():
+        try:
+            content_hash = content_infos.get((row.file_id, row.file_type), {}).get("content_hash")
+            with open_image(str(row.filepath), file_system_name, file_system_creds_path, content_hash) as img:
+                image_meta = get_image_meta(img)
+        except UnidentifiedImageError:
+            # Файлы, которые не являются изображениями, пропускаются.
+            logger.debug(f"Skip {row.filepath}: not an image")
+            continue
+        records.append(
+            {
+                "file_id": row.file_id,
+                "file_type": row.file_type,
+                **asdict(image_meta),
+                **content_infos.get((row.file_id, row.file_type), {}),
+            }
+        )
+
+    image_meta_df = pd.DataFrame(records, columns=IMAGE_META_COLUMNS)
+    return image_meta_df.astype(object).where(image_meta_df.notna(), None)
+
+
+def _get_content_hashes(file_data_df: pd.DataFrame) -> dict[tuple[str, str], str]:
+    """
+    Хэши исходников из file_box_file_data по (file_id, file_type): по ним проверяется копия в локальном кэше.
+    """
+    return {
+        (row.file_id, row.file_type): row.content_hash
+        for row in file_data_df.itertuples()
+        if isinstance(row.content_hash, str)
+    }
+
+
+def _is_passthrough(row: pd.Series, image_meta: ImageMetaInfo) -> bool:
+    """
+    Вариант совпадает с исходником: тот же формат и размер, без поворота и параметров кодирования.
+    """
+    # Копия исходника сохраняет его метаданные (EXIF, GPS), поэтому она только по явному согласию пресета.
+    passthrough = row.get("passthrough_if_same_format_and_size")
+    if passthrough is None or pd.isna(passthrough) or not passthrough:
+        return False
+    animation_options = AnimationOptions.from_row(row)
+    if image_meta.frame_count > 1 and (
+        (animation_options.max_frames or image_meta.frame_count) < image_meta.frame_count
+        or animation_options.max_duration_ms is not None
+    ):
+        # Анимацию нужно обрезать, копия исходника не подходит.
+        return False
+    source_size = (image_meta.width, image_meta.height)
+    return (
+        get_target_size(source_size, row["width"], ResizeOptions.from_row(row)) == source_size
+        and str(row["file_format"]).upper() == image_meta.image_format
+        and image_meta.orientation == 1
+        and EncodeOptions.from_row(row) == EncodeOptions()
+    )
+
+
+def _get_compressed_record(row: pd.Series, compressed_bytes: bytes, size: tuple[int, int]) -> dict[str, Any]:
+    width, height = size
+    return {
+        "file_bytes": compressed_bytes,
+        "file_id": row["file_id"],
+        "file_type": row["file_type"],
+        "file_format": row["file_format"],
+        "compress_name": row["compress_name"],
+        "source_path": None,
+        "content_hash": hashlib.sha256(compressed_bytes).hexdigest(),
+        "size": len(compressed_bytes),
+        "width": width,
+        "height": height,
+    }
+
+
+def _get_passthrough_record(
+    row: pd.Series, source_path: str, source_info: ContentInfo, size: tuple[int, int]
+) -> dict[str, Any]:
+    """
+    Вариант-копия исходника: хранилище копирует (или связывает жесткой ссылкой) исходный объект по source_path.
+    """
+    width, height = size
+    return {
+        "file_bytes": None,
+        "file_id": row["file_id"],
+        "file_type": row["file_type"],
+        "file_format": row["file_format"],
+        "compress_name": row["compress_name"],
+        "source_path": source_path,
+        "content_hash": source_info.content_hash,
+        "size": source_info.size,
+        "width": width,
+        "height": height,
+    }
+
+
+def _split_presets(
+    filepath: str, presets_df: pd.DataFrame, image_meta: ImageMetaInfo
+) -> tuple[list[pd.Series], list[pd.Series]]:
+    """
+    Делит пресеты на копии исходника и варианты, которые нужно кодировать, пропуская превышающие max_pixels.
+    """
+    source_pixels = image_meta.width * image_meta.height
+    passthrough_rows = []
+    encode_rows = []
+    for _, row in presets_df.iterrows():
+        max_pixels = row.get("max_pixels")
+        if pd.notna(max_pixels) and source_pixels > max_pixels:
+            logger.warning(f"Skip {row['compress_name']} for {filepath}: {source_pixels} pixels exceeds limit")
+            continue
+        if _is_passthrough(row, image_meta):
+            passthrough_rows.append(row)
+        else:
+            encode_rows.append(row)
+    return passthrough_rows, encode_rows
+
+
+def _compress_image_file(
+    filepath: str,
+    presets_df: pd.DataFrame,
+    image_meta: ImageMetaInfo | None,
+    source_info: ContentInfo | None,
+    file_system_name: str,
+    file_system_creds_path: str | None = None,
+    max_image_pixels: int | None = None,
+    memory_budget_mb: int | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Метод для сжатия одного исходного изображения во все его пресеты.
+
+    Размеры и формат берутся из метаданных (file_box_image_meta), поэтому лимиты проверяются без открытия файла.
+    Варианты, совпадающие с исходником, копируются хранилищем без чтения и декодирования.
+    Исходник декодируется один раз на файл, поворачивается по EXIF Orientation и освобождается сразу после
+    кодирования всех вариантов. Если декодированное изображение не помещается в memory_budget_mb,
+    JPEG декодируется заново для каждого варианта в уменьшенном масштабе (Image.draft).
+
+    :param filepath: путь к исходному файлу.
+    :param presets_df: строки конфигурации сжатия для этого файла.
+    :param image_meta: метаданные исходника (если еще не извлечены, читаются из заголовка файла).
+    :param source_info: хэш и размер исходника (если неизвестны, исходник для копий читается целиком).
+    :param file_system_name: название файловой системы хранения изображений.
+    :param file_system_creds_path: путь к JSON-файлу для авторизации в файловой системе (опционально).
+    :param max_image_pixels: максимальное число пикселей исходника (опционально).
+    :param memory_budget_mb: бюджет памяти на декодированное изображение в MiB (опционально).
+    """
+
+    compressed_records: list[dict[str, Any]] = []
+    content_hash = source_info.content_hash if source_info is not None else None
+
+    with tracer.start_as_current_span("compress_image_file") as span:
+        if image_meta is None:
+            try:
+                with open_image(filepath, file_system_name, file_system_creds_path, content_hash) as img:
+                    image_meta = get_image_meta(img)
+            except UnidentifiedImageError:
+                # Например, видео того же file_type: его пресеты применяются к постеру.
+                logger.debug(f"Skip {filepath}: not an image")
+                return []
+        span.set_attributes(
+            {
+                "filepath": filepath,
+                "width": image_meta.width,
+                "height": image_meta.height,
+                "image_format": str(image_meta.image_format),
+            }
+        )
+        source_pixels = image_meta.width * image_meta.height
+        if max_image_pixels is not None and source_pixels > max_image_pixels:
+            logger.warning(f"Skip {filepath}: {source_pixels} pixels exceeds limit {max_image_pixels}")
+            return []
+
+        passthrough_rows, encode_rows = _split_presets(filepath, presets_df, image_meta)
+
+        source_size = (image_meta.width, image_meta.height)
+        if passthrough_rows and source_info is not None:
+            for row in passthrough_rows:
+                compressed_records.append(_get_passthrough_record(row, filepath, source_info, source_size))
+        elif passthrough_rows:
+            source_bytes = read_file_bytes(filepath, file_system_name, file_system_creds_path, content_hash)
+            for row in passthrough_rows:
+                compressed_records.append(_get_compressed_record(row, source_bytes, source_size))
+
+        if encode_rows:
+            compressed_records.extend(
+                _encode_image_file(
+                    filepath,
+                    encode_rows,
+                    image_meta,
+                    file_system_name,
+                    file_system_creds_path,
+                    memory_budget_mb,
+                    content_hash,
+                )
+            )
+        span.set_attribute("variant_count", len(compressed_records))
+
+    return compressed_records
+
+
+def _encode_image_file(
+    filepath: str,
+    rows: list[pd.Series],
+    image_meta: ImageMetaInfo,
+    file_system_name: str,
+    file_system_creds_path: str | None = None,
+    memory_budget_mb: int | None = None,
+    content_hash: str | None = None,
+) -> list[dict[str, Any]]:
+    compressed_records = []
+    with open_image(filepath, file_system_name, file_system_creds_path, content_hash) as img:
+        decoded_bytes = image_meta.width * image_meta.height * len(img.getbands())
+        draft_per_variant = (
+            memory_budget_mb is not None and decoded_bytes > memory_budget_mb * 1024 * 1024 and img.format == "JPEG"
+        )
+        oriented_img = img
+        if not draft_per_variant:
+            with STEP_STAGE_DURATION.labels("file_box_image_compress", "decode").time():
+                img.load()
+                oriented_img = get_oriented_image(img)
+
+        for row in rows:
+            if draft_per_variant:
+                with open_image(filepath, file_system_name, file_system_creds_path, content_hash) as variant_img:
+                    draft_size = get_target_size(
+                        (image_meta.width, image_meta.height), row["width"], ResizeOptions.from_row(row)
+                    )
+                    # draft работает в координатах файла, до поворота по EXIF Orientation.
+                    if image_meta.orientation in TRANSPOSED_ORIENTATIONS:
+                        draft_size = draft_size[::-1]
+                    variant_img.draft(variant_img.mode, draft_size)
+                    with STEP_STAGE_DURATION.labels("file_box_image_compress", "decode").time():
+                        variant_img.load()
+                    compressed_bytes, size = _get_modified_image_from_row(get_oriented_image(variant_img), row)
+            else:
+                compressed_bytes, size = _get_modified_image_from_row(oriented_img, row)
+
+            compressed_records.append(_get_compressed_record(row, compressed_bytes, size))
+
+    return compressed_records
+
+
+def _get_modified_image_from_row(img: Image.Image, row: pd.Series) -> tuple[bytes, tuple[int, int]]:
+    if is_animated(img):
+        # Кадры анимации ресайзятся и кодируются потоково, стадии не разделяются.
+        with STEP_STAGE_DURATION.labels("file_box_image_compress", "encode").time():
+            compressed_bytes = get_modified_image(
+                img=img,
+                resampling=ResamplingMapEnum(row["resampling"]),
+                image_format=row["file_format"],
+                width=row["width"],
+                encode_options=EncodeOptions.from_row(row),
+                resize_options=ResizeOptions.from_row(row),
+                animation_options=AnimationOptions.from_row(row),
+            )
+        image_meta = get_image_meta(img)
+        return compressed_bytes, get_target_size(
+            (image_meta.width, image_meta.height), row["width"], ResizeOptions.from_row(row)
+        )
+
+    with STEP_STAGE_DURATION.labels("file_box_image_compress", "resize").time():
+        resized_img = get_resized_image(
+            img=img,
+            resampling=ResamplingMapEnum(row["resampling"]),
+            width=row["width"],
+            resize_options=ResizeOptions.from_row(row),
+        )
+    with STEP_STAGE_DURATION.labels("file_box_image_compress", "encode").time():
+        compressed_bytes = save_image_to_io_bytes(
+            img=resized_img, image_format=row["file_format"], encode_options=EncodeOptions.from_row(row)
+        )
+    return compressed_bytes, resized_img.size
 
 
 def file_box_image_compress(
     image_compress_config: pd.DataFrame,
     image_raw_df: pd.DataFrame,
+    image_meta_df: pd.DataFrame,
+    video_poster_df: pd.DataFrame,
     file_system_name: str,
     file_system_creds_path: str | None = None,
+    max_image_pixels: int | None = None,
+    memory_budget_mb: int | None = None,
 ) -> tuple[pd.DataFrame, pd.DataFrame]:
+    reset_peak_rss()
+
+    # Для видео исходником вариантов служит постер: варианты пишутся с file_id и file_type видео.
+    # Постер не может сжиматься отдельным шагом, иначе шаги удаляли бы варианты друг друга.
+    if not video_poster_df.empty:
+        poster_paths = video_poster_df.set_index(["file_id", "file_type"])["filepath"]
+        image_raw_df = image_raw_df.assign(
+            filepath=[
+                poster_paths.get((file_id, file_type), filepath)
+                for file_id, file_type, filepath in image_raw_df[["file_id", "file_type", "filepath"]].itertuples(
+                    index=False, name=None
+                )
+            ]
+        )
+
+    # Пресеты on_demand рендерятся при первом скачивании (FileBoxService.get_file_location).
+    # Если они попадут в обрабатываемый батч (например, сменился исходник), ранее отрендеренный
+    # вариант будет удален и создан заново при следующем запросе.
+    eager_compress_config = image_compress_config[~image_compress_config["on_demand"].eq(True)]
+
     merged_df = pd.merge(
         image_raw_df,
-        image_compress_config,
+        eager_compress_config,
         on="file_type",
         how="inner",
     )
-    merged_df["file_bytes"] = merged_df["filepath"].apply(
-        get_image_bytes,
-        file_system_name=file_system_name,
-        file_system_creds_path=file_system_creds_path,
-    )
 
-    compressed_records = []
+    image_metas = {}
+    source_infos = {}
+    for _, row in image_meta_df.iterrows():
+        key = (row["file_id"], row["file_type"])
+        image_metas[key] = ImageMetaInfo(**{field.name: row[field.name] for field in fields(ImageMetaInfo)})
+        if row.get("content_hash") is not None and pd.notna(row.get("content_hash")):
+            source_infos[key] = ContentInfo(content_hash=row["content_hash"], size=int(row["size"]))
 
-    for _, row in merged_df.iterrows():
-        compressed_bytes = get_modified_image(
-            img=row["file_bytes"],
-            resampling=ResamplingMapEnum(row["resampling"]),
-            image_format=row["file_format"],
-            width=row["width"],
-        )
+    compressed_records = []
 
-        compressed_records.append(
+    with tracer.start_as_current_span("file_box_image_compress") as span:
+        for filepath, presets_df in merged_df.groupby("filepath", sort=False):
+            key = (presets_df.iloc[0]["file_id"], presets_df.iloc[0]["file_type"])
+            compressed_records.extend(
+                _compress_image_file(
+                    filepath=str(filepath),
+                    presets_df=presets_df,
+                    image_meta=image_metas.get(key),
+                    source_info=source_infos.get(key),
+                    file_system_name=file_system_name,
+                    file_system_creds_path=file_system_creds_path,
+                    max_image_pixels=max_image_pixels,
+                    memory_budget_mb=memory_budget_mb,
+                )
+            )
+        span.set_attributes(
             {
-                "file_bytes": compressed_bytes,
-                "file_id": row["file_id"],
-                "file_type": row["file_type"],
-                "file_format": row["file_format"],
-                "compress_name": row["compress_name"],
+                "file_count": merged_df["filepath"].nunique(),
+                "variant_count": len(compressed_records),
+                "bytes_encoded": sum(
+                    len(record["file_bytes"]) for record in compressed_records if record["file_bytes"] is not None
+                ),
             }
         )
 
+    logger.info(
+        f"Compressed {len(compressed_records)} variants from {merged_df['filepath'].nunique()} files, "
+        f"peak RSS {get_peak_rss_bytes() / 1024 / 1024:.1f} MiB"
+    )
+
+    # Для копий исходника file_bytes пустой, хранилище копирует объект по source_path,
+    # content_hash нужен, чтобы копия обновлялась при смене исходника.
     image_compressed_df = pd.DataFrame(
         compressed_records,
-        columns=["file_bytes", "file_id", "file_type", "file_format", "compress_name"],
+        columns=["file_bytes", "file_id", "file_type", "file_format", "compress_name", "source_path", "content_hash"],
+    )
+    # Хэш и размеры посчитаны при кодировании, повторно байты не читаются.
+    image_compressed_df_without_bytes = pd.DataFrame(
+        compressed_records,
+        columns=["file_id", "file_type", "file_format", "compress_name", "content_hash", "size", "width", "height"],
     )
-    image_compressed_df_without_bytes = image_compressed_df[["file_id", "file_type", "file_format", "compress_name"]]
     image_compressed_df_without_bytes["path"] = (
         image_compressed_df_without_bytes.apply(
             lambda x: IMAGE_PATTERN_COMPRESSED.format(
@@ -92,59 +518,331 @@ def file_box_image_compress(
     return image_compressed_df, image_compressed_df_without_bytes
 
 
+def _render_document_previews(
+    filepath: str,
+    presets_df: pd.DataFrame,
+    file_system_name: str,
+    file_system_creds_path: str | None = None,
+    content_hash: str | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Метод для рендера превью первой страницы одного документа во все его пресеты.
+
+    Формат определяется по сигнатуре в начале файла. Локальный файл (или копия в локальном кэше) передается
+    рендереру по пути, без кэша документ из удаленного хранилища читается один раз на все пресеты.
+
+    :param filepath: путь к исходному файлу.
+    :param presets_df: строки конфигурации превью для этого файла.
+    :param file_system_name: название файловой системы хранения файлов.
+    :param file_system_creds_path: путь к JSON-файлу для авторизации в файловой системе (опционально).
+    :param content_hash: хэш исходника из file_box_file_data (опционально, для проверки копии в локальном кэше).
+    """
+    header = read_file_header(filepath, file_system_name, file_system_creds_path, content_hash=content_hash)
+    document_format = get_document_format(header)
+    renderer = get_document_preview_renderer(document_format) if document_format is not None else None
+    if renderer is None:
+        logger.debug(f"Skip {filepath}: no preview renderer")
+        return []
+
+    source = get_cached_local_path(filepath, file_system_name, file_system_creds_path, content_hash) or read_file_bytes(
+        filepath, file_system_name, file_system_creds_path, content_hash
+    )
+    preview_records = []
+    with tracer.start_as_current_span("render_document_previews") as span:
+        span.set_attributes({"filepath": filepath, "document_format": document_format})
+        for _, row in presets_df.iterrows():
+            try:
+                with STEP_STAGE_DURATION.labels("file_box_document_preview", "render").time():
+                    img = renderer(source, int(row["width"]))
+            except Exception as e:
+                # Поврежденный документ не должен останавливать батч.
+                logger.warning(f"Skip {row['compress_name']} for {filepath}: {e}")
+                continue
+            with STEP_STAGE_DURATION.labels("file_box_document_preview", "encode").time():
+                preview_bytes = save_image_to_io_bytes(
+                    img=img, image_format=row["file_format"], encode_options=EncodeOptions.from_row(row)
+                )
+            preview_records.append(_get_compressed_record(row, preview_bytes, img.size))
+    return preview_records
+
+
+def file_box_document_preview(
+    document_preview_config: pd.DataFrame,
+    document_raw_df: pd.DataFrame,
+    file_data_df: pd.DataFrame,
+    file_system_name: str,
+    file_system_creds_path: str | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Метод для генерации превью документов (первая страница PDF) по конфигурации preview.
+
+    Превью пишутся в те же таблицы, что и сжатые изображения, поэтому отдаются через те же ручки.
+
+    :param document_preview_config: DataFrame с конфигурацией превью.
+    :param document_raw_df: DataFrame с исходными файлами.
+    :param file_data_df: DataFrame с данными файлов (хэш исходника для проверки копии в локальном кэше).
+    :param file_system_name: название файловой системы хранения файлов.
+    :param file_system_creds_path: путь к JSON-файлу для авторизации в файловой системе (опционально).
+    """
+    merged_df = pd.merge(document_raw_df, document_preview_config, on="file_type", how="inner")
+    content_hashes = _get_content_hashes(file_data_df)
+
+    preview_records = []
+    with tracer.start_as_current_span("file_box_document_preview") as span:
+        for filepath, presets_df in merged_df.groupby("filepath", sort=False):
+            key = (presets_df.iloc[0]["file_id"], presets_df.iloc[0]["file_type"])
+            preview_records.extend(
+                _render_document_previews(
+                    str(filepath), presets_df, file_system_name, file_system_creds_path, content_hashes.get(key)
+                )
+            )
+        span.set_attributes({"file_count": merged_df["filepath"].nunique(), "variant_count": len(preview_records)})
+
+    logger.info(f"Rendered {len(preview_records)} previews from {merged_df['filepath'].nunique()} documents")
+
+    document_preview_df = pd.DataFrame(
+        preview_records,
+        columns=["file_bytes", "file_id", "file_type", "file_format", "compress_name", "source_path", "content_hash"],
+    )
+    document_preview_df_without_bytes = pd.DataFrame(
+        preview_records,
+        columns=["file_id", "file_type", "file_format", "compress_name", "content_hash", "size", "width", "height"],
+    )
+    document_preview_df_without_bytes["path"] = [
+        IMAGE_PATTERN_COMPRESSED.format(
+            file_type=row.file_type,
+            file_id=row.file_id,
+            compress_name=row.compress_name,
+            file_format=row.file_format,
+        )
+        for row in document_preview_df_without_bytes.itertuples()
+    ]
+    return document_preview_df, document_preview_df_without_bytes
+
+
+VIDEO_META_COLUMNS = [
+    "file_id",
+    "file_type",
+    *(field.name for field in fields(VideoMetaInfo)),
+    "poster_position",
+]
+
+
+def _describe_video_error(error: Exception, input_url: str, filepath: str) -> str:
+    """
+    Текст ошибки ffmpeg/ffprobe для лога: подписанная ссылка (input_url) заменяется путем в хранилище.
+    """
+    if isinstance(error, subprocess.TimeoutExpired):
+        # str(TimeoutExpired) содержит всю команду вместе со ссылкой.
+        return f"timed out after {error.timeout}s"
+    if isinstance(error, subprocess.CalledProcessError) and error.stderr:
+        return error.stderr.decode(errors="replace").strip().replace(input_url, filepath)
+    return str(error).replace(input_url, filepath)
+
+
+def file_box_video_extract_poster(
+    video_config: pd.DataFrame,
+    video_raw_df: pd.DataFrame,
+    file_data_df: pd.DataFrame,
+    file_system_name: str,
+    file_system_creds_path: str | None = None,
+    ffmpeg_path: str = "ffmpeg",
+    ffprobe_path: str = "ffprobe",
+    timeout: float = 60,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Метод для извлечения кадра-постера и метаданных (длительность, разрешение, кодек) видео через ffmpeg.
+
+    ffprobe читает только заголовки контейнера, ffmpeg перематывает к нужному моменту по индексу
+    и декодирует один кадр. Удаленные файлы читаются по подписанной ссылке, без скачивания целиком.
+    Постеры сжимаются пресетами compress того же file_type в шаге file_box_image_compress.
+
+    :param video_config: DataFrame с конфигурацией видео.
+    :param video_raw_df: DataFrame с исходными файлами.
+    :param file_data_df: DataFrame с данными файлов (хэш исходника для проверки копии в локальном кэше).
+    :param file_system_name: название файловой системы хранения файлов.
+    :param file_system_creds_path: путь к JSON-файлу для авторизации в файловой системе (опционально).
+    :param ffmpeg_path: путь к ffmpeg.
+    :param ffprobe_path: путь к ffprobe.
+    :param timeout: ограничение времени одного вызова ffmpeg/ffprobe в секундах.
+    """
+    merged_df = pd.merge(video_raw_df, video_config, on="file_type", how="inner")
+    content_hashes = _get_content_hashes(file_data_df)
+
+    poster_records = []
+    meta_records = []
+    for row in merged_df.itertuples():
+        with (
+            tracer.start_as_current_span("extract_video_poster") as span,
+            open_video_input(
+                str(row.filepath),
+                file_system_name,
+                file_system_creds_path,
+                content_hashes.get((row.file_id, row.file_type)),
+            ) as input_url,
+        ):
+            span.set_attribute("filepath", str(row.filepath))
+            # Медленный или поврежденный файл (и отсутствующий ffmpeg/ffprobe) не должен останавливать батч.
+            try:
+                with STEP_STAGE_DURATION.labels("file_box_video_extract_poster", "probe").time():
+                    video_meta = probe_video(input_url, ffprobe_path, timeout)
+            except (subprocess.TimeoutExpired, OSError) as e:
+                logger.warning(f"Failed to probe {row.filepath}: {_describe_video_error(e, input_url, row.filepath)}")
+                continue
+            if video_meta is None:
+                logger.debug(f"Skip {row.filepath}: not a video")
+                continue
+
+            poster_position = get_poster_position(video_meta.duration, float(row.poster_seek_seconds))
+            try:
+                with STEP_STAGE_DURATION.labels("file_box_video_extract_poster", "extract").time():
+                    poster_bytes = extract_video_frame(input_url, poster_position, ffmpeg_path, timeout)
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+                logger.warning(
+                    f"Failed to extract poster from {row.filepath}: {_describe_video_error(e, input_url, row.filepath)}"
+                )
+                poster_bytes = b""
+
+        if poster_bytes:
+            poster_records.append({"file_id": row.file_id, "file_type": row.file_type, "file_bytes": poster_bytes})
+        else:
+            poster_position = None
+        meta_records.append(
+            {
+                "file_id": row.file_id,
+                "file_type": row.file_type,
+                **asdict(video_meta),
+                "poster_position": poster_position,
+            }
+        )
+
+    logger.info(f"Extracted {len(poster_records)} posters from {len(merged_df)} files")
+
+    video_poster_df = pd.DataFrame(poster_records, columns=["file_id", "file_type", "file_bytes"])
+    video_meta_df = pd.DataFrame(meta_records, columns=VIDEO_META_COLUMNS)
+    return video_poster_df, video_meta_df.astype(object).where(video_meta_df.notna(), None)
+
+
 def file_box_image_filter_for_moderation(
     image_moderation_config_df: pd.DataFrame,
-    image_compressed_df: pd.DataFrame,
+    compress_data_df: pd.DataFrame,
     image_exclude_moderation_df: pd.DataFrame,
     config_path: str,
     file_system_name: str,
     file_system_creds_path: str | None = None,
+    days_expiration: int = 7,
 ) -> pd.DataFrame:
     """
     Метод для фильтрации пользовательских изображений, подлежащих модерации согласно конфигурации.
 
     :param image_moderation_config_df: DataFrame с конфигурацией модерации изображений пользователей.
-    :param image_compressed_df: DataFrame со сжатыми изображениями пользователей.
+    :param compress_data_df: DataFrame с данными сжатых изображений пользователей (путь и хэш содержимого).
     :param image_exclude_moderation_df: DataFrame с изображениями, не требующими модерацию.
     :param config_path: путь к JSON Config.
     :param file_system_name: название файловой системы хранения изображений.
     :param file_system_creds_path: путь к JSON-файлу для авторизации в файловой системе (опционально).
+    :param days_expiration: срок жизни подписанных ссылок в днях.
     """
     # Удаление изображений, не нуждающихся в модерации.
     image_compressed_df = remove_data_by_keys(
-        image_compressed_df,
+        compress_data_df,
         image_exclude_moderation_df,
         keys=["file_id", "file_type"],
     )
 
-    # Переименовываем filepath в image_gs_url для получения GS Path для Google модерации.
-    image_compressed_df = image_compressed_df.rename(columns={"filepath": "file_gs_url"})
-
-    # Получаем только сжатые изображения согласно конфигурации.
-    compress_config = read_config_from_json(config_path=config_path, config_name="compress")
-    compress_names = []
-    for config in compress_config:
-        if config["width"] == 0:
-            compress_names.append(config["compress_name"])
-    image_compressed_df = image_compressed_df[image_compressed_df["compress_name"].isin(compress_names)]
+    # Переименовываем path в file_gs_url для получения GS Path для Google модерации.
+    image_compressed_df = image_compressed_df.rename(columns={"path": "file_gs_url"})
 
     # Объединяем DataFrames по image_type для добавления ls_data.
     # Используем inner join, т.к. должны попасть только записи с image_type из image_moderation_config_df.
     image_filtered_for_moderation_df = image_compressed_df.merge(
-        image_moderation_config_df[["file_type", "ls_data"]],
+        image_moderation_config_df[["file_type", "source_compress_name", "ls_data"]],
         on="file_type",
         how="inner",
     )
 
-    # Добавляем колонку image_url
-    image_filtered_for_moderation_df["file_url"] = image_filtered_for_moderation_df["file_gs_url"].apply(
-        get_signed_url,
-        file_system_name=file_system_name,
-        file_system_creds_path=file_system_creds_path,
+    # Модерируется вариант source_compress_name из конфигурации модерации (например, небольшой webp),
+    # если он не задан - полноразмерные варианты (width == 0).
+    compress_config = read_config_from_json(config_path=config_path, config_name="compress")
+    full_size_names = [config["compress_name"] for config in compress_config if config["width"] == 0]
+    source_compress_name = image_filtered_for_moderation_df["source_compress_name"]
+    compress_name = image_filtered_for_moderation_df["compress_name"]
+    is_source = (compress_name == source_compress_name) | (
+        source_compress_name.isna() & compress_name.isin(full_size_names)
     )
+    image_filtered_for_moderation_df = image_filtered_for_moderation_df[is_source].copy()
+
+    # Добавляем колонку image_url
+    with tracer.start_as_current_span("sign moderation urls") as span:
+        span.set_attribute("url_count", len(image_filtered_for_moderation_df))
+        signed_urls = sign_urls(
+            image_filtered_for_moderation_df["file_gs_url"].tolist(),
+            file_system_name=file_system_name,
+            file_system_creds_path=file_system_creds_path,
+            days_expiration=days_expiration,
+        )
+    # Пути, которые не удалось подписать (пустая строка), пропускаются.
+    image_filtered_for_moderation_df["file_url"] = [url or None for url in signed_urls]
     image_filtered_for_moderation_df.dropna(subset=["file_url"], inplace=True)
 
-    return image_filtered_for_moderation_df[["file_id", "file_type", "file_url", "file_gs_url", "ls_data"]]
+    return image_filtered_for_moderation_df[
+        ["file_id", "file_type", "file_url", "file_gs_url", "content_hash", "ls_data"]
+    ]
+
+
+def file_box_image_google_moderation(
+    image_filtered_for_moderation_df: pd.DataFrame,
+    endpoint: str,
+    api_key: str | None = None,
+    batch_size: int = 16,
+    concurrency: int = 4,
+    images_per_second: float = 10.0,
+    retries: int = 3,
+) -> pd.DataFrame:
+    """
+    Метод для классификации изображений, подлежащих модерации, в Google Vision API (SAFE_SEARCH_DETECTION).
+
+    Результаты кэшируются по хэшу содержимого (file_box_moderation_cache): повторная обработка
+    (например, после set_config) и одинаковые изображения не классифицируются повторно.
+
+    :param image_filtered_for_moderation_df: DataFrame с изображениями, подлежащими модерации.
+    :param endpoint: URL images:annotate Vision API.
+    :param api_key: API key Vision API (опционально, иначе сервисный аккаунт окружения).
+    :param batch_size: количество изображений в одном запросе.
+    :param concurrency: количество параллельных запросов.
+    :param images_per_second: ограничение скорости классификации.
+    :param retries: количество повторов запроса при ошибке.
+    """
+    df = image_filtered_for_moderation_df
+    content_hashes = list(df["content_hash"].dropna().unique())
+    details_by_hash = get_cached_moderation_details(content_hashes)
+
+    # Одинаковое содержимое классифицируется один раз, изображения без хэша - каждое отдельно.
+    keys = [
+        content_hash if isinstance(content_hash, str) else (file_id, file_type)
+        for file_id, file_type, content_hash in zip(df["file_id"], df["file_type"], df["content_hash"])
+    ]
+    # Vision читает изображение по подписанной ссылке: так работает любое хранилище, и сервисному аккаунту
+    # Vision не нужен доступ к бакету.
+    to_classify = {key: url for key, url in zip(keys, df["file_url"]) if key not in details_by_hash}
+    if to_classify:
+        client = get_vision_moderation_client(endpoint, api_key, batch_size, concurrency, images_per_second, retries)
+        with tracer.start_as_current_span("classify images") as span:
+            span.set_attribute("image_count", len(to_classify))
+            classified = dict(zip(to_classify, client.classify(list(to_classify.values()))))
+        # Неудачная классификация не кэшируется: изображение уйдет в ручную модерацию со статусом PENDING.
+        save_moderation_details(
+            {key: details for key, details in classified.items() if isinstance(key, str) and details is not None}
+        )
+        details_by_hash.update(classified)
+
+    return pd.DataFrame(
+        {
+            "file_id": df["file_id"],
+            "file_type": df["file_type"],
+            "google_details": [details_by_hash.get(key) for key in keys],
+        }
+    )
 
 
 def image_prepare_for_label_studio(
@@ -210,28 +908,16 @@ def image_output_from_label_studio(  # pylint: disable=too-many-locals
 
     # Итерация по данным из LS.
     for _, row in image_to_moderate_ls_output_df.iterrows():
-        annotations = row["annotations"]
-        delete_flag = False
-        moderation_entries = []
-
-        for annotation in annotations:
-            for result in annotation["result"]:
-                from_name = result["from_name"]
-                choices = result.get("value", {"choices": []}).get("choices", [])
-
-                # Если модерация содержит удаление, то добавляем в данные для удаления.
-                if from_name == "moderation" and "DELETE" in choices:
-                    delete_flag = True
-
-                # Собираем данные по модерации.
-                moderation_entries.append({"choice_name": from_name, "choices": choices})
+        delete_flag, moderation_entries, reviewed_at = parse_label_studio_annotations(row["annotations"])
+        # Время ревью - время аннотации в LS; now() только если LS его не вернул.
+        last_reviewed = reviewed_at or utcnow()
 
         if delete_flag:
             deleted_data.append(
                 {
                     "file_id": row["file_id"],
                     "file_type": row["file_type"],
-                    "last_reviewed": datetime.datetime.now(tz=datetime.timezone.utc),
+                    "last_reviewed": last_reviewed,
                 }
             )
         else:
@@ -239,7 +925,7 @@ def image_output_from_label_studio(  # pylint: disable=too-many-locals
                 {
                     "file_id": row["file_id"],
                     "file_type": row["file_type"],
-                    "last_reviewed": datetime.datetime.now(tz=datetime.timezone.utc),
+                    "last_reviewed": last_reviewed,
                     "moderation_data": moderation_entries,
                 }
             )
@@ -257,10 +943,8 @@ def image_output_from_label_studio(  # pylint: disable=too-many-locals
         )
     )
 
-    # Удаление всех изображений в GCS и Pipeline.
-    catalog.get_datatable(datastore, "file_raw").delete_by_idx(
-        idx=cast(IndexDF, image_deleted_data_df[["file_id", "file_type"]])
-    )
+    # Изображения только помечаются удаленными: объекты в хранилище и строки пайплайна удаляет purger.
+    mark_files_deleted(image_deleted_data_df["file_id"].tolist())
 
     return image_moderation_manual_df.reset_index()[  # pylint: disable=E1136
         ["file_id", "file_type", "last_reviewed", "moderation_data"]
@@ -0,0 +1,310 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional, cast
+
+import cityhash
+import fsspec
+import pandas as pd
+import sqlalchemy as sa
+from datapipe.datatable import DataTable
+from datapipe.store.database import TableStoreDB
+from datapipe.store.filedir import BytesFile, ItemStoreFileAdapter, TableStoreFiledir
+from datapipe.store.table_store import TableStore
+from datapipe.types import DataDF, IndexDF, MetadataDF
+from fsspec.implementations.local import LocalFileSystem
+from loguru import logger
+
+from file_box.local_cache import LocalFileCache
+from file_box.metrics import STORAGE_WRITE_BYTES, STORAGE_WRITE_DURATION
+from file_box.tracing import tracer
+
+
+class _InFlightBytes:
+    """
+    Ограничение объема данных, одновременно находящихся в записи.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size: int) -> None:
+        with self._condition:
+            # Объект больше лимита пропускаем, когда других записей нет, иначе он не запишется никогда.
+            while self.in_flight > 0 and self.in_flight + size > self.max_bytes:
+                self._condition.wait()
+            self.in_flight += size
+
+    def release(self, size: int) -> None:
+        with self._condition:
+            self.in_flight -= size
+            self._condition.notify_all()
+
+
+class ConcurrentTableStoreFiledir(TableStoreFiledir):
+    """
+    TableStoreFiledir, который пишет объекты чанка параллельно.
+
+    Объекты пишутся одним PUT (pipe_file) из пула потоков с ограничением объема данных в полете
+    и повторами с экспоненциальной задержкой. Время и объем записи каждого объекта пишутся в метрики.
+    Если передан local_cache, записанные объекты сразу кладутся в локальный кэш (write-through),
+    а скопированные и удаленные из него убираются.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        table_name: str,
+        max_workers: int = 8,
+        max_in_flight_bytes: int = 64 * 1024 * 1024,
+        retries: int = 3,
+        retry_backoff_seconds: float = 0.5,
+        local_cache: Optional[LocalFileCache] = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.table_name = table_name
+        self.max_workers = max_workers
+        self.max_in_flight_bytes = max_in_flight_bytes
+        self.retries = retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.local_cache = local_cache
+
+    def _update_local_cache(self, filepath: str, data: Optional[bytes]) -> None:
+        # Для локальной файловой системы кэш не нужен. Ошибка кэша не должна ломать запись в хранилище.
+        if self.local_cache is None or self._local_path(filepath) is not None:
+            return
+        try:
+            if data is None:
+                self.local_cache.discard(filepath)
+            else:
+                self.local_cache.put(filepath, data)
+        except OSError as e:
+            logger.warning(f"Failed to update local cache for {filepath}: {e}")
+
+    def _with_retries(self, action: str, filepath: str, func: Callable[[], None]) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                func()
+                return
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                backoff = self.retry_backoff_seconds * 2**attempt
+                logger.warning(f"Failed to {action} {filepath} (attempt {attempt + 1}): {e}, retry in {backoff:.1f}s")
+                time.sleep(backoff)
+
+    def _local_path(self, path: str) -> Optional[str]:
+        if not isinstance(self.filesystem, LocalFileSystem):
+            return None
+        return self.filesystem._strip_protocol(path)
+
+    def _put_object(self, filepath: str, data: bytes) -> None:
+        local_path = self._local_path(filepath)
+        if local_path is None:
+            self.filesystem.pipe_file(filepath, data)
+            return
+        # Локально пишем через временный файл и rename: новый inode не затрагивает жесткие ссылки на старый файл.
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        tmp_path = f"{local_path}.{uuid.uuid4().hex}.tmp"
+        self.filesystem.pipe_file(tmp_path, data)
+        os.replace(tmp_path, local_path)
+
+    def _link_object(self, source_path: str, filepath: str) -> None:
+        local_source, local_path = self._local_path(source_path), self._local_path(filepath)
+        if local_source is None or local_path is None:
+            # Удаленные хранилища (gcsfs, s3fs) копируют объект на стороне сервера, без скачивания.
+            self.filesystem.copy(source_path, filepath)
+            return
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        tmp_path = f"{local_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(local_source, tmp_path)
+        except OSError:
+            shutil.copyfile(local_source, tmp_path)
+        os.replace(tmp_path, local_path)
+
+    def _write_object(self, filepath: str, data: bytes) -> None:
+        def write() -> None:
+            with tracer.start_as_current_span(f"{self.table_name} write") as span:
+                span.set_attribute("bytes_written", len(data))
+                start = time.perf_counter()
+                self._put_object(filepath, data)
+                duration = time.perf_counter() - start
+            STORAGE_WRITE_DURATION.labels(self.table_name).observe(duration)
+            STORAGE_WRITE_BYTES.labels(self.table_name).inc(len(data))
+            logger.debug(f"Written {filepath} ({len(data)} bytes) in {duration * 1000:.1f} ms")
+
+        self._with_retries("write", filepath, write)
+        self._update_local_cache(filepath, data)
+
+    def _copy_object(self, source_path: str, filepath: str) -> None:
+        def copy() -> None:
+            with tracer.start_as_current_span(f"{self.table_name} copy") as span:
+                span.set_attribute("source_path", source_path)
+                start = time.perf_counter()
+                self._link_object(source_path, filepath)
+                duration = time.perf_counter() - start
+            STORAGE_WRITE_DURATION.labels(self.table_name).observe(duration)
+            logger.debug(f"Copied {source_path} to {filepath} in {duration * 1000:.1f} ms")
+
+        self._with_retries("copy", filepath, copy)
+        self._update_local_cache(filepath, None)
+
+    def insert_record(self, record: dict[str, Any], source_path: Optional[str] = None) -> None:
+        """
+        Если передан source_path, байты в record не нужны: объект копируется из source_path.
+        """
+        assert not self.readonly
+        assert isinstance(self.adapter, BytesFile)
+        idxs_values = [record[attrname] for attrname in self.attrnames]
+        filepath = self._filenames_from_idxs_values(idxs_values)[0]
+        self._assert_key_values(filepath, idxs_values)
+        if source_path is not None:
+            self._copy_object(source_path, filepath)
+            return
+        self._write_object(filepath, record[self.adapter.bytes_columns])
+
+    def insert_rows(self, df: pd.DataFrame, adapter: Optional[ItemStoreFileAdapter] = None) -> None:
+        """
+        Строки с заполненной колонкой source_path не содержат байтов: объект копируется из source_path.
+        """
+        adapter = adapter or self.adapter
+        if df.empty or not isinstance(adapter, BytesFile):
+            super().insert_rows(df, adapter=adapter)
+            return
+        assert not self.readonly
+
+        source_paths = df["source_path"] if "source_path" in df.columns else pd.Series(None, index=df.index)
+        in_flight = _InFlightBytes(self.max_in_flight_bytes)
+        futures: list[Future] = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for idxs_values, data, source_path in zip(
+                df[self.attrnames].itertuples(index=False, name=None), df[adapter.bytes_columns], source_paths
+            ):
+                filepath = self._filenames_from_idxs_values(list(idxs_values))[0]
+                self._assert_key_values(filepath, list(idxs_values))
+
+                if isinstance(source_path, str):
+                    futures.append(executor.submit(self._copy_object, source_path, filepath))
+                    continue
+                in_flight.acquire(len(data))
+                future = executor.submit(self._write_object, filepath, data)
+                future.add_done_callback(lambda _, size=len(data): in_flight.release(size))
+                futures.append(future)
+
+        for future in futures:
+            future.result()
+
+    def _remove_object(self, filepath: str) -> None:
+        _, path = fsspec.core.split_protocol(filepath)
+        try:
+            self.filesystem.rm_file(path)
+        except FileNotFoundError:
+            pass
+        self._update_local_cache(filepath, None)
+
+    def delete_rows(self, idx: IndexDF) -> None:
+        """
+        Объекты удаляются параллельно из того же пула потоков, что и запись, отсутствующие объекты пропускаются.
+        """
+        if not self.enable_rm or idx.empty:
+            return
+        assert not self.readonly
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(self._with_retries, "delete", filepath, partial(self._remove_object, filepath))
+                for idxs_values in idx[self.attrnames].itertuples(index=False, name=None)
+                for filepath in self._filenames_from_idxs_values(list(idxs_values))
+            ]
+        for future in futures:
+            future.result()
+
+    def update_rows(self, df: pd.DataFrame) -> None:
+        # Запись объекта целиком заменяет старый, отдельное удаление перед записью не нужно.
+        self.insert_rows(df)
+
+
+def get_hashable_record(record: dict[str, Any], content_hash: Optional[str] = None) -> dict[str, Any]:
+    """
+    Строка для хэша метатаблицы datapipe: байты заменяются коротким отпечатком, чтобы datapipe не строил
+    repr всего содержимого файла. Если хэш содержимого уже посчитан (content_hash), отпечаток - он.
+    Для строк без байтовых колонок хэш совпадает с хэшем datapipe.
+    """
+    return {
+        name: (content_hash or f"<bytes {len(value)} {cityhash.CityHash64(value)}>")
+        if isinstance(value, bytes)
+        else value
+        for name, value in record.items()
+    }
+
+
+def insert_record(table_store: TableStore, record: dict[str, Any], source_path: Optional[str] = None) -> None:
+    if isinstance(table_store, ConcurrentTableStoreFiledir):
+        table_store.insert_record(record, source_path=source_path)
+        return
+    assert source_path is None, "source_path is supported only by ConcurrentTableStoreFiledir"
+    if isinstance(table_store, TableStoreDB):
+        insert_sql = table_store.dbconn.insert(table_store.data_table).values(record)
+        # Обновляются только колонки из record: остальные (например, deleted_at) пишутся не этой записью.
+        sql = insert_sql.on_conflict_do_update(
+            index_elements=table_store.primary_keys,
+            set_={name: insert_sql.excluded[name] for name in record if name not in table_store.primary_keys},
+        )
+        with table_store.dbconn.con.begin() as con:
+            con.execute(sql)
+    else:
+        table_store.insert_rows(pd.DataFrame([record]))
+
+
+def store_record(
+    table: DataTable,
+    record: dict[str, Any],
+    now: Optional[float] = None,
+    content_hash: Optional[str] = None,
+    source_path: Optional[str] = None,
+) -> IndexDF:
+    """
+    Запись одной строки в таблицу datapipe без построения DataFrame с данными.
+
+    Новизна строки и метаданные считаются MetaTable datapipe (как в DataTable.store_chunk) по строке без байтов:
+    данные пишутся, только если строка новая или изменилась, метаданные обновляются всегда.
+
+    :param table: таблица datapipe
+    :param record: строка таблицы (ключи и данные)
+    :param now: время записи
+    :param content_hash: посчитанный заранее хэш байтовой колонки (опционально)
+    :param source_path: путь к уже записанному объекту, который копируется вместо записи байтов
+        (байтовая колонка в record тогда не заполняется, нужен content_hash)
+    :return: индекс измененной строки (пустой, если строка не изменилась)
+    """
+    if source_path is not None:
+        assert content_hash is not None, "content_hash is required with source_path"
+        # При заданном content_hash хэш строки не зависит от самих байтов.
+        bytes_column = cast(BytesFile, cast(TableStoreFiledir, table.table_store).adapter).bytes_columns
+        hashable_record = get_hashable_record({**record, bytes_column: b""}, content_hash)
+    else:
+        hashable_record = get_hashable_record(record, content_hash)
+
+    with tracer.start_as_current_span(f"{table.name} store_record"):
+        new_df, changed_df, new_meta_df, changed_meta_df = table.meta_table.get_changes_for_store_chunk(
+            cast(DataDF, pd.DataFrame([hashable_record])), now
+        )
+        is_changed = not new_df.empty or not changed_df.empty
+        if is_changed:
+            insert_record(table.table_store, record, source_path=source_path)
+        table.meta_table.update_rows(
+            cast(MetadataDF, pd.concat([df for df in [new_meta_df, changed_meta_df] if not df.empty]))
+        )
+
+    key = {name: record[name] for name in table.primary_keys}
+    if not is_changed:
+        return cast(IndexDF, pd.DataFrame(columns=table.primary_keys))
+    return cast(IndexDF, pd.DataFrame([key], columns=table.primary_keys))
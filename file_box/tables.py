@@ -18,6 +18,7 @@ class ImageFormatEnum(StrEnum):
     WEBP = "WEBP"
     JPEG = "JPEG"
     PNG = "PNG"
+    AVIF = "AVIF"
         
 
 class Base(DeclarativeBase):
@@ -41,6 +42,72 @@ class ImageCompressConfig(Base):
     compress_name: Mapped[str] = mapped_column(primary_key=True)
     resampling: Mapped[ImageResamplingEnum | None] = mapped_column(sa.String)
     width: Mapped[int]
+    quality: Mapped[int | None]
+    method: Mapped[int | None]
+    lossless: Mapped[bool | None]
+    progressive: Mapped[bool | None]
+    optimize: Mapped[bool | None]
+    max_pixels: Mapped[int | None] = mapped_column(sa.BigInteger)
+    on_demand: Mapped[bool | None]
+    max_height: Mapped[int | None]
+    fit: Mapped[str | None]
+    no_upscale: Mapped[bool | None]
+    passthrough_if_same_format_and_size: Mapped[bool | None]
+    max_frames: Mapped[int | None]
+    max_duration_ms: Mapped[int | None]
+
+
+class DocumentPreviewConfig(Base):
+    __tablename__ = "file_box_document_preview_config"
+
+    file_type: Mapped[str] = mapped_column(primary_key=True)
+    file_format: Mapped[ImageFormatEnum] = mapped_column(sa.String, primary_key=True)
+    compress_name: Mapped[str] = mapped_column(primary_key=True)
+    width: Mapped[int]
+    quality: Mapped[int | None]
+    method: Mapped[int | None]
+    lossless: Mapped[bool | None]
+    progressive: Mapped[bool | None]
+    optimize: Mapped[bool | None]
+
+
+class VideoConfig(Base):
+    __tablename__ = "file_box_video_config"
+
+    file_type: Mapped[str] = mapped_column(primary_key=True)
+    poster_seek_seconds: Mapped[float]
+
+
+class VideoMeta(Base):
+    __tablename__ = "file_box_video_meta"
+
+    file_id: Mapped[str] = mapped_column(primary_key=True)
+    file_type: Mapped[str] = mapped_column(primary_key=True)
+    # Размеры с учетом поворота из метаданных.
+    width: Mapped[int]
+    height: Mapped[int]
+    duration: Mapped[float | None]
+    video_codec: Mapped[str | None]
+    frame_rate: Mapped[float | None]
+    rotation: Mapped[int]
+    poster_position: Mapped[float | None]
+
+
+class ImageMeta(Base):
+    __tablename__ = "file_box_image_meta"
+
+    file_id: Mapped[str] = mapped_column(primary_key=True)
+    file_type: Mapped[str] = mapped_column(primary_key=True)
+    # Размеры с учетом EXIF Orientation (как изображение показывается).
+    width: Mapped[int]
+    height: Mapped[int]
+    image_format: Mapped[str | None]
+    orientation: Mapped[int]
+    mode: Mapped[str]
+    frame_count: Mapped[int]
+    # Хэш и размер исходника из file_box_file_data, для копирования вариантов без чтения файла.
+    content_hash: Mapped[str | None]
+    size: Mapped[int | None] = mapped_column(sa.BigInteger)
 
 
 class ImageModerationConfig(Base):
@@ -48,6 +115,8 @@ class ImageModerationConfig(Base):
     
     file_type: Mapped[str] = mapped_column(primary_key=True)
     ls_data: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    # Вариант сжатия, который отправляется на модерацию, без него - полноразмерные варианты.
+    source_compress_name: Mapped[str | None]
     
 
 class ImageExcludeModeration(Base):
@@ -64,6 +133,8 @@ class ImageFilteredForModeration(Base):
     file_type: Mapped[str] = mapped_column(primary_key=True)
     file_url: Mapped[str] = mapped_column(sa.String)
     file_gs_url: Mapped[str] = mapped_column(sa.String)
+    # Хэш содержимого изображения, по нему кэшируется результат классификации.
+    content_hash: Mapped[str | None]
     ls_data: Mapped[dict] = mapped_column(JSONB)
 
 
@@ -74,6 +145,14 @@ class ImageGoogleModerationData(Base):
     file_type: Mapped[str] = mapped_column(primary_key=True)
     google_details: Mapped[dict | None] = mapped_column(JSONB)
 
+class ModerationCache(Base):
+    __tablename__ = "file_box_moderation_cache"
+
+    content_hash: Mapped[str] = mapped_column(primary_key=True)
+    google_details: Mapped[dict] = mapped_column(JSONB)
+    created_at: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
+
+
 class FileData(Base):
     __tablename__ = "file_box_file_data"
     
@@ -81,6 +160,15 @@ class FileData(Base):
     file_type: Mapped[str] = mapped_column(primary_key=True)
     meta_data: Mapped[dict] = mapped_column(JSONB)
     path: Mapped[str | None]
+    content_hash: Mapped[str | None] = mapped_column(index=True)
+    size: Mapped[int | None] = mapped_column(sa.BigInteger)
+    width: Mapped[int | None]
+    height: Mapped[int | None]
+    image_format: Mapped[str | None]
+    # Время мягкого удаления: файл скрыт из выдачи, объекты и строки пайплайна удаляет purger.
+    deleted_at: Mapped[datetime.datetime | None] = mapped_column(sa.DateTime, index=True)
+    # После expires_at файл скрывается из выдачи и помечается удаленным sweeper'ом.
+    expires_at: Mapped[datetime.datetime | None] = mapped_column(sa.DateTime, index=True)
     
 
 class CompressData(Base):
@@ -90,6 +178,10 @@ class CompressData(Base):
     compress_name: Mapped[str] = mapped_column(primary_key=True)
     file_format: Mapped[str]
     path: Mapped[str]
+    content_hash: Mapped[str | None]
+    size: Mapped[int | None] = mapped_column(sa.BigInteger)
+    width: Mapped[int | None]
+    height: Mapped[int | None]
     
 
 class ImageToModerateLsInput(Base):
@@ -118,3 +210,39 @@ class FileDeletedData(Base):
     file_id: Mapped[str] = mapped_column(primary_key=True)
     file_type: Mapped[str] = mapped_column(primary_key=True)
     last_reviewed: Mapped[datetime.datetime]
+
+
+class UploadSessionStatusEnum(StrEnum):
+    ACTIVE = "active"
+    # Сессия заблокирована финализацией: сборка файла и шаги пайплайна идут без блокировки строки.
+    FINALIZING = "finalizing"
+    FINALIZED = "finalized"
+
+
+class UploadSession(Base):
+    __tablename__ = "file_box_upload_session"
+
+    upload_id: Mapped[str] = mapped_column(primary_key=True)
+    file_id: Mapped[str]
+    file_type: Mapped[str]
+    meta_data: Mapped[dict] = mapped_column(JSONB)
+    # Размер файла, заявленный при создании загрузки, и сколько байт уже получено.
+    total_size: Mapped[int] = mapped_column(sa.BigInteger)
+    received_size: Mapped[int] = mapped_column(sa.BigInteger)
+    part_count: Mapped[int]
+    # Срок хранения файла из запроса создания сессии, применяется при финализации.
+    expires_at: Mapped[datetime.datetime | None] = mapped_column(sa.DateTime)
+    status: Mapped[UploadSessionStatusEnum] = mapped_column(sa.String)
+    created_at: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
+    # По updated_at purger удаляет брошенные сессии вместе с частями.
+    updated_at: Mapped[datetime.datetime] = mapped_column(sa.DateTime, index=True)
+
+
+class SyncWatermark(Base):
+    __tablename__ = "file_box_sync_watermark"
+
+    name: Mapped[str] = mapped_column(primary_key=True)
+    # Позиция инкрементальной синхронизации: updated_at и id последней обработанной записи источника.
+    watermark_at: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
+    watermark_id: Mapped[int] = mapped_column(sa.BigInteger)
+    updated_at: Mapped[datetime.datetime] = mapped_column(sa.DateTime)
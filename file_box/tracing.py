@@ -0,0 +1,50 @@
+from typing import Literal
+
+from loguru import logger
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SpanExporter
+
+tracer = trace.get_tracer("file_box")
+
+TracingExporterName = Literal["none", "console", "file", "otlp"]
+
+
+def _span_to_json_line(span: ReadableSpan) -> str:
+    return span.to_json(indent=None) + "\n"
+
+
+def get_span_exporter(
+    exporter: TracingExporterName, file_path: str | None = None, otlp_endpoint: str | None = None
+) -> SpanExporter | None:
+    if exporter == "console":
+        return ConsoleSpanExporter()
+    if exporter == "file":
+        if file_path is None:
+            raise ValueError("TRACING_FILE_PATH is required for the file exporter")
+        return ConsoleSpanExporter(out=open(file_path, "a", encoding="utf-8"), formatter=_span_to_json_line)
+    if exporter == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("opentelemetry-exporter-otlp is not installed, tracing is disabled")
+            return None
+        return OTLPSpanExporter(endpoint=otlp_endpoint)
+    return None
+
+
+def setup_tracing(
+    exporter: TracingExporterName, file_path: str | None = None, otlp_endpoint: str | None = None
+) -> None:
+    """
+    Включает экспорт спанов file_box и datapipe. При exporter="none" трейсинг остается no-op.
+    """
+
+    span_exporter = get_span_exporter(exporter, file_path=file_path, otlp_endpoint=otlp_endpoint)
+    if span_exporter is None:
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": "file-box"}))
+    provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(provider)
+    logger.info(f"Tracing enabled with {exporter} exporter")
@@ -0,0 +1,131 @@
+import datetime
+import math
+import threading
+from collections import OrderedDict
+
+from file_box.configs.model import UrlPolicyEnum, UrlPolicyItemModel
+from file_box.file_utils import sign_urls
+from file_box.metrics import SIGNED_URLS
+
+DEFAULT_DAYS_EXPIRATION = 30
+
+
+class SignedUrlCache:
+    """
+    LRU-кэш подписанных ссылок по ключу (путь, окончание срока действия).
+    """
+
+    def __init__(self, maxsize: int = 10_000) -> None:
+        self.maxsize = maxsize
+        self._items: OrderedDict[tuple[str, datetime.datetime], str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, expires_at: datetime.datetime) -> str | None:
+        with self._lock:
+            url = self._items.get((path, expires_at))
+            if url is not None:
+                self._items.move_to_end((path, expires_at))
+            return url
+
+    def put(self, path: str, expires_at: datetime.datetime, url: str) -> None:
+        with self._lock:
+            self._items[(path, expires_at)] = url
+            self._items.move_to_end((path, expires_at))
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+
+signed_url_cache = SignedUrlCache()
+
+
+def get_url_policy(
+    policies: list[UrlPolicyItemModel], file_type: str, compress_name: str | None
+) -> UrlPolicyItemModel | None:
+    """
+    Политика для пресета важнее политики для всего типа файла.
+    """
+    file_type_policy = None
+    for policy in policies:
+        if policy.file_type != file_type:
+            continue
+        if policy.compress_name is not None and policy.compress_name == compress_name:
+            return policy
+        if policy.compress_name is None:
+            file_type_policy = policy
+    return file_type_policy
+
+
+def get_public_url(template: str, path: str, base_url: str) -> str:
+    relative_path = path[len(base_url) :] if path.startswith(base_url) else path
+    return template.format(path=relative_path.lstrip("/"))
+
+
+def get_bucket_window(
+    policy: UrlPolicyItemModel, now: datetime.datetime
+) -> tuple[datetime.datetime, datetime.datetime]:
+    """
+    Время подписи и окончание срока действия ссылки для окна bucket_hours, в которое попадает now.
+
+    Подпись выполняется на начало окна, а срок действия заканчивается через expiration_days после конца окна,
+    поэтому внутри окна для одного пути получается одна и та же ссылка во всех репликах.
+    """
+    bucket_seconds = policy.bucket_hours * 60 * 60
+    window_start = math.floor(now.timestamp() / bucket_seconds) * bucket_seconds
+    signed_at = datetime.datetime.fromtimestamp(window_start, tz=datetime.timezone.utc)
+    expires_at = signed_at + datetime.timedelta(seconds=bucket_seconds, days=policy.expiration_days)
+    return signed_at, expires_at
+
+
+def get_file_urls(
+    files: list[tuple[str, str, str | None]],
+    policies: list[UrlPolicyItemModel],
+    file_system_name: str,
+    base_url: str,
+) -> list[str]:
+    """
+    Ссылки на файлы согласно политикам. Подписываемые пути подписываются пачками с одинаковым сроком действия.
+
+    :param files: список (путь, тип файла, имя пресета сжатия или None для исходного файла)
+    :param policies: политики ссылок из конфига
+    :param file_system_name: имя файловой системы
+    :param base_url: document_blob_base_url, относительно него строятся публичные ссылки
+    :return: ссылки в порядке файлов, путь файла, если подписать не удалось
+    """
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    urls = [path for path, _, _ in files]
+    # (срок действия в секундах, время подписи) -> индексы файлов.
+    to_sign: dict[tuple[int, datetime.datetime | None], list[int]] = {}
+
+    for i, (path, file_type, compress_name) in enumerate(files):
+        policy = get_url_policy(policies, file_type, compress_name)
+        if policy is None:
+            to_sign.setdefault((DEFAULT_DAYS_EXPIRATION * 24 * 60 * 60, None), []).append(i)
+        elif policy.policy == UrlPolicyEnum.PUBLIC:
+            assert policy.public_url_template is not None
+            urls[i] = get_public_url(policy.public_url_template, path, base_url)
+        elif policy.policy == UrlPolicyEnum.BUCKETED:
+            signed_at, expires_at = get_bucket_window(policy, now)
+            cached_url = signed_url_cache.get(path, expires_at)
+            if cached_url is not None:
+                SIGNED_URLS.labels("cache_hit").inc()
+                urls[i] = cached_url
+                continue
+            to_sign.setdefault((int((expires_at - signed_at).total_seconds()), signed_at), []).append(i)
+        else:
+            to_sign.setdefault((policy.expiration_days * 24 * 60 * 60, None), []).append(i)
+
+    for (expiration_seconds, signed_at), indices in to_sign.items():
+        signed_urls = sign_urls(
+            [files[i][0] for i in indices],
+            file_system_name,
+            expiration_seconds=expiration_seconds,
+            signed_at=signed_at,
+        )
+        for i, signed_url in zip(indices, signed_urls):
+            if not signed_url:
+                continue
+            urls[i] = signed_url
+            if signed_at is not None:
+                expires_at = signed_at + datetime.timedelta(seconds=expiration_seconds)
+                signed_url_cache.put(files[i][0], expires_at, signed_url)
+    return urls
@@ -0,0 +1,33 @@
+"""coalesced image compress
+
+Revision ID: 552e483a16c8
+Revises: bfe314b14f1c
+Create Date: 2026-10-19 14:52:13.904466
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '552e483a16c8'
+down_revision: Union[str, None] = 'bfe314b14f1c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Имя transform meta зависит от класса шага: BatchTransformStep -> CoalescedBatchTransformStep.
+    op.rename_table(
+        'file_box_image_compress_86ef209c89_meta', 'file_box_image_compress_8073becdb2_meta', schema='public'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.rename_table(
+        'file_box_image_compress_8073becdb2_meta', 'file_box_image_compress_86ef209c89_meta', schema='public'
+    )
@@ -0,0 +1,47 @@
+"""preview poster file_data input
+
+Revision ID: e1c94f7a3b58
+Revises: 8a4e2b6f1d07
+Create Date: 2026-10-20 03:05:42.318904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1c94f7a3b58'
+down_revision: Union[str, None] = '8a4e2b6f1d07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Имена transform meta превью документов и постеров видео зависят от входов шагов: добавлен
+    # file_box_file_data (хэш содержимого исходника для проверки локального кэша).
+    op.rename_table(
+        'file_box_document_preview_afe5d35c9c_meta',
+        'file_box_document_preview_fae6ac6ba9_meta',
+        schema='public',
+    )
+    op.rename_table(
+        'file_box_video_extract_poster_e998d9f6b3_meta',
+        'file_box_video_extract_poster_e850ed8fbb_meta',
+        schema='public',
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.rename_table(
+        'file_box_video_extract_poster_e850ed8fbb_meta',
+        'file_box_video_extract_poster_e998d9f6b3_meta',
+        schema='public',
+    )
+    op.rename_table(
+        'file_box_document_preview_fae6ac6ba9_meta',
+        'file_box_document_preview_afe5d35c9c_meta',
+        schema='public',
+    )
@@ -0,0 +1,151 @@
+import datetime
+
+from fastapi.testclient import TestClient
+
+from file_box.api import app
+from file_box.service import (
+    CompressInfoDTO,
+    FileLocationDTO,
+    ResponseDTO,
+    UploadOffsetMismatchError,
+    UploadSessionDTO,
+    get_file_box_service,
+)
+
+
+class FakeFileBoxService:
+    def get_file_response(self, file_id: str) -> ResponseDTO:
+        return ResponseDTO(
+            file_id=file_id,
+            source_path="https://storage.example.com/raw.bytes?" + "signature" * 200,
+            compress_info={"image_327_lanczos_webp": CompressInfoDTO("https://storage.example.com/image.WEBP")},
+            meta_data={"user_id": 327},
+        )
+
+
+def test_file_response_is_compressed() -> None:
+    app.dependency_overrides[get_file_box_service] = FakeFileBoxService
+    try:
+        response = TestClient(app).get("/api/v1/file-response/file_id", headers={"accept-encoding": "gzip"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["compress_info"] == {
+        "image_327_lanczos_webp": {"path": "https://storage.example.com/image.WEBP"}
+    }
+
+
+
+def test_metrics_exposes_route_latency() -> None:
+    app.dependency_overrides[get_file_box_service] = FakeFileBoxService
+    try:
+        client = TestClient(app)
+        client.get("/api/v1/file-response/file_id")
+        response = client.get("/metrics")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    # Метка route - шаблон пути, без file_id.
+    assert (
+        'file_box_http_request_duration_seconds_count{method="GET",route="/api/v1/file-response/{file_id}",status="200"}'
+        in response.text
+    )
+    assert "file_box_signed_urls_total" in response.text
+    assert "file_box_upload_bytes_total" in response.text
+
+
+class FakeDownloadService:
+    def get_file_location(self, file_id: str, compress_name: str | None = None) -> FileLocationDTO:
+        return FileLocationDTO(path="memory://file", media_type="image/webp", content_hash="abc")
+
+    def get_file_bytes(self, path: str, content_hash: str | None = None) -> bytes:
+        return b"image"
+
+
+def test_download_returns_not_modified_for_matching_etag() -> None:
+    app.dependency_overrides[get_file_box_service] = FakeDownloadService
+    try:
+        client = TestClient(app)
+        response = client.get("/api/v1/download/file_id/preview")
+        not_modified = client.get("/api/v1/download/file_id/preview", headers={"if-none-match": '"abc"'})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.content == b"image"
+    assert response.headers["etag"] == '"abc"'
+    assert not_modified.status_code == 304
+
+
+class FakeUploadService:
+    def upload_chunk(self, upload_id: str, offset: int, data: bytes) -> UploadSessionDTO:
+        if offset != 0:
+            raise UploadOffsetMismatchError(0)
+        return UploadSessionDTO(
+            upload_id=upload_id, file_id="file_id", file_type="image", offset=len(data), total_size=10, status="active"
+        )
+
+
+def test_upload_chunk_reports_offset() -> None:
+    app.dependency_overrides[get_file_box_service] = FakeUploadService
+    try:
+        client = TestClient(app)
+        response = client.put(
+            "/api/v1/uploads/upload_id",
+            content=b"chunk",
+            headers={"upload-offset": "0", "content-type": "application/octet-stream"},
+        )
+        conflict = client.put(
+            "/api/v1/uploads/upload_id",
+            content=b"chunk",
+            headers={"upload-offset": "5", "content-type": "application/octet-stream"},
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.headers["upload-offset"] == "5"
+    assert response.json()["offset"] == 5
+    assert conflict.status_code == 409
+    assert conflict.headers["upload-offset"] == "0"
+
+
+class FakeDeleteService:
+    def delete_files(self, file_ids: list[str]) -> list[str]:
+        return [file_id for file_id in file_ids if file_id != "missing"]
+
+
+def test_delete_file() -> None:
+    app.dependency_overrides[get_file_box_service] = FakeDeleteService
+    try:
+        client = TestClient(app)
+        deleted = client.delete("/api/v1/files/file_id")
+        missing = client.delete("/api/v1/files/missing")
+        bulk = client.post("/api/v1/files/delete", json={"file_ids": ["a", "missing"]})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert deleted.status_code == 204
+    assert missing.status_code == 404
+    assert bulk.json() == {"deleted": ["a"]}
+
+
+def test_upload_with_past_expires_at_is_rejected() -> None:
+    app.dependency_overrides[get_file_box_service] = FakeUploadService
+    expires_at = (datetime.datetime.now(datetime.UTC) - datetime.timedelta(hours=1)).isoformat()
+    try:
+        client = TestClient(app)
+        upload_file = client.post(
+            "/api/v1/upload-file", json={"file_type": "image", "file_bytes": "aW1hZ2U=", "expires_at": expires_at}
+        )
+        create_upload = client.post(
+            "/api/v1/uploads", json={"file_type": "image", "total_size": 10, "expires_at": expires_at}
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert upload_file.status_code == 422
+    assert create_upload.status_code == 422
+    assert "expires_at is in the past" in create_upload.text
@@ -34,6 +34,23 @@ def generate_mock_config() -> FileConfigModel:
                 width=1000,
                 resampling=ResamplingMapEnum.LANCZOS
             ),
+            CompressItemModel(
+                file_type="image",
+                file_format="WEBP",
+                compress_name="image_200_lanczos_webp_on_demand",
+                width=200,
+                resampling=ResamplingMapEnum.LANCZOS,
+                on_demand=True,
+            ),
+            CompressItemModel(
+                file_type="image",
+                file_format="WEBP",
+                compress_name="image_100_lanczos_webp_on_demand_small_only",
+                width=100,
+                resampling=ResamplingMapEnum.LANCZOS,
+                on_demand=True,
+                max_pixels=100 * 100,
+            ),
         ],
         moderation=[]
     )
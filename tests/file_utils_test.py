@@ -0,0 +1,230 @@
+import datetime
+import hashlib
+import io
+from pathlib import Path
+
+import fsspec
+import pandas as pd
+import pytest
+from fsspec.implementations.memory import MemoryFileSystem
+from PIL import Image, UnidentifiedImageError
+
+from file_box.file_utils import (
+    MAX_COMPOSE_SOURCES,
+    AnimationOptions,
+    EncodeOptions,
+    FitModeEnum,
+    ResamplingMapEnum,
+    ResizeOptions,
+    compose_files,
+    get_content_info,
+    get_document_format,
+    get_document_preview_renderer,
+    get_file_content_info,
+    get_image_meta,
+    get_modified_image,
+    get_oriented_image,
+    get_target_size,
+    open_image,
+    parse_label_studio_annotations,
+    parse_video_probe,
+    save_image_to_io_bytes,
+    sign_urls,
+)
+
+
+def generate_image(width: int = 640, height: int = 480) -> Image.Image:
+    return Image.effect_noise((width, height), 40).convert("RGB")
+
+
+def test_encode_options_from_row_skips_nan() -> None:
+    row = pd.Series({"quality": 80.0, "method": float("nan"), "lossless": None, "optimize": True})
+    assert EncodeOptions.from_row(row) == EncodeOptions(quality=80, optimize=True)
+
+
+def test_webp_quality_affects_size() -> None:
+    img = generate_image()
+    low = save_image_to_io_bytes(img, "webp", EncodeOptions(quality=10, method=0))
+    high = save_image_to_io_bytes(img, "webp", EncodeOptions(quality=95, method=0))
+    assert len(low) < len(high)
+
+
+def test_modified_image_has_target_width() -> None:
+    img_bytes = get_modified_image(
+        img=generate_image(),
+        resampling=ResamplingMapEnum.LANCZOS,
+        image_format="JPEG",
+        width=320,
+        encode_options=EncodeOptions(quality=70),
+    )
+    assert Image.open(io.BytesIO(img_bytes)).size == (320, 240)
+
+
+def test_animated_image_keeps_frames_within_limits() -> None:
+    frames = [generate_image(200, 100) for _ in range(6)]
+    with io.BytesIO() as source:
+        frames[0].save(source, format="GIF", save_all=True, append_images=frames[1:], duration=100, loop=0)
+        source_bytes = source.getvalue()
+
+    img_bytes = get_modified_image(
+        img=Image.open(io.BytesIO(source_bytes)),
+        resampling=ResamplingMapEnum.LANCZOS,
+        image_format="WEBP",
+        width=100,
+        animation_options=AnimationOptions(max_duration_ms=350),
+    )
+    result = Image.open(io.BytesIO(img_bytes))
+    assert result.size == (100, 50)
+    assert result.n_frames == 3
+
+    first_frame = get_modified_image(
+        img=Image.open(io.BytesIO(source_bytes)), resampling=ResamplingMapEnum.LANCZOS, image_format="JPEG", width=100
+    )
+    assert getattr(Image.open(io.BytesIO(first_frame)), "n_frames", 1) == 1
+
+
+def test_target_size_resize_options() -> None:
+    assert get_target_size((400, 300), 800) == (800, 600)
+    assert get_target_size((400, 300), 800, ResizeOptions(no_upscale=True)) == (400, 300)
+    assert get_target_size((1600, 1200), 800, ResizeOptions(max_height=300)) == (400, 300)
+    assert get_target_size((1600, 1200), 800, ResizeOptions(max_height=300, fit=FitModeEnum.COVER)) == (800, 300)
+
+
+def test_open_image_streams_from_file(tmp_path: Path) -> None:
+    image_path = tmp_path / "image.jpeg"
+    generate_image().save(image_path, format="JPEG")
+    with open_image(str(image_path), "file") as img:
+        assert img.size == (640, 480)
+        img_bytes = get_modified_image(img=img, resampling=ResamplingMapEnum.LANCZOS, image_format="WEBP", width=0)
+    assert Image.open(io.BytesIO(img_bytes)).size == (640, 480)
+
+
+
+def test_open_image_empty_file_is_unidentified(tmp_path: Path) -> None:
+    image_path = tmp_path / "empty.jpeg"
+    image_path.write_bytes(b"")
+    with pytest.raises(UnidentifiedImageError):
+        with open_image(str(image_path), "file"):
+            pass
+
+
+def test_sign_urls_keeps_order(tmp_path: Path, monkeypatch) -> None:
+    from fsspec.implementations.local import LocalFileSystem
+
+    monkeypatch.setattr(LocalFileSystem, "sign", lambda self, path, expiration: f"signed://{path}", raising=False)
+    urls = [f"{tmp_path}/file_{i}" for i in range(10)]
+    assert sign_urls(urls, "file") == [f"signed://{url}" for url in urls]
+
+
+def test_content_info_reads_image_header() -> None:
+    data = save_image_to_io_bytes(generate_image(320, 200), "png")
+    info = get_content_info(data)
+    assert (info.size, info.width, info.height, info.image_format) == (len(data), 320, 200, "PNG")
+    assert info.content_hash == get_content_info(data).content_hash
+
+
+def test_image_meta_applies_exif_orientation() -> None:
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    data = io.BytesIO()
+    generate_image(640, 480).save(data, "JPEG", exif=exif)
+
+    with Image.open(data) as img:
+        image_meta = get_image_meta(img)
+        assert (image_meta.width, image_meta.height, image_meta.orientation) == (480, 640, 6)
+        assert get_oriented_image(img).size == (480, 640)
+
+
+def test_pdf_preview_renders_first_page_at_width() -> None:
+    with io.BytesIO() as source:
+        generate_image(600, 800).save(source, format="PDF", save_all=True, append_images=[generate_image(800, 600)])
+        pdf_bytes = source.getvalue()
+
+    document_format = get_document_format(pdf_bytes[:16])
+    assert document_format == "PDF"
+    renderer = get_document_preview_renderer(document_format)
+    assert renderer is not None
+    assert renderer(pdf_bytes, 300).size == (300, 400)
+    assert get_document_format(b"\x89PNG\r\n") is None
+
+
+def test_parse_video_probe_applies_rotation() -> None:
+    probe = {
+        "format": {"format_name": "mov,mp4,m4a,3gp,3g2,mj2", "duration": "4.000000"},
+        "streams": [
+            {"codec_type": "audio", "codec_name": "aac"},
+            {
+                "codec_type": "video",
+                "codec_name": "h264",
+                "width": 1920,
+                "height": 1080,
+                "avg_frame_rate": "30000/1001",
+                "side_data_list": [{"side_data_type": "Display Matrix", "rotation": -90}],
+            },
+        ],
+    }
+    video_meta = parse_video_probe(probe)
+    assert video_meta is not None
+    assert (video_meta.width, video_meta.height) == (1080, 1920)
+    assert video_meta.duration == 4.0
+    assert round(video_meta.frame_rate or 0, 2) == 29.97
+    assert parse_video_probe({"format": {"format_name": "webp_pipe"}, "streams": probe["streams"]}) is None
+
+
+
+def test_compose_files_streams_parts(tmp_path: Path) -> None:
+    file_system = fsspec.filesystem("file")
+    parts = []
+    for i in range(3):
+        (tmp_path / f"part-{i}").write_bytes(bytes([i]) * 10)
+        parts.append(str(tmp_path / f"part-{i}"))
+
+    compose_files(file_system, str(tmp_path / "data"), parts, chunk_size=4)
+
+    assert (tmp_path / "data").read_bytes() == b"\x00" * 10 + b"\x01" * 10 + b"\x02" * 10
+    info = get_file_content_info(str(tmp_path / "data"), "file", chunk_size=4)
+    assert info == get_content_info((tmp_path / "data").read_bytes())
+
+
+class MergeFileSystem(MemoryFileSystem):
+    protocol = "merge-memory"
+    merge_sizes: list[int] = []
+
+    def merge(self, path: str, paths: list[str], **kwargs) -> None:
+        assert len(paths) <= MAX_COMPOSE_SOURCES
+        self.merge_sizes.append(len(paths))
+        self.pipe_file(path, b"".join(self.cat_file(p) for p in paths))
+
+
+def test_compose_files_merges_in_rounds() -> None:
+    file_system = MergeFileSystem()
+    parts = [f"/upload/part-{i:06d}" for i in range(MAX_COMPOSE_SOURCES * 2 + 1)]
+    for i, part in enumerate(parts):
+        file_system.pipe_file(part, str(i).encode())
+
+    compose_files(file_system, "/upload/data", parts)
+
+    assert file_system.cat_file("/upload/data") == "".join(map(str, range(len(parts)))).encode()
+    assert MergeFileSystem.merge_sizes == [MAX_COMPOSE_SOURCES, MAX_COMPOSE_SOURCES, 1, 3]
+    # Промежуточные объекты раундов удалены.
+    assert not [path for path in file_system.find("/upload") if ".compose-" in path]
+
+
+def test_parse_label_studio_annotations_uses_annotation_time() -> None:
+    annotations = [
+        {
+            "result": [{"from_name": "moderation", "value": {"choices": ["APPROVE"]}}],
+            "created_at": "2026-10-01T10:00:00Z",
+            "updated_at": "2026-10-01T12:30:00.500000+03:00",
+        },
+        {"result": [{"from_name": "tags", "value": {"choices": ["cat"]}}], "created_at": "2026-10-01T08:00:00Z"},
+    ]
+
+    delete_flag, moderation_entries, reviewed_at = parse_label_studio_annotations(annotations)
+
+    assert not delete_flag
+    assert moderation_entries == [
+        {"choice_name": "moderation", "choices": ["APPROVE"]},
+        {"choice_name": "tags", "choices": ["cat"]},
+    ]
+    assert reviewed_at == datetime.datetime(2026, 10, 1, 9, 30, 0, 500000)
@@ -0,0 +1,106 @@
+import datetime
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from file_box.label_studio_sync import (
+    LabelStudioClient,
+    get_task_position,
+    iter_task_batches,
+    parse_label_studio_datetime,
+)
+
+
+class FakeLabelStudioHandler(BaseHTTPRequestHandler):
+    """
+    Локальная замена GET /api/tasks: фильтр updated_at >= value, сортировка по (updated_at, id),
+    404 на страницу за последней.
+    """
+
+    tasks: list[dict] = []
+    requests: list[dict] = []
+
+    def do_GET(self) -> None:
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        FakeLabelStudioHandler.requests.append(params)
+        assert self.headers["Authorization"] == "Token key"
+        items = json.loads(params["query"])["filters"]["items"]
+        tasks = sorted(
+            (
+                task
+                for task in self.tasks
+                if all(get_task_position(task)[0] >= parse_label_studio_datetime(item["value"]) for item in items)
+            ),
+            key=get_task_position,
+        )
+        page, page_size = int(params["page"]), int(params["page_size"])
+        page_tasks = tasks[(page - 1) * page_size : page * page_size]
+        if page > 1 and not page_tasks:
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = json.dumps({"tasks": page_tasks, "total": len(tasks)}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def label_studio_url() -> Iterator[str]:
+    FakeLabelStudioHandler.tasks = []
+    FakeLabelStudioHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeLabelStudioHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def make_task(task_id: int, updated_at: str) -> dict:
+    return {"id": task_id, "updated_at": updated_at, "data": {"file_id": str(task_id), "file_type": "image"}}
+
+
+def test_iter_task_batches_resumes_from_watermark(label_studio_url: str) -> None:
+    # Три задачи с одинаковым updated_at не помещаются в одну страницу.
+    FakeLabelStudioHandler.tasks = [
+        make_task(1, "2026-10-01T10:00:00.000000Z"),
+        make_task(3, "2026-10-01T11:00:00.000000Z"),
+        make_task(2, "2026-10-01T11:00:00.000000Z"),
+        make_task(4, "2026-10-01T11:00:00.000000Z"),
+        make_task(5, "2026-10-01T12:00:00.000000Z"),
+    ]
+    client = LabelStudioClient(label_studio_url, api_key="key")
+
+    batches = list(iter_task_batches(client, project_id=7, watermark=None, batch_size=2))
+
+    assert [[task["id"] for task in tasks] for tasks, _ in batches] == [[1, 2], [3], [4, 5]]
+    assert batches[-1][1] == (datetime.datetime(2026, 10, 1, 12), 5)
+    assert {request["project"] for request in FakeLabelStudioHandler.requests} == {"7"}
+
+    # Следующий запуск берет только задачи, обновленные после watermark.
+    FakeLabelStudioHandler.tasks.append(make_task(2, "2026-10-02T09:00:00.000000Z"))
+    FakeLabelStudioHandler.tasks.append(make_task(6, "2026-10-01T12:00:00.000000Z"))
+
+    batches = list(iter_task_batches(client, project_id=7, watermark=batches[-1][1], batch_size=2))
+
+    assert [[task["id"] for task in tasks] for tasks, _ in batches] == [[6], [2]]
+
+
+def test_iter_task_batches_pages_through_processed_ties(label_studio_url: str) -> None:
+    FakeLabelStudioHandler.tasks = [make_task(task_id, "2026-10-01T10:00:00Z") for task_id in range(1, 6)]
+    client = LabelStudioClient(label_studio_url, api_key="key")
+    watermark = get_task_position(FakeLabelStudioHandler.tasks[3])
+
+    batches = list(iter_task_batches(client, project_id=7, watermark=watermark, batch_size=2))
+
+    assert [[task["id"] for task in tasks] for tasks, _ in batches] == [[5]]
+    assert [request["page"] for request in FakeLabelStudioHandler.requests] == ["1", "2", "3"]
@@ -0,0 +1,59 @@
+import hashlib
+from pathlib import Path
+
+import fsspec
+
+from file_box.local_cache import LocalFileCache
+
+
+def test_local_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    cache = LocalFileCache(str(tmp_path / "cache"), max_bytes=10)
+    cache.put("gs://bucket/a", b"aaaa")
+    cache.put("gs://bucket/b", b"bbbb")
+    # Обращение к a делает его недавно использованным, вытесняется b.
+    assert cache.get("gs://bucket/a") is not None
+    cache.put("gs://bucket/c", b"cccc")
+
+    assert cache.get("gs://bucket/b") is None
+    assert Path(cache.get("gs://bucket/a") or "").read_bytes() == b"aaaa"
+    assert Path(cache.get("gs://bucket/c") or "").read_bytes() == b"cccc"
+
+    # После перезапуска порядок восстанавливается по времени обращения.
+    reloaded = LocalFileCache(str(tmp_path / "cache"), max_bytes=10)
+    reloaded.put("gs://bucket/d", b"dddd")
+    assert reloaded.get("gs://bucket/a") is None
+    assert reloaded.get("gs://bucket/c") is not None
+
+
+def test_local_cache_fetch_checks_version(tmp_path: Path) -> None:
+    file_system = fsspec.filesystem("memory")
+    file_system.pipe_file("/bucket/raw.bytes", b"v1")
+    cache = LocalFileCache(str(tmp_path / "cache"), max_bytes=1024)
+
+    cached_path = cache.fetch("memory://bucket/raw.bytes", file_system)
+    assert Path(cached_path).read_bytes() == b"v1"
+    assert cache.fetch("memory://bucket/raw.bytes", file_system) == cached_path
+
+    # Объект перезаписан другим экземпляром: копия с другим хэшем не подходит.
+    assert cache.get("memory://bucket/raw.bytes", content_hash="other") is None
+    cache.put("memory://bucket/raw.bytes", b"v2")
+    assert not Path(cached_path).exists()
+    cache.discard("memory://bucket/raw.bytes")
+    assert cache.get("memory://bucket/raw.bytes") is None
+
+
+def test_local_cache_fetch_refreshes_stale_version(tmp_path: Path) -> None:
+    file_system = fsspec.filesystem("memory")
+    file_system.pipe_file("/bucket/stale.bytes", b"v1")
+    cache = LocalFileCache(str(tmp_path / "cache"), max_bytes=1024)
+    stale_path = cache.fetch("memory://bucket/stale.bytes", file_system)
+
+    # Другой экземпляр перезаписал объект, в БД уже хэш новой версии: копия по тому же пути не подходит.
+    file_system.pipe_file("/bucket/stale.bytes", b"v2")
+    assert cache.fetch("memory://bucket/stale.bytes", file_system) == stale_path
+    v2_hash = hashlib.sha256(b"v2").hexdigest()
+    fresh_path = cache.fetch("memory://bucket/stale.bytes", file_system, content_hash=v2_hash)
+
+    assert Path(fresh_path).read_bytes() == b"v2"
+    assert not Path(stale_path).exists()
+    assert cache.get("memory://bucket/stale.bytes", v2_hash) == fresh_path
@@ -0,0 +1,35 @@
+import threading
+import time
+
+from file_box.locks import SingleFlight
+
+
+def test_single_flight_runs_one_caller_per_key() -> None:
+    flight = SingleFlight()
+    results: list[str] = []
+    active = 0
+    max_active = 0
+    counter_lock = threading.Lock()
+
+    def render() -> None:
+        nonlocal active, max_active
+        with flight.lock(("file_id", "compress_name")):
+            with counter_lock:
+                active += 1
+                max_active = max(max_active, active)
+            # Повторная проверка результата внутри лока, как в рендере on demand.
+            if not results:
+                time.sleep(0.01)
+                results.append("rendered")
+            with counter_lock:
+                active -= 1
+
+    threads = [threading.Thread(target=render) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["rendered"]
+    assert max_active == 1
+    assert not flight._locks
@@ -0,0 +1,83 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+import pytest
+
+from file_box.moderation import TokenBucket, VisionModerationClient
+
+
+class FakeVisionHandler(BaseHTTPRequestHandler):
+    """
+    Локальная замена images:annotate: первый запрос с изображением "/0.webp" отвечает 503,
+    изображения с "broken" в uri - ошибкой.
+    """
+
+    requests: list[dict] = []
+    failed = False
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        FakeVisionHandler.requests.append(body)
+        uris = [request["image"]["source"]["imageUri"] for request in body["requests"]]
+        if not FakeVisionHandler.failed and any("/0.webp?" in uri for uri in uris):
+            FakeVisionHandler.failed = True
+            self.send_response(503)
+            self.end_headers()
+            return
+        responses = []
+        for request in body["requests"]:
+            uri = request["image"]["source"]["imageUri"]
+            if "broken" in uri:
+                responses.append({"error": {"code": 3, "message": "Bad image data."}})
+            else:
+                responses.append({"safeSearchAnnotation": {"adult": "VERY_UNLIKELY", "racy": uri}})
+        data = json.dumps({"responses": responses}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def vision_endpoint() -> Iterator[str]:
+    FakeVisionHandler.requests = []
+    FakeVisionHandler.failed = False
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeVisionHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1/images:annotate"
+    server.shutdown()
+
+
+def test_vision_client_batches_and_retries(vision_endpoint: str) -> None:
+    client = VisionModerationClient(
+        endpoint=vision_endpoint,
+        api_key="key",
+        batch_size=10,
+        concurrency=3,
+        images_per_second=1000,
+        retry_backoff_seconds=0.01,
+    )
+    uris = [f"https://storage.example.com/{name}.webp?X-Goog-Signature=abc" for name in [*range(24), "broken"]]
+
+    results = client.classify(uris)
+
+    assert [result["racy"] if result else None for result in results] == [*uris[:-1], None]
+    # 3 пачки и один повтор первой пачки после 503.
+    assert sorted(len(request["requests"]) for request in FakeVisionHandler.requests) == [5, 10, 10, 10]
+
+
+def test_token_bucket_limits_rate() -> None:
+    bucket = TokenBucket(rate=50, capacity=5)
+    start = time.monotonic()
+    for _ in range(10):
+        bucket.acquire()
+    # Первые 5 токенов - всплеск, остальные 5 выдаются со скоростью 50 в секунду.
+    assert time.monotonic() - start >= 0.09
@@ -0,0 +1,82 @@
+import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import pandas as pd
+import sqlalchemy as sa
+from datapipe.datatable import DataStore
+from datapipe.store.database import DBConn, TableStoreDB
+from datapipe.store.filedir import BytesFile
+
+from file_box.purge import purge_files
+from file_box.stores import ConcurrentTableStoreFiledir
+
+
+def test_purge_files_removes_objects_and_rows(tmp_path: Path) -> None:
+    dbconn = DBConn(f"sqlite:///{tmp_path}/meta.sqlite")
+    ds = DataStore(dbconn, create_meta_table=True)
+    file_data = ds.create_table(
+        "file_box_file_data",
+        TableStoreDB(
+            dbconn,
+            "file_box_file_data",
+            [sa.Column("file_id", sa.String, primary_key=True), sa.Column("file_type", sa.String, primary_key=True)],
+            create_table=True,
+        ),
+    )
+    compressed = ds.create_table(
+        "compressed",
+        ConcurrentTableStoreFiledir(
+            f"{tmp_path}/files/{{file_type}}/{{file_id}}/{{compress_name}}/image.webp",
+            table_name="compressed",
+            adapter=BytesFile(bytes_columns="file_bytes"),
+            enable_rm=True,
+            read_data=False,
+        ),
+    )
+    file_data.store_chunk(pd.DataFrame({"file_id": ["a", "b"], "file_type": "image"}))
+    compressed.store_chunk(
+        pd.DataFrame(
+            {
+                "file_id": ["a", "a", "b"],
+                "file_type": "image",
+                "compress_name": ["small", "large", "small"],
+                "file_bytes": b"data",
+            }
+        )
+    )
+
+    purge_files(SimpleNamespace(ds=ds, steps=[]), pd.DataFrame({"file_id": ["a"], "file_type": ["image"]}))
+
+    assert not list(tmp_path.glob("files/image/a/*/image.webp"))
+    assert (tmp_path / "files/image/b/small/image.webp").exists()
+    assert compressed.meta_table.get_metadata()["file_id"].tolist() == ["b"]
+    assert file_data.get_data()["file_id"].tolist() == ["b"]
+    assert file_data.meta_table.get_metadata()["file_id"].tolist() == ["b"]
+
+
+def test_purge_files_keeps_restored_file_data(tmp_path: Path) -> None:
+    dbconn = DBConn(f"sqlite:///{tmp_path}/meta.sqlite")
+    ds = DataStore(dbconn, create_meta_table=True)
+    file_data = ds.create_table(
+        "file_box_file_data",
+        TableStoreDB(
+            dbconn,
+            "file_box_file_data",
+            [
+                sa.Column("file_id", sa.String, primary_key=True),
+                sa.Column("file_type", sa.String, primary_key=True),
+                sa.Column("deleted_at", sa.DateTime),
+            ],
+            create_table=True,
+        ),
+    )
+    file_data.store_chunk(
+        pd.DataFrame({"file_id": ["a", "b"], "file_type": "image", "deleted_at": [datetime.datetime(2026, 1, 1), None]})
+    )
+
+    # Файл b восстановили повторной загрузкой после того, как purger взял его в батч.
+    purge_files(SimpleNamespace(ds=ds, steps=[]), pd.DataFrame({"file_id": ["a", "b"], "file_type": "image"}))
+
+    assert file_data.get_data()["file_id"].tolist() == ["b"]
+    assert file_data.meta_table.get_metadata()["file_id"].tolist() == ["b"]
@@ -1,5 +1,27 @@
+import datetime
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import fsspec
+import sqlalchemy as sa
 from loguru import logger
-from file_box.service import FileBoxServiceProtocol, ItemDTO, get_file_by_id
+
+from file_box import tables
+from file_box.catalog import UPLOAD_SESSION_PATTERN
+from file_box.db_utils import get_sessionmaker
+from file_box.purge import mark_expired_files_deleted, purge_expired_upload_sessions
+from file_box.service import (
+    FileBoxServiceProtocol,
+    ItemDTO,
+    UploadSessionCreateDTO,
+    get_file_by_id,
+    get_file_location,
+    read_file_config,
+    read_url_policies,
+)
 
 
 def test_upload_image_webp(get_file_service: FileBoxServiceProtocol) -> None:
@@ -97,9 +119,126 @@ def test_file_have_meta_data(get_file_service: FileBoxServiceProtocol) -> None:
     )
     file_response = file_service.upload_file(item)
     assert file_response.meta_data == {"test": "test"}
-    
-    
-    
 
 
-    
\ No newline at end of file
+def test_get_compressed_file_location(get_file_service: FileBoxServiceProtocol) -> None:
+    file_service = get_file_service
+    file = open("./local/test.jpeg", "rb").read()
+    item = ItemDTO(
+        file_type="image",
+        file_bytes=file,
+    )
+    file_response = file_service.upload_file(item)
+    location = file_service.get_file_location(file_response.file_id, "image_327_lanczos_webp")
+    assert location is not None
+    assert location.media_type == "image/webp"
+    assert file_service.get_file_bytes(location.path)
+
+
+def test_on_demand_variant_rendered_on_first_request(get_file_service: FileBoxServiceProtocol) -> None:
+    file_service = get_file_service
+    file = open("./local/test.jpeg", "rb").read()
+    item = ItemDTO(
+        file_type="image",
+        file_bytes=file,
+    )
+    file_response = file_service.upload_file(item)
+    assert file_response.compress_info is not None
+    assert "image_200_lanczos_webp_on_demand" not in file_response.compress_info
+    location = file_service.get_file_location(file_response.file_id, "image_200_lanczos_webp_on_demand")
+    assert location is not None
+    file_from_db = file_service.get_file_response(file_response.file_id)
+    assert file_from_db is not None and file_from_db.compress_info is not None
+    assert "image_200_lanczos_webp_on_demand" in file_from_db.compress_info
+
+
+
+def test_on_demand_variant_respects_pixel_limit(get_file_service: FileBoxServiceProtocol) -> None:
+    file_service = get_file_service
+    file = open("./local/test.jpeg", "rb").read()
+    item = ItemDTO(
+        file_type="image",
+        file_bytes=file,
+    )
+    file_response = file_service.upload_file(item)
+    assert file_service.get_file_location(file_response.file_id, "image_100_lanczos_webp_on_demand_small_only") is None
+
+
+def test_read_file_config_reloads_on_change(tmp_path: Path) -> None:
+    config_path = tmp_path / "file_config.json"
+    config_path.write_text(json.dumps({"compress": [], "moderation": []}))
+    config = read_file_config(str(config_path))
+    assert read_file_config(str(config_path)) is config
+
+    assert read_url_policies(str(config_path)) == []
+
+    url_policy = [{"file_type": "image", "policy": "signed", "expiration_days": 1}]
+    config_path.write_text(json.dumps({"compress": [], "moderation": [], "url_policy": url_policy}))
+    os.utime(config_path, ns=(time.time_ns(), time.time_ns() + 1))
+    assert read_file_config(str(config_path)) is not config
+    policies = read_url_policies(str(config_path))
+    assert [policy.expiration_days for policy in policies] == [1]
+    assert read_url_policies(str(config_path)) is policies
+
+
+def test_expired_file_is_hidden_and_marked_deleted(get_file_service: FileBoxServiceProtocol) -> None:
+    file_service = get_file_service
+    file = open("./local/test.jpeg", "rb").read()
+    item = ItemDTO(
+        file_type="image",
+        file_bytes=file,
+        expires_at=datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=2),
+    )
+    file_response = file_service.upload_file(item)
+    assert file_response.expires_at is not None
+    time.sleep(3)
+    assert get_file_by_id(file_response.file_id) is None
+    assert mark_expired_files_deleted() >= 1
+
+
+def test_upload_session_hashes_composed_file_and_finalizes(get_file_service: FileBoxServiceProtocol) -> None:
+    file_service = get_file_service
+    file = open("./local/test.jpeg", "rb").read()
+    upload = file_service.create_upload_session(UploadSessionCreateDTO(file_type="image", total_size=len(file)))
+    middle = len(file) // 2
+    file_service.upload_chunk(upload.upload_id, 0, file[:middle])
+    file_service.upload_chunk(upload.upload_id, middle, file[middle:])
+
+    file_response = file_service.finalize_upload(upload.upload_id)
+
+    location = get_file_location(file_response.file_id)
+    assert location is not None and location.content_hash == hashlib.sha256(file).hexdigest()
+    # Повторная финализация отдает тот же файл.
+    assert file_service.finalize_upload(upload.upload_id).file_id == file_response.file_id
+    session_status = file_service.get_upload_session(upload.upload_id)
+    assert session_status is not None and session_status.status == tables.UploadSessionStatusEnum.FINALIZED
+
+
+def test_abandoned_upload_session_is_purged(get_file_service: FileBoxServiceProtocol) -> None:
+    file_service = get_file_service
+    upload = file_service.create_upload_session(UploadSessionCreateDTO(file_type="image", total_size=10))
+    file_service.upload_chunk(upload.upload_id, 0, b"12345")
+    with get_sessionmaker().begin() as session:
+        session.execute(
+            sa.update(tables.UploadSession)
+            .where(tables.UploadSession.upload_id == upload.upload_id)
+            .values(updated_at=datetime.datetime(2000, 1, 1))
+        )
+
+    assert purge_expired_upload_sessions(fsspec.filesystem("file"), UPLOAD_SESSION_PATTERN, expire_seconds=3600) >= 1
+    assert file_service.get_upload_session(upload.upload_id) is None
+    assert not os.path.exists(UPLOAD_SESSION_PATTERN.format(upload_id=upload.upload_id))
+
+
+def test_upload_session_applies_expires_at(get_file_service: FileBoxServiceProtocol) -> None:
+    file_service = get_file_service
+    file = open("./local/test.jpeg", "rb").read()
+    expires_at = datetime.datetime.now(datetime.UTC) + datetime.timedelta(days=1)
+    upload = file_service.create_upload_session(
+        UploadSessionCreateDTO(file_type="image", total_size=len(file), expires_at=expires_at)
+    )
+    file_service.upload_chunk(upload.upload_id, 0, file)
+
+    file_response = file_service.finalize_upload(upload.upload_id)
+
+    assert file_response.expires_at == expires_at.replace(tzinfo=None)
@@ -0,0 +1,235 @@
+import io
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from PIL import Image
+from pydantic import ValidationError
+
+from file_box import steps
+from file_box.catalog import IMAGE_PATTERN_COMPRESSED
+from file_box.configs.model import CompressItemModel, FileConfigModel
+from file_box.file_utils import ImageMetaInfo
+from file_box.steps import (
+    _split_presets,
+    file_box_document_preview,
+    file_box_image_filter_for_moderation,
+    file_box_video_extract_poster,
+)
+
+
+def write_config(tmp_path: Path, compress: list[dict]) -> str:
+    config_path = tmp_path / "file_config.json"
+    config_path.write_text(json.dumps({"compress": compress, "moderation": []}))
+    return str(config_path)
+
+
+def test_filter_for_moderation_signs_urls_with_configured_expiry(tmp_path: Path, monkeypatch) -> None:
+    sign_calls = []
+
+    def fake_sign_urls(urls: list[str], **kwargs) -> list[str]:
+        sign_calls.append(kwargs)
+        return [f"https://signed/{url}" if "unsigned" not in url else "" for url in urls]
+
+    monkeypatch.setattr(steps, "sign_urls", fake_sign_urls)
+    config_path = write_config(
+        tmp_path, [{"file_type": "image", "file_format": "WEBP", "compress_name": "full", "width": 0}]
+    )
+
+    result = file_box_image_filter_for_moderation(
+        pd.DataFrame({"file_type": ["image"], "source_compress_name": [None], "ls_data": [{}]}),
+        pd.DataFrame(
+            {
+                "file_id": ["a", "b"],
+                "file_type": "image",
+                "compress_name": "full",
+                "path": ["gs://bucket/a.webp", "gs://bucket/unsigned.webp"],
+                "content_hash": ["ha", "hb"],
+            }
+        ),
+        pd.DataFrame(columns=["file_id", "file_type"]),
+        config_path=config_path,
+        file_system_name="gcs",
+        days_expiration=3,
+    )
+
+    assert result["file_url"].tolist() == ["https://signed/gs://bucket/a.webp"]
+    assert sign_calls == [{"file_system_name": "gcs", "file_system_creds_path": None, "days_expiration": 3}]
+
+
+LS_DATA = {"default_metadata": {}, "moderation_choices": {}, "tags_choices": {}, "pick_of_the_week_choices": {}}
+
+
+@pytest.mark.parametrize(
+    "source_compress_name, error",
+    [
+        ("missing", "Unknown moderation source preset missing for image"),
+        ("lazy", "Moderation source preset lazy must not be on_demand"),
+    ],
+)
+def test_moderation_source_must_be_eager_preset(source_compress_name: str, error: str) -> None:
+    compress = [
+        {"file_type": "image", "file_format": "WEBP", "compress_name": "small", "width": 320},
+        {"file_type": "image", "file_format": "WEBP", "compress_name": "lazy", "width": 640, "on_demand": True},
+    ]
+
+    FileConfigModel(
+        compress=compress,
+        moderation=[{"file_type": "image", "ls_data": LS_DATA, "source_compress_name": "small"}],
+    )
+    with pytest.raises(ValidationError, match=error):
+        FileConfigModel(
+            compress=compress,
+            moderation=[{"file_type": "image", "ls_data": LS_DATA, "source_compress_name": source_compress_name}],
+        )
+
+
+def test_filter_for_moderation_picks_source_preset_or_full_size(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr(steps, "sign_urls", lambda urls, **kwargs: [f"https://signed/{url}" for url in urls])
+    config_path = write_config(
+        tmp_path,
+        [
+            {"file_type": file_type, "file_format": "WEBP", "compress_name": compress_name, "width": width}
+            for file_type in ["image", "avatar"]
+            for compress_name, width in [("full", 0), ("small", 320)]
+        ],
+    )
+
+    result = file_box_image_filter_for_moderation(
+        pd.DataFrame({"file_type": ["image", "avatar"], "source_compress_name": ["small", None], "ls_data": [{}, {}]}),
+        pd.DataFrame(
+            {
+                "file_id": ["a", "a", "b", "b"],
+                "file_type": ["image", "image", "avatar", "avatar"],
+                "compress_name": ["full", "small", "full", "small"],
+                "path": ["a/full.webp", "a/small.webp", "b/full.webp", "b/small.webp"],
+                "content_hash": ["h1", "h2", "h3", "h4"],
+            }
+        ),
+        pd.DataFrame(columns=["file_id", "file_type"]),
+        config_path=config_path,
+        file_system_name="file",
+        days_expiration=1,
+    )
+
+    # Для image модерируется заданный пресет, для avatar без source_compress_name - полноразмерный вариант.
+    assert result[["file_type", "file_gs_url"]].values.tolist() == [
+        ["image", "a/small.webp"],
+        ["avatar", "b/full.webp"],
+    ]
+
+
+def test_presets_reencode_unless_passthrough_enabled() -> None:
+    image_meta = ImageMetaInfo(width=640, height=480, image_format="WEBP", orientation=1, mode="RGB", frame_count=1)
+    presets_df = pd.DataFrame(
+        {
+            "file_type": "image",
+            "file_format": "WEBP",
+            "compress_name": ["legacy_full", "explicit_off", "opt_in"],
+            "width": 0,
+            "passthrough_if_same_format_and_size": [None, False, True],
+        }
+    )
+
+    passthrough_rows, encode_rows = _split_presets("raw.bytes", presets_df, image_meta)
+
+    # Пресеты без настройки (как в существующих конфигах) по-прежнему перекодируются.
+    assert [row["compress_name"] for row in encode_rows] == ["legacy_full", "explicit_off"]
+    assert [row["compress_name"] for row in passthrough_rows] == ["opt_in"]
+    preset = CompressItemModel(file_type="image", file_format="WEBP", compress_name="full", width=0)
+    assert not preset.passthrough_if_same_format_and_size
+
+
+def test_document_preview_renders_pdfs_and_skips_others(tmp_path: Path) -> None:
+    pdf_path = tmp_path / "doc.bytes"
+    Image.new("RGB", (600, 800), "white").save(pdf_path, format="PDF")
+    png_path = tmp_path / "image.bytes"
+    Image.new("RGB", (60, 80), "white").save(png_path, format="PNG")
+    broken_pdf_path = tmp_path / "broken.bytes"
+    broken_pdf_path.write_bytes(b"%PDF-1.4\n" + b"\x00" * 64)
+
+    previews_df, compress_data_df = file_box_document_preview(
+        pd.DataFrame(
+            {
+                "file_type": "document",
+                "file_format": ["WEBP", "PNG"],
+                "compress_name": ["preview_300_webp", "preview_png"],
+                "width": [300, 0],
+            }
+        ),
+        pd.DataFrame(
+            {
+                "file_id": ["doc", "image", "broken"],
+                "file_type": "document",
+                "filepath": [str(pdf_path), str(png_path), str(broken_pdf_path)],
+            }
+        ),
+        pd.DataFrame(columns=["file_id", "file_type", "content_hash"]),
+        file_system_name="file",
+    )
+
+    assert previews_df[["file_id", "compress_name"]].values.tolist() == [
+        ["doc", "preview_300_webp"],
+        ["doc", "preview_png"],
+    ]
+    with Image.open(io.BytesIO(previews_df["file_bytes"].iloc[0])) as preview:
+        assert (preview.format, preview.size) == ("WEBP", (300, 400))
+    assert compress_data_df[["width", "height"]].values.tolist() == [[300, 400], [600, 800]]
+    assert compress_data_df["path"].tolist() == [
+        IMAGE_PATTERN_COMPRESSED.format(
+            file_type="document", file_id="doc", compress_name=compress_name, file_format=file_format
+        )
+        for compress_name, file_format in [("preview_300_webp", "WEBP"), ("preview_png", "PNG")]
+    ]
+    assert compress_data_df["content_hash"].tolist() == previews_df["content_hash"].tolist()
+
+
+def write_script(path: Path, body: str) -> str:
+    path.write_text(f"#!/bin/sh\n{body}\n")
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_video_poster_skips_slow_and_missing_tools(tmp_path: Path) -> None:
+    probe = {
+        "format": {"format_name": "mov,mp4,m4a,3gp,3g2,mj2", "duration": "4.0"},
+        "streams": [{"codec_type": "video", "codec_name": "h264", "width": 640, "height": 360}],
+    }
+    (tmp_path / "probe.json").write_text(json.dumps(probe))
+    # ffprobe зависает на slow.bytes и отвечает метаданными на остальные файлы.
+    ffprobe_path = write_script(
+        tmp_path / "ffprobe", f'case "$*" in *slow.bytes*) sleep 5;; *) cat {tmp_path / "probe.json"};; esac'
+    )
+    video_config = pd.DataFrame({"file_type": ["video"], "poster_seek_seconds": [1.0]})
+    file_data_df = pd.DataFrame(columns=["file_id", "file_type", "content_hash"])
+    video_raw_df = pd.DataFrame(
+        {
+            "file_id": ["slow", "ok"],
+            "file_type": "video",
+            "filepath": [str(tmp_path / "slow.bytes"), str(tmp_path / "ok.bytes")],
+        }
+    )
+
+    posters_df, meta_df = file_box_video_extract_poster(
+        video_config,
+        video_raw_df,
+        file_data_df,
+        file_system_name="file",
+        ffmpeg_path=str(tmp_path / "missing-ffmpeg"),
+        ffprobe_path=ffprobe_path,
+        timeout=0.5,
+    )
+
+    # Зависший файл пропущен, у остальных сохранены метаданные без постера (ffmpeg не найден).
+    assert posters_df.empty
+    assert meta_df[["file_id", "width", "poster_position"]].values.tolist() == [["ok", 640, None]]
+
+    posters_df, meta_df = file_box_video_extract_poster(
+        video_config,
+        video_raw_df,
+        file_data_df,
+        file_system_name="file",
+        ffprobe_path=str(tmp_path / "missing-ffprobe"),
+    )
+    assert posters_df.empty and meta_df.empty
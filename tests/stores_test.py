@@ -0,0 +1,159 @@
+from pathlib import Path
+
+import pandas as pd
+import sqlalchemy as sa
+from datapipe.datatable import DataStore
+from datapipe.store.database import DBConn, TableStoreDB
+from datapipe.store.filedir import BytesFile
+
+from file_box.stores import ConcurrentTableStoreFiledir, store_record
+
+
+def make_store(tmp_path: Path, **kwargs) -> ConcurrentTableStoreFiledir:
+    return ConcurrentTableStoreFiledir(
+        f"{tmp_path}/files/{{file_id}}/{{compress_name}}/image.{{file_format}}",
+        table_name="test_store",
+        adapter=BytesFile(bytes_columns="file_bytes"),
+        add_filepath_column=True,
+        enable_rm=True,
+        read_data=False,
+        **kwargs,
+    )
+
+
+def test_concurrent_store_writes_all_objects(tmp_path: Path) -> None:
+    store = make_store(tmp_path, max_workers=4, max_in_flight_bytes=10)
+    df = pd.DataFrame(
+        {
+            "file_id": [f"file_{i}" for i in range(20)],
+            "compress_name": "preview",
+            "file_format": "webp",
+            "file_bytes": [f"bytes_{i}".encode() for i in range(20)],
+        }
+    )
+    store.insert_rows(df)
+
+    for i in range(20):
+        assert (tmp_path / f"files/file_{i}/preview/image.webp").read_bytes() == f"bytes_{i}".encode()
+
+
+def test_concurrent_store_retries_failed_write(tmp_path: Path, monkeypatch) -> None:
+    store = make_store(tmp_path, retries=2, retry_backoff_seconds=0)
+    pipe_file = store.filesystem.pipe_file
+    calls: list[str] = []
+
+    def flaky_pipe_file(path: str, value: bytes) -> None:
+        calls.append(path)
+        if len(calls) == 1:
+            raise ConnectionError("temporary failure")
+        pipe_file(path, value)
+
+    monkeypatch.setattr(store.filesystem, "pipe_file", flaky_pipe_file)
+    store.insert_rows(
+        pd.DataFrame({"file_id": ["a"], "compress_name": ["preview"], "file_format": ["webp"], "file_bytes": [b"data"]})
+    )
+
+    assert len(calls) == 2
+    assert (tmp_path / "files/a/preview/image.webp").read_bytes() == b"data"
+
+
+def test_concurrent_store_links_source_path(tmp_path: Path) -> None:
+    source = tmp_path / "raw.bytes"
+    source.write_bytes(b"raw")
+    store = make_store(tmp_path)
+    store.insert_rows(
+        pd.DataFrame(
+            {
+                "file_id": ["a", "b"],
+                "compress_name": "preview",
+                "file_format": "webp",
+                "file_bytes": [None, b"data"],
+                "source_path": [str(source), None],
+            }
+        )
+    )
+
+    linked = tmp_path / "files/a/preview/image.webp"
+    assert linked.read_bytes() == b"raw"
+    assert (tmp_path / "files/b/preview/image.webp").read_bytes() == b"data"
+
+    # Перезапись варианта не должна менять исходный файл, на который он ссылается.
+    store.insert_rows(
+        pd.DataFrame({"file_id": ["a"], "compress_name": ["preview"], "file_format": ["webp"], "file_bytes": [b"new"]})
+    )
+    assert linked.read_bytes() == b"new"
+    assert source.read_bytes() == b"raw"
+
+
+def test_store_record_writes_only_changed_rows(tmp_path: Path, monkeypatch) -> None:
+    ds = DataStore(DBConn(f"sqlite:///{tmp_path}/meta.sqlite"), create_meta_table=True)
+    table = ds.create_table("test_store", make_store(tmp_path))
+    writes: list[str] = []
+    write_object = table.table_store._write_object
+    monkeypatch.setattr(
+        table.table_store, "_write_object", lambda path, data: (writes.append(path), write_object(path, data))
+    )
+    record = {"file_id": "a", "compress_name": "preview", "file_format": "webp", "file_bytes": b"data"}
+
+    changes = store_record(table, record)
+    assert changes.to_dict("records") == [{"file_id": "a", "compress_name": "preview", "file_format": "webp"}]
+    assert store_record(table, record).empty
+    assert len(store_record(table, {**record, "file_bytes": b"new data"})) == 1
+
+    assert len(writes) == 2
+    assert (tmp_path / "files/a/preview/image.webp").read_bytes() == b"new data"
+    assert len(table.meta_table.get_metadata()) == 1
+
+
+def test_store_record_copies_source_path(tmp_path: Path) -> None:
+    ds = DataStore(DBConn(f"sqlite:///{tmp_path}/meta.sqlite"), create_meta_table=True)
+    table = ds.create_table("test_store", make_store(tmp_path))
+    source = tmp_path / "uploads/u/data"
+    source.parent.mkdir(parents=True)
+    source.write_bytes(b"data")
+    key = {"file_id": "a", "compress_name": "preview", "file_format": "webp"}
+
+    changes = store_record(table, {**key, "file_bytes": None}, content_hash="sha", source_path=str(source))
+    assert len(changes) == 1
+    assert (tmp_path / "files/a/preview/image.webp").read_bytes() == b"data"
+    # Хэш строки тот же, что при записи тех же байтов с тем же content_hash.
+    assert store_record(table, {**key, "file_bytes": b"data"}, content_hash="sha").empty
+
+
+def test_store_record_keeps_columns_it_does_not_write(tmp_path: Path) -> None:
+    dbconn = DBConn(f"sqlite:///{tmp_path}/meta.sqlite")
+    ds = DataStore(dbconn, create_meta_table=True)
+    store = TableStoreDB(
+        dbconn,
+        "test_file_data",
+        [
+            sa.Column("file_id", sa.String, primary_key=True),
+            sa.Column("content_hash", sa.String),
+            sa.Column("deleted_at", sa.DateTime),
+        ],
+        create_table=True,
+    )
+    table = ds.create_table("test_file_data", store)
+    assert len(store_record(table, {"file_id": "a", "content_hash": "h1"})) == 1
+    with dbconn.con.begin() as con:
+        con.execute(sa.update(store.data_table).values(deleted_at=sa.func.current_timestamp()))
+
+    # Повторная запись с другим содержимым обновляет только свои колонки.
+    assert len(store_record(table, {"file_id": "a", "content_hash": "h2"})) == 1
+    with dbconn.con.begin() as con:
+        row = con.execute(sa.select(store.data_table)).one()
+    assert row.content_hash == "h2" and row.deleted_at is not None
+    assert table.meta_table.get_metadata()["update_ts"].notna().all()
+
+
+def test_concurrent_store_deletes_objects(tmp_path: Path) -> None:
+    store = make_store(tmp_path)
+    store.insert_rows(
+        pd.DataFrame({"file_id": ["a", "b"], "compress_name": "preview", "file_format": "webp", "file_bytes": b"data"})
+    )
+
+    # Отсутствующий объект (c) пропускается.
+    store.delete_rows(pd.DataFrame({"file_id": ["a", "c"], "compress_name": "preview", "file_format": "webp"}))
+
+    assert not (tmp_path / "files/a/preview/image.webp").exists()
+    assert (tmp_path / "files/b/preview/image.webp").exists()
@@ -0,0 +1,17 @@
+import json
+from pathlib import Path
+
+from opentelemetry import trace
+
+from file_box.tracing import setup_tracing, tracer
+
+
+def test_file_exporter_writes_spans(tmp_path: Path) -> None:
+    trace_path = tmp_path / "spans.jsonl"
+    setup_tracing("file", file_path=str(trace_path))
+    with tracer.start_as_current_span("test span") as span:
+        span.set_attribute("file_type", "image")
+    trace.get_tracer_provider().force_flush()  # type: ignore[attr-defined]
+
+    spans = [json.loads(line) for line in trace_path.read_text().splitlines()]
+    assert any(span["name"] == "test span" and span["attributes"]["file_type"] == "image" for span in spans)
@@ -0,0 +1,92 @@
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+from fsspec.implementations.local import LocalFileSystem
+from pydantic import ValidationError
+
+from file_box.configs.model import UrlPolicyEnum, UrlPolicyItemModel
+from file_box.urls import get_file_urls, get_url_policy, signed_url_cache
+
+BASE_URL = "gs://bucket/file-box"
+
+
+def test_preset_policy_overrides_file_type_policy() -> None:
+    policies = [
+        UrlPolicyItemModel(file_type="image", policy=UrlPolicyEnum.SIGNED),
+        UrlPolicyItemModel(
+            file_type="image",
+            compress_name="image_327_lanczos_webp",
+            policy=UrlPolicyEnum.PUBLIC,
+            public_url_template="https://cdn.example.com/{path}",
+        ),
+    ]
+    assert get_url_policy(policies, "image", "image_327_lanczos_webp") is policies[1]
+    assert get_url_policy(policies, "image", None) is policies[0]
+    assert get_url_policy(policies, "user", None) is None
+
+
+def test_policy_expiration_is_limited_by_v4_signature() -> None:
+    UrlPolicyItemModel(file_type="image", policy=UrlPolicyEnum.SIGNED, expiration_days=7)
+    UrlPolicyItemModel(file_type="image", policy=UrlPolicyEnum.BUCKETED, expiration_days=6, bucket_hours=24)
+
+    with pytest.raises(ValidationError, match="expiration_days must not exceed 7"):
+        UrlPolicyItemModel(file_type="image", policy=UrlPolicyEnum.SIGNED, expiration_days=30)
+    # Окно плюс срок после него: 24 часа + 7 дней больше предела подписи.
+    with pytest.raises(ValidationError, match="must not exceed 168 hours"):
+        UrlPolicyItemModel(file_type="image", policy=UrlPolicyEnum.BUCKETED)
+
+
+def test_public_and_bucketed_urls_are_stable(monkeypatch) -> None:
+    sign_calls: list[str] = []
+
+    def sign(self, path: str, expiration: int) -> str:
+        sign_calls.append(path)
+        return f"https://signed/{path}?expires={expiration}&call={len(sign_calls)}"
+
+    monkeypatch.setattr(LocalFileSystem, "sign", sign, raising=False)
+    policies = [
+        UrlPolicyItemModel(file_type="image", policy=UrlPolicyEnum.BUCKETED, expiration_days=6),
+        UrlPolicyItemModel(
+            file_type="image",
+            compress_name="preview",
+            policy=UrlPolicyEnum.PUBLIC,
+            public_url_template="https://cdn.example.com/{path}",
+        ),
+    ]
+    files: list[tuple[str, str, str | None]] = [
+        (f"{BASE_URL}/files/image/1/raw.bytes", "image", None),
+        (f"{BASE_URL}/files/image/1/preview/image.WEBP", "image", "preview"),
+    ]
+
+    first = get_file_urls(files, policies, "file", BASE_URL)
+    second = get_file_urls(files, policies, "file", BASE_URL)
+
+    assert first == second
+    assert first[1] == "https://cdn.example.com/files/image/1/preview/image.WEBP"
+    assert len(sign_calls) == 1
+
+
+class FakeSigningCredentials:
+    signer_email = "file-box@project.iam.gserviceaccount.com"
+
+    def sign_bytes(self, message: bytes) -> bytes:
+        return hashlib.sha256(message).digest()
+
+
+def test_bucketed_urls_match_across_replicas(monkeypatch) -> None:
+    monkeypatch.setattr(
+        LocalFileSystem, "credentials", SimpleNamespace(credentials=FakeSigningCredentials()), raising=False
+    )
+    policies = [UrlPolicyItemModel(file_type="image", policy=UrlPolicyEnum.BUCKETED, expiration_days=1)]
+    files: list[tuple[str, str, str | None]] = [("gs://bucket/file-box/files/image/1/raw.bytes", "image", None)]
+
+    first = get_file_urls(files, policies, "file", BASE_URL)
+    # Другая реплика или перезапуск: кэш процесса пуст, ссылка подписывается заново.
+    signed_url_cache._items.clear()
+    second = get_file_urls(files, policies, "file", BASE_URL)
+
+    assert first == second
+    assert first[0].startswith("https://storage.googleapis.com/bucket/file-box/files/image/1/raw.bytes?")
+    # Срок считается от начала окна: окно (24 часа) плюс expiration_days.
+    assert "X-Goog-Expires=172800" in first[0]